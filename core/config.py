@@ -7,6 +7,11 @@ and a dumper using an OrderedDict instead of the regular dict used by PyYAML.
 Additionally, it fixes a bug in PyYAML with scientific notation and allows
 to dump numpy dtypes and numpy ndarrays.
 
+The LibYAML based loaders and dumpers are used if they are available. Numpy
+arrays dumped to a file are written to a single binary side-car file next to
+it, which is memory-mapped when loading, so arrays are only read when they
+are accessed.
+
 The fix of the scientific notation is applied globally at module import.
 
 The idea of the implementation of the OrderedDict was taken from
@@ -35,11 +40,22 @@ from collections import OrderedDict
 import numpy
 import re
 import os
+import glob
+import uuid
 import ruamel.yaml as yaml
 from io import BytesIO
 
+# LibYAML based loaders and dumpers if available
+FastLoader = getattr(yaml, 'CLoader', yaml.Loader)
+FastSafeLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+FastDumper = getattr(yaml, 'CDumper', yaml.Dumper)
+FastSafeDumper = getattr(yaml, 'CSafeDumper', yaml.SafeDumper)
+
+# Alignment of the arrays in the binary side-car file in bytes
+SIDECAR_ALIGNMENT = 64
+
 
-def ordered_load(stream, Loader=yaml.Loader):
+def ordered_load(stream, Loader=FastLoader):
     """
     Loads a YAML formatted data from stream and puts it into an OrderedDict
 
@@ -49,6 +65,14 @@ def ordered_load(stream, Loader=yaml.Loader):
     Returns OrderedDict with data. If stream is empty then an empty
     OrderedDict is returned.
     """
+    # Binary side-car files are looked up in the directory of the stream
+    try:
+        configdir = os.path.dirname(stream.name)
+    except AttributeError:
+        configdir = ''
+    # Memory maps of the binary side-car files
+    sidecars = dict()
+
     class OrderedLoader(Loader):
         """
         Loader using an OrderedDict
@@ -80,6 +104,25 @@ def ordered_load(stream, Loader=yaml.Loader):
         arrays = numpy.load(filename)
         return arrays['array']
 
+    def construct_binary_ndarray(loader, node):
+        """
+        The constructor for a numpy array that is saved in a binary side-car
+        file. The array is a copy-on-write view of the memory-mapped file,
+        i.e. the data is read from disk when it is accessed.
+        """
+        info = dict(loader.construct_pairs(node, deep=True))
+        dtype = numpy.dtype(info['dtype'])
+        shape = tuple(info['shape'])
+        nbytes = dtype.itemsize * int(numpy.prod(shape))
+        if nbytes == 0:
+            return numpy.zeros(shape, dtype=dtype)
+        path = os.path.join(configdir, info['file'])
+        if path not in sidecars:
+            sidecars[path] = numpy.memmap(path, dtype=numpy.uint8, mode='c')
+        offset = info['offset']
+        array = sidecars[path][offset:offset + nbytes].view(dtype).reshape(shape)
+        return array.view(numpy.ndarray)
+
     def construct_str(loader, node):
         """
         construct strings but if the string starts with 'array(' it tries
@@ -113,6 +156,9 @@ def ordered_load(stream, Loader=yaml.Loader):
     OrderedLoader.add_constructor(
             '!extndarray',
             construct_external_ndarray)
+    OrderedLoader.add_constructor(
+            '!binndarray',
+            construct_binary_ndarray)
     OrderedLoader.add_constructor(
             yaml.resolver.BaseResolver.DEFAULT_SCALAR_TAG,
             construct_str)
@@ -126,14 +172,27 @@ def ordered_load(stream, Loader=yaml.Loader):
         return OrderedDict()
 
 
-def ordered_dump(data, stream=None, Dumper=yaml.Dumper, **kwds):
+def ordered_dump(data, stream=None, Dumper=FastDumper, **kwds):
     """
     dumps (OrderedDict) data in YAML format
 
     @param OrderedDict data: the data
     @param Stream stream: where the data in YAML is dumped
     @param Dumper Dumper: The dumper that is used as a base class
+
+    If the stream is a file, numpy arrays with a numeric data type are written
+    to the binary side-car file <file name>-arrays-<id>.bin next to it.
+    Side-car files of previous dumps to the same file are removed.
     """
+    try:
+        sidecar_base = os.path.splitext(stream.name)[0]
+    except AttributeError:
+        sidecar_base = None
+    # The side-car file is only created if the data contains arrays
+    sidecar = {'path': None, 'file': None}
+    if sidecar_base is not None:
+        sidecar['path'] = '{0}-arrays-{1}.bin'.format(sidecar_base, uuid.uuid4().hex[:8])
+
     class OrderedDumper(Dumper):
         """
         A Dumper using an OrderedDict
@@ -166,10 +225,32 @@ def ordered_dump(data, stream=None, Dumper=yaml.Dumper, **kwds):
         """
         return dumper.represent_float(numpy.asscalar(float_data))
 
+    def represent_binary_ndarray(dumper, array_data):
+        """
+        Representer for numpy ndarrays saved in the binary side-car file
+        """
+        if sidecar['file'] is None:
+            sidecar['file'] = open(sidecar['path'], 'wb')
+        sidecar_file = sidecar['file']
+        offset = sidecar_file.tell()
+        padding = -offset % SIDECAR_ALIGNMENT
+        sidecar_file.write(b'\0' * padding)
+        offset += padding
+        sidecar_file.write(numpy.ascontiguousarray(array_data).data)
+        return dumper.represent_mapping(
+            '!binndarray',
+            [('file', os.path.basename(sidecar['path'])),
+             ('offset', offset),
+             ('dtype', array_data.dtype.str),
+             ('shape', [int(i) for i in array_data.shape])])
+
     def represent_ndarray(dumper, array_data):
         """
         Representer for numpy ndarrays
         """
+        if (sidecar['path'] is not None and not array_data.dtype.hasobject
+                and array_data.dtype.fields is None):
+            return represent_binary_ndarray(dumper, array_data)
         try:
             filename = os.path.splitext(os.path.basename(stream.name))[0]
             configdir = os.path.dirname(stream.name)
@@ -203,9 +284,33 @@ def ordered_dump(data, stream=None, Dumper=yaml.Dumper, **kwds):
     OrderedDumper.add_representer(numpy.float64, represent_float)
     # OrderedDumper.add_representer(numpy.float128, represent_float)
     OrderedDumper.add_representer(numpy.ndarray, represent_ndarray)
+    OrderedDumper.add_representer(numpy.memmap, represent_ndarray)
 
     # dump data
-    return yaml.dump(data, stream, OrderedDumper, **kwds)
+    try:
+        return yaml.dump(data, stream, OrderedDumper, **kwds)
+    finally:
+        if sidecar['file'] is not None:
+            sidecar['file'].close()
+        if sidecar_base is not None:
+            remove_stale_sidecars(sidecar_base, sidecar['path'])
+
+
+def remove_stale_sidecars(sidecar_base, current_path=None):
+    """
+    Removes the binary side-car files of previous dumps. Files that can not be
+    removed (e.g. because they are still memory-mapped under Windows) are
+    removed by a later dump.
+
+    @param str sidecar_base: path of the YAML file without extension
+    @param str current_path: path of the side-car file to keep
+    """
+    for path in glob.glob('{0}-arrays-*.bin'.format(glob.escape(sidecar_base))):
+        if path != current_path:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
 
 
 def load(filename):
@@ -217,7 +322,7 @@ def load(filename):
     Returns OrderedDict
     """
     with open(filename, 'r') as f:
-        return ordered_load(f, yaml.SafeLoader)
+        return ordered_load(f, FastSafeLoader)
 
 def save(filename, data):
     """
@@ -227,5 +332,5 @@ def save(filename, data):
     @param data OrderedDict: config values
     """
     with open(filename, 'w') as f:
-        ordered_dump(data, stream=f, Dumper=yaml.SafeDumper,
+        ordered_dump(data, stream=f, Dumper=FastSafeDumper,
                 default_flow_style=False)
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains a row-wise data stream written to disk in chunks by a background thread.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import os
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+from core.util.mutex import Mutex
+
+
+class ChunkedDataStream:
+    """
+    Table of rows with a fixed number of columns that is streamed to a binary file.
+
+    Rows are collected in a preallocated chunk. Full chunks are appended to the file by a
+    background thread, so only the current and the previously written chunk are kept in memory.
+    The file contains the raw rows (C order, data type dtype) without header and can be read with
+    numpy.fromfile(path, dtype).reshape(-1, columns).
+
+    Supports the read access of a list of rows: len(), indexing and slicing of rows (returning
+    numpy arrays) and conversion with numpy.array().
+    """
+
+    def __init__(self, path, columns, chunk_rows=10000, dtype=np.float64, append=False):
+        """
+        @param str path: path of the binary file
+        @param int columns: number of columns of each row
+        @param int chunk_rows: number of rows written to the file at once
+        @param dtype: numpy data type of the rows
+        @param bool append: continue the stream in an existing file instead of overwriting it
+        """
+        self.path = path
+        self.columns = int(columns)
+        self.chunk_rows = max(int(chunk_rows), 1)
+        self.dtype = np.dtype(dtype)
+
+        self._lock = Mutex()
+        self._file = open(self.path, 'ab' if append else 'wb')
+        self._writer = ThreadPoolExecutor(max_workers=1)
+        self._pending_write = None
+        # Number of rows in the file or being written to the file
+        self._written_rows = self._file.tell() // (self.columns * self.dtype.itemsize)
+        # Last chunk passed to the writer. Serves reads of the tail of the stream.
+        self._previous_chunk = np.empty((0, self.columns), dtype=self.dtype)
+        self._chunk = np.empty((self.chunk_rows, self.columns), dtype=self.dtype)
+        self._chunk_fill = 0
+
+    def __len__(self):
+        return self._written_rows + self._chunk_fill
+
+    def __getitem__(self, index):
+        with self._lock:
+            length = len(self)
+            if isinstance(index, slice):
+                start, stop, step = index.indices(length)
+                if step == 1:
+                    return self._get_rows(start, max(start, stop)).copy()
+                return self._get_rows(0, length)[index].copy()
+            if index < 0:
+                index += length
+            if not 0 <= index < length:
+                raise IndexError('ChunkedDataStream index out of range')
+            return self._get_rows(index, index + 1)[0].copy()
+
+    def __array__(self, dtype=None, copy=None):
+        with self._lock:
+            data = self._get_rows(0, len(self))
+        return data if dtype is None else data.astype(dtype)
+
+    def append(self, row):
+        """
+        Append a single row.
+
+        @param row: array-like with <columns> elements
+        """
+        with self._lock:
+            self._chunk[self._chunk_fill] = row
+            self._chunk_fill += 1
+            if self._chunk_fill == self.chunk_rows:
+                self._write_chunk()
+
+    def extend(self, rows):
+        """
+        Append several rows.
+
+        @param rows: array-like with shape (number of rows, <columns>)
+        """
+        rows = np.asarray(rows, dtype=self.dtype).reshape(-1, self.columns)
+        with self._lock:
+            while len(rows) > 0:
+                number = min(len(rows), self.chunk_rows - self._chunk_fill)
+                self._chunk[self._chunk_fill:self._chunk_fill + number] = rows[:number]
+                self._chunk_fill += number
+                rows = rows[number:]
+                if self._chunk_fill == self.chunk_rows:
+                    self._write_chunk()
+
+    def flush(self):
+        """
+        Write all rows to the file and wait until they are written.
+        """
+        with self._lock:
+            if self._chunk_fill > 0:
+                self._write_chunk()
+            self._wait_for_writer()
+
+    def close(self):
+        """
+        Write all rows to the file and close it. The stream can still be read afterwards.
+        """
+        if self._file.closed:
+            return
+        self.flush()
+        with self._lock:
+            self._writer.shutdown(wait=True)
+            self._file.close()
+
+    def _write_chunk(self):
+        chunk = self._chunk[:self._chunk_fill]
+        # Make sure that the file is written in order
+        self._wait_for_writer()
+        self._pending_write = self._writer.submit(self._write_to_file, chunk)
+        self._written_rows += self._chunk_fill
+        self._previous_chunk = chunk
+        self._chunk = np.empty((self.chunk_rows, self.columns), dtype=self.dtype)
+        self._chunk_fill = 0
+
+    def _write_to_file(self, chunk):
+        chunk.tofile(self._file)
+        self._file.flush()
+
+    def _wait_for_writer(self):
+        if self._pending_write is not None:
+            self._pending_write.result()
+            self._pending_write = None
+
+    def _get_rows(self, start, stop):
+        """
+        Get the rows start to stop (exclusive). Rows not available in memory are read from the
+        file. Must be called with the lock acquired.
+        """
+        tail_start = self._written_rows - len(self._previous_chunk)
+        tail = self._chunk[:self._chunk_fill]
+        if start >= tail_start:
+            if len(self._previous_chunk) > 0 and start < self._written_rows:
+                tail = np.concatenate((self._previous_chunk, tail))
+            else:
+                tail_start = self._written_rows
+            return tail[start - tail_start:stop - tail_start]
+
+        # Read the older rows from the file
+        self._wait_for_writer()
+        if not self._file.closed:
+            self._file.flush()
+        file_rows = np.memmap(self.path, dtype=self.dtype, mode='r',
+                              shape=(self._written_rows, self.columns))
+        if stop <= self._written_rows:
+            return np.array(file_rows[start:stop])
+        return np.concatenate((file_rows[start:], tail[:stop - self._written_rows]))
+
+    def remove_file(self):
+        """
+        Close the stream and remove its file.
+        """
+        self.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
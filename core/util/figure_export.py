@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains functions to export matplotlib figures together with metadata.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import datetime
+import pickle
+
+
+def save_figure(figure, filepath_base, metadata, dpi=None):
+    """
+    Save a matplotlib figure as PDF and PNG file including metadata.
+
+    @param matplotlib.figure.Figure figure: the figure to save
+    @param str filepath_base: path of the files without suffix. The suffixes '_fig.pdf' and
+                              '_fig.png' are appended.
+    @param dict metadata: metadata to attach to both files (e.g. 'Title', 'Author'). The values
+                          of 'CreationDate' and 'ModDate' must be datetime.datetime objects.
+    @param float dpi: optional, resolution of the PNG file. Uses rcParams['savefig.dpi'] if None.
+    """
+    from matplotlib.backends.backend_pdf import PdfPages
+
+    # The with statement makes sure that the PdfPages object is closed properly at the end of the
+    # block, even if an Exception occurs.
+    with PdfPages(filepath_base + '_fig.pdf') as pdf:
+        pdf.savefig(figure, bbox_inches='tight', pad_inches=0.05, dpi=dpi)
+        pdf_metadata = pdf.infodict()
+        for key, value in metadata.items():
+            pdf_metadata[key] = value
+
+    # PNG text chunks can only hold strings. Metadata is written together with the image.
+    png_metadata = dict()
+    for key, value in metadata.items():
+        if isinstance(value, datetime.datetime):
+            png_metadata[key] = value.strftime('%Y%m%d-%H%M-%S')
+        else:
+            png_metadata[key] = str(value)
+    figure.savefig(filepath_base + '_fig.png', bbox_inches='tight', pad_inches=0.05, dpi=dpi,
+                   metadata=png_metadata)
+    return
+
+
+def init_render_worker():
+    """
+    Initializer of worker processes rendering figures. Selects a non-interactive backend.
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    return
+
+
+def save_pickled_figure(figure_bytes, filepath_base, metadata, dpi=None):
+    """
+    Save a pickled matplotlib figure as PDF and PNG file. Used to render figures in a worker
+    process.
+
+    @param bytes figure_bytes: the pickled figure
+    @param str filepath_base: path of the files without suffix
+    @param dict metadata: metadata to attach to both files, see save_figure
+    @param float dpi: optional, resolution of the PNG file
+    """
+    figure = pickle.loads(figure_bytes)
+    save_figure(figure, filepath_base, metadata, dpi)
+    return
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains a preallocated circular buffer for multi-channel time traces.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import numpy as np
+
+
+class RingBuffer:
+    """
+    Preallocated circular buffer holding the last <length> samples of a number of channels.
+
+    Appending a sample overwrites the oldest one in O(1) without allocating memory. Each sample is
+    stored twice (at slot i and i + length) so the chronologically ordered samples (oldest first)
+    are always available as contiguous view of the buffer without copying.
+
+    Views returned by the property data are only valid until the next modification of the buffer.
+    Copy them if they need to be kept.
+    """
+
+    def __init__(self, channels, length, dtype=float):
+        """
+        @param int channels: number of channels
+        @param int length: number of samples per channel
+        @param dtype: numpy data type of the samples
+        """
+        self._length = int(length)
+        self._buffer = np.zeros((int(channels), 2 * self._length), dtype=dtype)
+        # Slot of the oldest sample
+        self._start = 0
+
+    @property
+    def channels(self):
+        return self._buffer.shape[0]
+
+    @property
+    def length(self):
+        return self._length
+
+    @property
+    def data(self):
+        """
+        Chronologically ordered view of the buffer with shape (channels, length).
+        """
+        return self._buffer[:, self._start:self._start + self._length]
+
+    @property
+    def latest(self):
+        """
+        View of the latest sample of each channel with shape (channels,).
+        """
+        return self._buffer[:, self._start + self._length - 1]
+
+    def clear(self):
+        """
+        Set all samples to zero.
+        """
+        self._buffer[...] = 0
+        self._start = 0
+
+    def append(self, values):
+        """
+        Append one sample to each channel, overwriting the oldest one.
+
+        @param values: scalar or array of shape (channels,)
+        """
+        self._buffer[:, self._start] = values
+        self._buffer[:, self._start + self._length] = values
+        self._start = (self._start + 1) % self._length
+
+    def extend(self, values):
+        """
+        Append several samples to each channel, overwriting the oldest ones.
+
+        @param numpy.ndarray values: samples with shape (channels, number of samples)
+        """
+        values = np.asarray(values)
+        if values.shape[1] > self._length:
+            values = values[:, -self._length:]
+        slots = (self._start + np.arange(values.shape[1])) % self._length
+        self._buffer[:, slots] = values
+        self._buffer[:, slots + self._length] = values
+        self._start = (self._start + values.shape[1]) % self._length
+
+    def set_latest(self, values, number=1):
+        """
+        Overwrite the latest samples of each channel with the same value.
+
+        @param values: scalar or array of shape (channels,)
+        @param int number: number of latest samples to overwrite
+        """
+        number = min(max(int(number), 0), self._length)
+        slots = (self._start - 1 - np.arange(number)) % self._length
+        values = np.reshape(values, (-1, 1))
+        self._buffer[:, slots] = values
+        self._buffer[:, slots + self._length] = values
@@ -0,0 +1,422 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains a compact image of a scan over two scanner axes.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import zlib
+import numpy as np
+
+
+class ScanImage:
+    """
+    Image of a scan over two of the three scanner axes (x, y, z) holding the count rates of all
+    channels.
+
+    The pixel coordinates are not stored for each pixel. One scanner axis changes along the columns
+    (horizontal axis), one along the rows (vertical axis) and the remaining axis has a fixed
+    position for each row (e.g. z of a xy image).
+
+    For compatibility, indexing image[row, column, plane] behaves like indexing an array with
+    shape (rows, columns, 3 + channels), whose planes hold the x, y and z coordinates followed by
+    the count rates of each channel. Count planes are returned as views of the attribute counts,
+    coordinate planes are generated on demand. Only count planes can be assigned by indexing.
+
+    Snapshots (see snapshot) are read-only images sharing the buffers of the image (copy-on-write):
+    the buffers are copied only when the image is modified after taking a snapshot. The counts of a
+    snapshot can be compressed in memory or saved to a file and are then restored on access.
+    """
+
+    def __init__(self, horizontal_axis, vertical_axis, horizontal_index, vertical_index, position,
+                 channels, dtype=np.float64):
+        """
+        @param numpy.ndarray horizontal_axis: positions of the columns
+        @param numpy.ndarray vertical_axis: positions of the rows
+        @param int horizontal_index: scanner axis of the columns (0: x, 1: y, 2: z)
+        @param int vertical_index: scanner axis of the rows (0: x, 1: y, 2: z)
+        @param position: x, y, z position. Sets the position of the fixed axis for all rows.
+        @param int channels: number of count channels
+        @param dtype: numpy data type of the count rates
+        """
+        self.horizontal_index = int(horizontal_index)
+        self.vertical_index = int(vertical_index)
+        self.fixed_index = 3 - self.horizontal_index - self.vertical_index
+        horizontal_axis = np.array(horizontal_axis, dtype=float)
+        vertical_axis = np.array(vertical_axis, dtype=float)
+
+        # Coordinates of each scanner axis with shape (1, columns) or (rows, 1)
+        self._coordinates = [None, None, None]
+        self._coordinates[self.horizontal_index] = horizontal_axis.reshape(1, -1)
+        self._coordinates[self.vertical_index] = vertical_axis.reshape(-1, 1)
+        self._coordinates[self.fixed_index] = np.full((vertical_axis.size, 1),
+                                                      float(position[self.fixed_index]))
+        self._counts = np.zeros((vertical_axis.size, horizontal_axis.size, int(channels)),
+                                dtype=dtype)
+        self._counts_shape = self._counts.shape
+        self._dtype = self._counts.dtype
+        # zlib compressed counts of a snapshot
+        self._compressed = None
+        # File the image has been saved to
+        self.path = None
+        # Snapshots are read-only
+        self._frozen = False
+        # Snapshot sharing the buffers of this image as long as it is not modified
+        self._snapshot = None
+
+    @classmethod
+    def from_array(cls, array, horizontal_index, vertical_index, dtype=None):
+        """
+        Create a ScanImage from an array with the layout (rows, columns, 3 + channels).
+
+        @param numpy.ndarray array: image with the x, y and z coordinates followed by the count
+                                    rates of each channel for each pixel
+        @param int horizontal_index: scanner axis of the columns (0: x, 1: y, 2: z)
+        @param int vertical_index: scanner axis of the rows (0: x, 1: y, 2: z)
+        @param dtype: numpy data type of the count rates. Data type of array if None.
+
+        @return ScanImage: the new image
+        """
+        array = np.asarray(array)
+        image = cls(horizontal_axis=array[0, :, horizontal_index],
+                    vertical_axis=array[:, 0, vertical_index],
+                    horizontal_index=horizontal_index,
+                    vertical_index=vertical_index,
+                    position=array[0, 0, :3],
+                    channels=array.shape[2] - 3,
+                    dtype=array.dtype if dtype is None else dtype)
+        image._coordinates[image.fixed_index][:, 0] = array[:, 0, image.fixed_index]
+        image._counts[...] = array[:, :, 3:]
+        return image
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load an image saved with save. The counts are read from the file when they are accessed.
+
+        @param str path: path of the numpy file (*.npz)
+
+        @return ScanImage: the image (a snapshot, i.e. read-only)
+        """
+        image = cls.__new__(cls)
+        with np.load(path) as data:
+            image.horizontal_index, image.vertical_index = (int(i) for i in data['indices'])
+            image.fixed_index = 3 - image.horizontal_index - image.vertical_index
+            image._coordinates = [None, None, None]
+            image._coordinates[image.horizontal_index] = data['horizontal_axis'].reshape(1, -1)
+            image._coordinates[image.vertical_index] = data['vertical_axis'].reshape(-1, 1)
+            image._coordinates[image.fixed_index] = data['fixed_positions'].reshape(-1, 1)
+            image._counts_shape = tuple(int(i) for i in data['counts_shape'])
+            image._dtype = np.dtype(str(data['counts_dtype']))
+        for coordinates in image._coordinates:
+            coordinates.flags.writeable = False
+        image._counts = None
+        image._compressed = None
+        image.path = path
+        image._frozen = True
+        image._snapshot = None
+        return image
+
+    @property
+    def counts(self):
+        """
+        Count rates with shape (rows, columns, channels). The array is read-only while it is shared
+        with a snapshot. Modify the counts by indexing the image or with set_line_counts.
+        """
+        if self._counts is not None:
+            return self._counts
+        if self._compressed is not None:
+            counts = np.frombuffer(zlib.decompress(self._compressed), dtype=self._dtype)
+            return counts.reshape(self._counts_shape)
+        with np.load(self.path) as data:
+            counts = data['counts']
+        counts.flags.writeable = False
+        return counts
+
+    @property
+    def frozen(self):
+        """
+        True if this image is a read-only snapshot.
+        """
+        return self._frozen
+
+    @property
+    def compressed(self):
+        """
+        True if the counts are not held as array in memory.
+        """
+        return self._counts is None
+
+    @property
+    def shape(self):
+        return self._counts_shape[0], self._counts_shape[1], 3 + self._counts_shape[2]
+
+    @property
+    def ndim(self):
+        return 3
+
+    @property
+    def dtype(self):
+        return self._dtype
+
+    @property
+    def horizontal_axis(self):
+        return self._coordinates[self.horizontal_index][0]
+
+    @property
+    def vertical_axis(self):
+        return self._coordinates[self.vertical_index][:, 0]
+
+    def __len__(self):
+        return self._counts_shape[0]
+
+    def copy(self):
+        """
+        @return ScanImage: a modifiable copy of this image not sharing any buffers
+        """
+        return self._copy([coordinates.copy() for coordinates in self._coordinates],
+                          np.array(self.counts))
+
+    def snapshot(self):
+        """
+        Get a read-only copy of this image sharing its buffers. The buffers are copied when the
+        image is modified afterwards. As long as the image is not modified, the same snapshot is
+        returned.
+
+        @return ScanImage: the snapshot
+        """
+        if self._frozen:
+            return self
+        if self._snapshot is None:
+            self._share_buffers()
+            self._snapshot = self._copy(list(self._coordinates), self._counts)
+            self._snapshot._frozen = True
+        return self._snapshot
+
+    def thaw(self):
+        """
+        Get a modifiable copy of this image sharing its buffers until the copy is modified. Taking
+        a snapshot of the unmodified copy returns this image if it is a snapshot.
+
+        @return ScanImage: the modifiable copy
+        """
+        counts = self.counts
+        self._share_buffers(counts)
+        image = self._copy(list(self._coordinates), counts)
+        if self._frozen:
+            image._snapshot = self
+        return image
+
+    def compress(self, level=1):
+        """
+        Release the counts of a snapshot from memory. If the snapshot has been saved, the counts
+        are read from the file when needed, otherwise they are kept zlib compressed in memory.
+
+        @param int level: zlib compression level
+        """
+        if not self._frozen:
+            raise ValueError('Only snapshots of a ScanImage can be compressed.')
+        if self._counts is None:
+            return
+        if self.path is None:
+            self._compressed = zlib.compress(np.ascontiguousarray(self._counts).tobytes(), level)
+        self._counts = None
+
+    def save(self, path):
+        """
+        Save the image to a compressed numpy file.
+
+        @param str path: path of the file, should end with .npz
+        """
+        np.savez_compressed(path,
+                            counts=self.counts,
+                            horizontal_axis=self.horizontal_axis,
+                            vertical_axis=self.vertical_axis,
+                            fixed_positions=self._coordinates[self.fixed_index][:, 0],
+                            indices=np.array([self.horizontal_index, self.vertical_index]),
+                            counts_shape=np.array(self._counts_shape),
+                            counts_dtype=np.array(self._dtype.str))
+        self.path = path
+        if self._frozen and self._compressed is not None:
+            # The file replaces the compressed counts in memory
+            self._compressed = None
+
+    def set_line_counts(self, row, counts):
+        """
+        Set the counts of a row or of several rows.
+
+        @param int row: index of the row (or slice of rows)
+        @param numpy.ndarray counts: count rates with shape (columns, channels) or
+                                     (rows, columns, channels) for a slice of rows
+        """
+        self._prepare_modification()
+        self._counts[row, :, :np.shape(counts)[-1]] = counts
+
+    def _copy(self, coordinates, counts):
+        image = ScanImage.__new__(ScanImage)
+        image.horizontal_index = self.horizontal_index
+        image.vertical_index = self.vertical_index
+        image.fixed_index = self.fixed_index
+        image._coordinates = coordinates
+        image._counts = counts
+        image._counts_shape = self._counts_shape
+        image._dtype = self._dtype
+        image._compressed = None
+        image.path = None
+        image._frozen = False
+        image._snapshot = None
+        return image
+
+    def _share_buffers(self, counts=None):
+        """
+        Mark the buffers as read-only so that they are copied before they are modified.
+        """
+        for array in self._coordinates + [self._counts if counts is None else counts]:
+            array.flags.writeable = False
+
+    def _prepare_modification(self):
+        """
+        Copy shared buffers and drop the snapshot of the unmodified image before modifying it.
+        """
+        if self._frozen:
+            raise ValueError('Snapshots of a ScanImage can not be modified.')
+        self._snapshot = None
+        if not self._counts.flags.writeable:
+            self._counts = self._counts.copy()
+        fixed = self._coordinates[self.fixed_index]
+        if not fixed.flags.writeable:
+            self._coordinates[self.fixed_index] = fixed.copy()
+
+    def get_line(self, row):
+        """
+        Get the scan path of a row.
+
+        @param int row: index of the row
+
+        @return numpy.ndarray: x, y and z coordinates of the pixels with shape (3, columns)
+        """
+        line = np.empty((3, self._counts_shape[1]))
+        for axis, coordinates in enumerate(self._coordinates):
+            line[axis] = coordinates[row] if coordinates.shape[0] > 1 else coordinates[0]
+        return line
+
+    def get_position(self, row, column):
+        """
+        @param int row: index of the row
+        @param int column: index of the column
+
+        @return numpy.ndarray: x, y and z coordinate of a pixel
+        """
+        return np.array([coordinates[row if coordinates.shape[0] > 1 else 0,
+                                     column if coordinates.shape[1] > 1 else 0]
+                         for coordinates in self._coordinates])
+
+    def set_fixed_position(self, row, position):
+        """
+        Set the position of the fixed scanner axis of a row.
+
+        @param int row: index of the row (or slice of rows)
+        @param float position: the position of the fixed axis
+        """
+        self._prepare_modification()
+        self._coordinates[self.fixed_index][row, 0] = position
+
+    def get_plane(self, plane):
+        """
+        Get a plane of the compatibility layout (x, y, z, counts of each channel).
+
+        @param int plane: index of the plane
+
+        @return numpy.ndarray: view of the plane with shape (rows, columns). Coordinate planes are
+                               read-only.
+        """
+        if plane < 0:
+            plane += self.shape[2]
+        if not 0 <= plane < self.shape[2]:
+            raise IndexError('ScanImage plane index out of range')
+        if plane >= 3:
+            return self.counts[:, :, plane - 3]
+        return np.broadcast_to(self._coordinates[plane], self._counts_shape[:2])
+
+    def __array__(self, dtype=None, copy=None):
+        array = np.empty(self.shape, dtype=np.result_type(self._dtype, np.float64))
+        for axis, coordinates in enumerate(self._coordinates):
+            array[:, :, axis] = coordinates
+        array[:, :, 3:] = self.counts
+        return array if dtype is None else array.astype(dtype)
+
+    def _split_key(self, key):
+        if not isinstance(key, tuple):
+            key = (key,)
+        if any(k is Ellipsis or k is None for k in key) or len(key) > 3:
+            return None
+        return key + (slice(None),) * (3 - len(key))
+
+    def __getitem__(self, key):
+        split_key = self._split_key(key)
+        if split_key is None:
+            return np.asarray(self)[key]
+        row_key, column_key, plane_key = split_key
+
+        if isinstance(plane_key, (int, np.integer)):
+            plane = int(plane_key)
+            if plane < 0:
+                plane += self.shape[2]
+            if plane >= 3:
+                return self.counts[row_key, column_key, plane - 3]
+            return np.array(self.get_plane(plane)[row_key, column_key])
+
+        counts_key = self._get_counts_key(plane_key)
+        if counts_key is not None:
+            return self.counts[row_key, column_key, counts_key]
+        planes = np.arange(self.shape[2])[plane_key]
+        return np.stack([self[row_key, column_key, int(plane)] for plane in planes], axis=-1)
+
+    def __setitem__(self, key, value):
+        split_key = self._split_key(key)
+        if split_key is None:
+            raise IndexError('Unsupported index for assignment to ScanImage.')
+        row_key, column_key, plane_key = split_key
+
+        counts_key = self._get_counts_key(plane_key)
+        if counts_key is None:
+            raise ValueError('Pixel coordinates of a ScanImage can not be assigned. Use '
+                             'set_fixed_position to change the position of the fixed axis.')
+        self._prepare_modification()
+        self._counts[row_key, column_key, counts_key] = value
+
+    def _get_counts_key(self, plane_key):
+        """
+        Translate a plane index into an index of the counts array.
+
+        @return: index of the counts array or None if coordinate planes are selected
+        """
+        planes = self.shape[2]
+        if isinstance(plane_key, (int, np.integer)):
+            plane = int(plane_key) + planes if plane_key < 0 else int(plane_key)
+            return plane - 3 if plane >= 3 else None
+        if isinstance(plane_key, slice):
+            start, stop, step = plane_key.indices(planes)
+            if step > 0 and start >= 3:
+                return slice(start - 3, max(stop - 3, 0), step)
+            if len(range(start, stop, step)) == 0:
+                return slice(0, 0)
+            return None
+        selected = np.arange(planes)[plane_key]
+        if np.all(selected >= 3):
+            return selected - 3
+        return None
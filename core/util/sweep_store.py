@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains a store of repeated sweeps with running averages.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import numpy as np
+
+from core.util.data_stream import ChunkedDataStream
+
+
+class SweepStore:
+    """
+    Store of repeated sweeps with shape (channels, points), e.g. the frequency sweeps of an ODMR
+    measurement.
+
+    Adding a sweep costs O(channels * points) independent of the number of sweeps already stored:
+    - the average over all sweeps is calculated from a running sum,
+    - the average over the latest <average_length> sweeps from a sliding window sum,
+    - the latest sweeps are kept in a circular buffer (newest sweep first) that provides the
+      matrix of the latest <matrix_lines> sweeps and the sweeps leaving the sliding window.
+    The complete history of sweeps is kept in chronological order in an array that grows by
+    doubling its size if needed. If a memory budget is given and the history would exceed it, the
+    history is moved to a ChunkedDataStream on disk and further sweeps are appended to this stream.
+
+    Views returned by the properties matrix and history are only valid until the next modification
+    of the store. Copy them if they need to be kept.
+    """
+
+    def __init__(self, channels, points, matrix_lines=50, average_length=0, capacity=0,
+                 memory_budget=0, spill_path=None):
+        """
+        @param int channels: number of channels of each sweep
+        @param int points: number of points of each sweep
+        @param int matrix_lines: number of latest sweeps in the matrix
+        @param int average_length: number of latest sweeps to average (0 means all)
+        @param int capacity: number of sweeps to preallocate the history for
+        @param int memory_budget: maximum size of the history in memory in bytes (0 means no limit)
+        @param str spill_path: path of the file the history is moved to if it exceeds the memory
+                               budget. Required if a memory budget is given.
+        """
+        self._shape = (int(channels), int(points))
+        self._matrix_lines = max(int(matrix_lines), 1)
+        self._average_length = max(int(average_length), 0)
+        self.memory_budget = max(int(memory_budget), 0) if spill_path is not None else 0
+        self.spill_path = spill_path
+        self._sweep_bytes = 8 * self._shape[0] * self._shape[1]
+        capacity = max(int(capacity), self._matrix_lines)
+        if self.memory_budget > 0:
+            capacity = max(min(capacity, self.memory_budget // self._sweep_bytes), 1)
+        self._history = np.zeros((capacity,) + self._shape)
+        # ChunkedDataStream holding the history if it has been spilled to disk
+        self._stream = None
+        self._sweeps = 0
+        self._total_sum = np.zeros(self._shape)
+        self._window_sum = np.zeros(self._shape)
+        # Number of sliding window updates since the window sum has been calculated from scratch
+        self._window_updates = 0
+        self._init_ring()
+
+    def __len__(self):
+        return self._sweeps
+
+    @property
+    def matrix_lines(self):
+        return self._matrix_lines
+
+    @property
+    def average_length(self):
+        return self._average_length
+
+    @property
+    def average(self):
+        """
+        Average over the latest <average_length> sweeps or over all sweeps if average_length is 0.
+        Zero if no sweep has been added yet.
+        """
+        if self._average_length <= 0:
+            return self._total_sum / max(self._sweeps, 1)
+        return self._window_sum / max(min(self._average_length, self._sweeps), 1)
+
+    @property
+    def matrix(self):
+        """
+        View of the latest <matrix_lines> sweeps, newest sweep first. Lines without sweep are zero.
+        """
+        return self._ring[self._ring_start:self._ring_start + self._matrix_lines]
+
+    @property
+    def spilled(self):
+        """
+        True if the history has been moved to the file spill_path.
+        """
+        return self._stream is not None
+
+    @property
+    def history(self):
+        """
+        View of all sweeps, newest sweep first. If the history has been spilled to disk, it is read
+        from the file into a new array. Use export_history to avoid this.
+        """
+        if self._stream is not None:
+            return np.array(self._stream).reshape((-1,) + self._shape)[::-1]
+        return self._history[self._sweeps - 1::-1] if self._sweeps > 0 else self._history[:0]
+
+    def get_latest(self, number):
+        """
+        Get the latest sweeps, newest sweep first.
+
+        @param int number: maximum number of sweeps to return
+
+        @return numpy.ndarray: the sweeps with shape (<= number, channels, points)
+        """
+        number = min(max(int(number), 0), self._sweeps)
+        if self._stream is not None:
+            return self._stream[self._sweeps - number:].reshape((-1,) + self._shape)[::-1]
+        return self.history[:number]
+
+    def export_history(self, path, block_sweeps=1000):
+        """
+        Write all sweeps (newest sweep first) to a numpy file (*.npy). A spilled history is copied
+        block by block so it does not need to fit into memory.
+
+        @param str path: path of the numpy file
+        @param int block_sweeps: number of sweeps copied at once
+        """
+        exported = np.lib.format.open_memmap(path, mode='w+', dtype=self._history.dtype,
+                                             shape=(self._sweeps,) + self._shape)
+        if self._stream is None:
+            exported[...] = self.history
+        else:
+            for start in range(0, self._sweeps, block_sweeps):
+                stop = min(start + block_sweeps, self._sweeps)
+                block = self._stream[start:stop].reshape((-1,) + self._shape)
+                exported[self._sweeps - stop:self._sweeps - start] = block[::-1]
+        exported.flush()
+        del exported
+
+    def close(self):
+        """
+        Remove the spill file of the history. The store is empty afterwards.
+        """
+        self.clear()
+
+    def clear(self):
+        """
+        Remove all sweeps.
+        """
+        if self._stream is not None:
+            self._stream.remove_file()
+            self._stream = None
+            self._history = np.zeros((self._history.shape[0],) + self._shape)
+        self._sweeps = 0
+        self._total_sum[...] = 0
+        self._window_sum[...] = 0
+        self._window_updates = 0
+        self._ring[...] = 0
+        self._ring_start = 0
+
+    def append(self, sweep):
+        """
+        Add a new sweep.
+
+        @param numpy.ndarray sweep: the sweep with shape (channels, points)
+        """
+        sweep = np.asarray(sweep, dtype=self._history.dtype).reshape(self._shape)
+        if self._stream is None and self._sweeps == self._history.shape[0]:
+            self._grow_history()
+        if self._stream is not None:
+            self._stream.append(sweep.ravel())
+        else:
+            self._history[self._sweeps] = sweep
+        self._sweeps += 1
+        self._total_sum += sweep
+
+        if self._average_length > 0:
+            self._window_sum += sweep
+            if self._sweeps > self._average_length:
+                # The circular buffer still holds the previous sweeps, newest first
+                self._window_sum -= self._ring[self._ring_start + self._average_length - 1]
+                self._window_updates += 1
+
+        self._ring_start = (self._ring_start - 1) % self._ring_length
+        self._ring[self._ring_start] = sweep
+        self._ring[self._ring_start + self._ring_length] = sweep
+
+        # Avoid accumulating rounding errors in the sliding window sum
+        if self._window_updates >= self._average_length > 0:
+            self._window_sum = np.sum(self._ring[self._ring_start:
+                                                 self._ring_start + self._average_length],
+                                      axis=0)
+            self._window_updates = 0
+
+    def set_matrix_lines(self, lines):
+        """
+        Set the number of latest sweeps in the matrix.
+
+        @param int lines: number of matrix lines
+        """
+        self._matrix_lines = max(int(lines), 1)
+        self._init_ring()
+
+    def set_average_length(self, length):
+        """
+        Set the number of latest sweeps to average.
+
+        @param int length: number of sweeps to average (0 means all)
+        """
+        self._average_length = max(int(length), 0)
+        self._init_ring()
+
+    def _grow_history(self):
+        """
+        Doubles the size of the history in memory or moves it to the spill file if it would exceed
+        the memory budget.
+        """
+        if 0 < self.memory_budget < 2 * self._history.nbytes:
+            # Only the current and the previous chunk of the stream are kept in memory
+            chunk_sweeps = max(self.memory_budget // (2 * self._sweep_bytes), 1)
+            self._stream = ChunkedDataStream(self.spill_path,
+                                             self._shape[0] * self._shape[1],
+                                             chunk_rows=chunk_sweeps)
+            self._stream.extend(self._history[:self._sweeps].reshape((self._sweeps, -1)))
+            # Keep a minimal buffer to preserve the data type
+            self._history = np.zeros((1,) + self._shape)
+        else:
+            self._history = np.concatenate((self._history, np.zeros(self._history.shape)), axis=0)
+
+    def _init_ring(self):
+        """
+        (Re)creates the circular buffer from the history and calculates the sliding window sum.
+        Each sweep is stored twice (at slot i and i + ring_length) so the latest sweeps are always
+        available as contiguous view.
+        """
+        self._ring_length = max(self._matrix_lines, self._average_length, 1)
+        self._ring = np.zeros((2 * self._ring_length,) + self._shape)
+        self._ring_start = 0
+        latest = self.get_latest(self._ring_length)
+        self._ring[:len(latest)] = latest
+        self._ring[self._ring_length:self._ring_length + len(latest)] = latest
+
+        if self._average_length > 0:
+            self._window_sum = np.sum(latest[:self._average_length], axis=0)
+        else:
+            self._window_sum = np.zeros(self._shape)
+        self._window_updates = 0
@@ -27,11 +27,16 @@ import datetime
 import numpy as np
 import matplotlib as mpl
 import matplotlib.pyplot as plt
+import os
+import re
+import uuid
 from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
 
 from logic.generic_logic import GenericLogic
 from core.util.mutex import Mutex
 from core.module import Connector, ConfigOption, StatusVar
+from core.util.scan_image import ScanImage
 
 
 class OldConfigFileError(Exception):
@@ -102,6 +107,11 @@ class ConfocalHistoryEntry(QtCore.QObject):
         self.tilt_slope_y = 0
         self.tilt_reference_x = 0
         self.tilt_reference_y = 0
+        self.image_dtype = confocal._image_dtype
+        # Directory of the image files of the serialized history. Images are serialized as arrays
+        # if it is None.
+        self.history_directory = confocal.history_directory
+        self.history_file_prefix = confocal.history_file_prefix
 
     def restore(self, confocal):
         """ Write data back into confocal logic and pull all the necessary strings """
@@ -133,17 +143,17 @@ class ConfocalHistoryEntry(QtCore.QObject):
         confocal.initialize_image()
         try:
             if confocal.xy_image.shape == self.xy_image.shape:
-                confocal.xy_image = np.copy(self.xy_image)
+                confocal.xy_image = self.xy_image.thaw()
         except AttributeError:
-            self.xy_image = np.copy(confocal.xy_image)
+            self.xy_image = confocal.xy_image.snapshot()
 
         confocal._zscan = True
         confocal.initialize_image()
         try:
             if confocal.depth_image.shape == self.depth_image.shape:
-                confocal.depth_image = np.copy(self.depth_image)
+                confocal.depth_image = self.depth_image.thaw()
         except AttributeError:
-            self.depth_image = np.copy(confocal.depth_image)
+            self.depth_image = confocal.depth_image.snapshot()
         confocal._zscan = False
 
     def snapshot(self, confocal):
@@ -172,8 +182,14 @@ class ConfocalHistoryEntry(QtCore.QObject):
         self.point1 = np.copy(confocal.point1)
         self.point2 = np.copy(confocal.point2)
         self.point3 = np.copy(confocal.point3)
-        self.xy_image = np.copy(confocal.xy_image)
-        self.depth_image = np.copy(confocal.depth_image)
+        # Snapshots share the image buffers until the images in confocal are modified
+        self.xy_image = confocal.xy_image.snapshot()
+        self.depth_image = confocal.depth_image.snapshot()
+
+    def compress(self):
+        """ Release the image data from memory until it is needed again """
+        self.xy_image.compress()
+        self.depth_image.compress()
 
     def serialize(self):
         """ Give out a dictionary that can be saved via the usual means """
@@ -197,10 +213,40 @@ class ConfocalHistoryEntry(QtCore.QObject):
         serialized['tilt_point3'] = list(self.point3)
         serialized['tilt_reference'] = [self.tilt_reference_x, self.tilt_reference_y]
         serialized['tilt_slope'] = [self.tilt_slope_x, self.tilt_slope_y]
-        serialized['xy_image'] = self.xy_image
-        serialized['depth_image'] = self.depth_image
+        serialized['xy_image'] = self._serialize_image(self.xy_image)
+        serialized['depth_image'] = self._serialize_image(self.depth_image)
         return serialized
 
+    def _serialize_image(self, image):
+        """ Save an image to the history directory unless it has been saved before.
+
+        @param ScanImage image: the image to serialize
+
+        @return: file name of the image in the history directory or the image as numpy array if no
+                 history directory is set
+        """
+        if self.history_directory is None:
+            return np.array(image)
+        if image.path is None or not os.path.isfile(image.path):
+            file_name = '{0}{1}.npz'.format(self.history_file_prefix, uuid.uuid4().hex)
+            image.save(os.path.join(self.history_directory, file_name))
+        return os.path.basename(image.path)
+
+    def _deserialize_image(self, serialized_image, horizontal_index, vertical_index):
+        """ Restore an image serialized by _serialize_image.
+
+        @return ScanImage: the image (a snapshot). Images from the history directory are only read
+                           when they are needed.
+        """
+        if isinstance(serialized_image, str):
+            if self.history_directory is None:
+                raise OldConfigFileError()
+            return ScanImage.load(os.path.join(self.history_directory, serialized_image))
+        if isinstance(serialized_image, np.ndarray):
+            return ScanImage.from_array(serialized_image, horizontal_index, vertical_index,
+                                        dtype=self.image_dtype).snapshot()
+        raise OldConfigFileError()
+
     def deserialize(self, serialized):
         """ Restore Confocal history object from a dict """
         if 'focus_position' in serialized and len(serialized['focus_position']) == 4:
@@ -237,15 +283,10 @@ class ConfocalHistoryEntry(QtCore.QObject):
         if 'tilt_point3' in serialized and len(serialized['tilt_point3']) == 3:
             self.point3 = np.array(serialized['tilt_point3'])
         if 'xy_image' in serialized:
-            if isinstance(serialized['xy_image'], np.ndarray):
-                self.xy_image = serialized['xy_image']
-            else:
-                raise OldConfigFileError()
+            self.xy_image = self._deserialize_image(serialized['xy_image'], 0, 1)
         if 'depth_image' in serialized:
-            if isinstance(serialized['depth_image'], np.ndarray):
-                self.depth_image = serialized['depth_image'].copy()
-            else:
-                raise OldConfigFileError()
+            self.depth_image = self._deserialize_image(
+                serialized['depth_image'], 0 if self.depth_img_is_xz else 1, 2)
 
 
 class ConfocalLogic(GenericLogic):
@@ -259,6 +300,22 @@ class ConfocalLogic(GenericLogic):
     confocalscanner1 = Connector(interface='ConfocalScannerInterface')
     savelogic = Connector(interface='SaveLogic')
 
+    # config options
+    # data type of the count rates in the images, e.g. 'float32' to halve their memory footprint
+    _image_dtype = ConfigOption('image_dtype', 'float64')
+    # directory of the image files of the saved history. Default is a subdirectory of the app
+    # status directory.
+    _history_directory = ConfigOption('history_directory', None)
+    # number of lines (with their return lines) passed to the scanner at once, 0 means whole frame.
+    # The scanner only outputs a pixel clock when scanning line by line (1).
+    _batch_scan_lines = ConfigOption('batch_scan_lines', 1)
+    # scan the next lines in a background thread while the counts of the previous lines are
+    # written to the image and displayed
+    _pipelined_scanning = ConfigOption('pipelined_scanning', False)
+    # maximal duration in seconds of the lines scanned at once in the background. A stop request
+    # waits for these lines, so this caps batch_scan_lines when pipelined scanning is enabled.
+    _max_pipelined_batch_time = ConfigOption('max_pipelined_batch_time', 0.5)
+
     # status vars
     _clock_frequency = StatusVar('clock_frequency', 500)
     return_slowness = StatusVar(default=50)
@@ -297,6 +354,10 @@ class ConfocalLogic(GenericLogic):
         self.depth_scan_dir_is_xz = True
         self.depth_img_is_xz = True
         self.permanent_scan = False
+        # first line, last line and future of the lines scanned in the background
+        self._pending_lines = None
+        # directory of the image files of the saved history, None if the images are saved as arrays
+        self.history_directory = None
 
     def on_activate(self):
         """ Initialisation performed during activation of the module.
@@ -309,6 +370,14 @@ class ConfocalLogic(GenericLogic):
         self.y_range = self._scanning_device.get_position_range()[1]
         self.z_range = self._scanning_device.get_position_range()[2]
 
+        # The images of the history are saved to files in this directory
+        self.history_directory = self._history_directory
+        if self.history_directory is None and self._manager is not None:
+            self.history_directory = os.path.join(self._manager.getStatusDir(),
+                                                  'confocal_history_{0}'.format(self._name))
+        if self.history_directory is not None:
+            os.makedirs(self.history_directory, exist_ok=True)
+
         # restore here ...
         self.history = []
         for i in reversed(range(1, self.max_history_length)):
@@ -337,6 +406,14 @@ class ConfocalLogic(GenericLogic):
 
         self.history_index = len(self.history) - 1
 
+        if self._batch_scan_lines != 1:
+            self.log.info('Scanning several lines at once. The scanner does not output a pixel '
+                          'clock.')
+
+        # Scans lines in the background if pipelined scanning is enabled
+        self._acquisition_executor = ThreadPoolExecutor(max_workers=1)
+        self._pending_lines = None
+
         # Sets connections between signals and functions
         self.signal_scan_lines_next.connect(self._scan_line, QtCore.Qt.QueuedConnection)
         self.signal_start_scanning.connect(self.start_scanner, QtCore.Qt.QueuedConnection)
@@ -349,15 +426,47 @@ class ConfocalLogic(GenericLogic):
 
         @return int: error code (0:OK, -1:error)
         """
+        self._discard_pending_lines()
+        self._acquisition_executor.shutdown(wait=True)
+
         closing_state = ConfocalHistoryEntry(self)
         closing_state.snapshot(self)
         self.history.append(closing_state)
         histindex = 0
+        image_files = set()
         for state in reversed(self.history):
-            self._statusVariables['history_{0}'.format(histindex)] = state.serialize()
+            serialized = state.serialize()
+            self._statusVariables['history_{0}'.format(histindex)] = serialized
+            image_files.update(serialized[key] for key in ('xy_image', 'depth_image')
+                               if isinstance(serialized[key], str))
             histindex += 1
+        self._remove_unused_history_files(image_files)
         return 0
 
+    @property
+    def history_file_prefix(self):
+        """ Prefix of the file names of the history images saved by this module. """
+        return 'confocal_history_{0}_'.format(self._name)
+
+    def _remove_unused_history_files(self, image_files):
+        """ Remove the image files of history entries that no longer exist.
+
+        Only files written by this module (see history_file_prefix) are removed, so the history
+        directory can be shared with other files and modules.
+
+        @param set image_files: file names of the images in the current history
+        """
+        if self.history_directory is None:
+            return
+        history_file = re.compile(re.escape(self.history_file_prefix) + r'[0-9a-f]{32}\.npz$')
+        for file_name in os.listdir(self.history_directory):
+            if history_file.match(file_name) and file_name not in image_files:
+                try:
+                    os.remove(os.path.join(self.history_directory, file_name))
+                except OSError:
+                    self.log.warning('Could not remove unused confocal history file "{0}".'
+                                     ''.format(file_name))
+
     def switch_hardware(self, to_on=False):
         """ Switches the Hardware off or on.
 
@@ -496,44 +605,34 @@ class ConfocalLogic(GenericLogic):
             if self.depth_img_is_xz:
                 #self._image_horz_axis = self._X
                 # creates an image where each pixel will be [x,y,z,counts]
-                self.depth_image = np.zeros((
-                        len(self._image_vert_axis),
-                        len(self._X),
-                        3 + len(self.get_scanner_count_channels())
-                    ))
-
-                self.depth_image[:, :, 0] = np.full(
-                    (len(self._image_vert_axis), len(self._X)), self._XL)
-
-                self.depth_image[:, :, 1] = self._current_y * np.ones(
-                    (len(self._image_vert_axis), len(self._X)))
-
-                z_value_matrix = np.full((len(self._X), len(self._image_vert_axis)), self._Z)
-                self.depth_image[:, :, 2] = z_value_matrix.transpose()
+                self.depth_image = ScanImage(
+                    horizontal_axis=self._XL,
+                    vertical_axis=self._Z,
+                    horizontal_index=0,
+                    vertical_index=2,
+                    position=(self._current_x, self._current_y, self._current_z),
+                    channels=len(self.get_scanner_count_channels()),
+                    dtype=self._image_dtype)
 
             # depth scan is yz plane instead of xz plane
             else:
                 #self._image_horz_axis = self._Y
                 # creats an image where each pixel will be [x,y,z,counts]
-                self.depth_image = np.zeros((
-                        len(self._image_vert_axis),
-                        len(self._Y),
-                        3 + len(self.get_scanner_count_channels())
-                    ))
-
-                self.depth_image[:, :, 0] = self._current_x * np.ones(
-                    (len(self._image_vert_axis), len(self._Y)))
-
-                self.depth_image[:, :, 1] = np.full(
-                    (len(self._image_vert_axis), len(self._Y)), self._YL)
-
-                z_value_matrix = np.full((len(self._Y), len(self._image_vert_axis)), self._Z)
-                self.depth_image[:, :, 2] = z_value_matrix.transpose()
+                self.depth_image = ScanImage(
+                    horizontal_axis=self._YL,
+                    vertical_axis=self._Z,
+                    horizontal_index=1,
+                    vertical_index=2,
+                    position=(self._current_x, self._current_y, self._current_z),
+                    channels=len(self.get_scanner_count_channels()),
+                    dtype=self._image_dtype)
 
                 # now we are scanning along the y-axis, so we need a new return line along Y:
                 self._return_YL = np.linspace(self._YL[-1], self._YL[0], self.return_slowness)
                 self._return_AL = np.zeros(self._return_YL.shape)
 
+            self._depth_return_lines = self._calc_return_lines(
+                self.depth_image, self._return_XL if self.depth_img_is_xz else self._return_YL)
             self.sigImageDepthInitialized.emit()
 
         # xy scan is in xy plane
@@ -541,23 +640,56 @@ class ConfocalLogic(GenericLogic):
             #self._image_horz_axis = self._X
             self._image_vert_axis = self._Y
             # creats an image where each pixel will be [x,y,z,counts]
-            self.xy_image = np.zeros((
-                    len(self._image_vert_axis),
-                    len(self._X),
-                    3 + len(self.get_scanner_count_channels())
-                ))
+            self.xy_image = ScanImage(
+                horizontal_axis=self._XL,
+                vertical_axis=self._Y,
+                horizontal_index=0,
+                vertical_index=1,
+                position=(self._current_x, self._current_y, self._current_z),
+                channels=len(self.get_scanner_count_channels()),
+                dtype=self._image_dtype)
+
+            self._xy_return_lines = self._calc_return_lines(self.xy_image, self._return_XL)
+            self.sigImageXYInitialized.emit()
+        return 0
 
-            self.xy_image[:, :, 0] = np.full(
-                (len(self._image_vert_axis), len(self._X)), self._XL)
+    def _calc_return_lines(self, image, return_line):
+        """ Precompute the scanner path of the return lines of an image. Apart from the horizontal
+        image axis they hold the positions of the scanner axes of each line, so the scan lines are
+        built from them when they are scanned (see _get_scan_lines). This avoids keeping the
+        scanner path of every pixel in memory.
 
-            y_value_matrix = np.full((len(self._X), len(self._image_vert_axis)), self._Y)
-            self.xy_image[:, :, 1] = y_value_matrix.transpose()
+        @param ScanImage image: the image to scan
+        @param numpy.ndarray return_line: positions of the horizontal image axis on the way back to
+                                          the start of the line
+
+        @return numpy.ndarray: return lines with shape (lines, scanner axes, len(return_line))
+        """
+        n_ch = len(self.get_scanner_axes())
+        return_lines = np.empty((image.shape[0], n_ch, len(return_line)))
+        for axis in range(min(n_ch, 3)):
+            if axis == image.horizontal_index:
+                return_lines[:, axis] = return_line
+            else:
+                return_lines[:, axis] = image.get_plane(axis)[:, :1]
+        if n_ch > 3:
+            return_lines[:, 3:] = self._current_a
+        return return_lines
 
-            self.xy_image[:, :, 2] = self._current_z * np.ones(
-                (len(self._image_vert_axis), len(self._X)))
+    def _get_scan_lines(self, first_line, last_line):
+        """ Build the scanner path of lines of the current image from the positions of their
+        return lines and the horizontal image axis.
 
-            self.sigImageXYInitialized.emit()
-        return 0
+        @param int first_line: index of the first line
+        @param int last_line: index after the last line
+
+        @return numpy.ndarray: scan lines with shape (lines, scanner axes, pixels)
+        """
+        image = self.depth_image if self._zscan else self.xy_image
+        return_lines = self._depth_return_lines if self._zscan else self._xy_return_lines
+        scan_lines = np.repeat(return_lines[first_line:last_line, :, :1], image.shape[1], axis=2)
+        scan_lines[:, image.horizontal_index] = image.horizontal_axis
+        return scan_lines
 
     def start_scanner(self):
         """Setting up the scanner device and starts the scanning procedure
@@ -714,6 +846,7 @@ class ConfocalLogic(GenericLogic):
         # stops scanning
         if self.stopRequested:
             with self.threadlock:
+                self._discard_pending_lines()
                 self.kill_scanner()
                 self.stopRequested = False
                 self.module_state.unlock()
@@ -731,107 +864,57 @@ class ConfocalLogic(GenericLogic):
                 if len(self.history) > self.max_history_length:
                     self.history.pop(0)
                 self.history_index = len(self.history) - 1
+                # only the latest entry keeps its images in memory
+                for old_history in self.history[:-1]:
+                    old_history.compress()
                 return
 
         image = self.depth_image if self._zscan else self.xy_image
-        n_ch = len(self.get_scanner_axes())
-        s_ch = len(self.get_scanner_count_channels())
 
         try:
-            if self._scan_counter == 0:
-                # make a line from the current cursor position to
-                # the starting position of the first scan line of the scan
-                rs = self.return_slowness
-                lsx = np.linspace(self._current_x, image[self._scan_counter, 0, 0], rs)
-                lsy = np.linspace(self._current_y, image[self._scan_counter, 0, 1], rs)
-                lsz = np.linspace(self._current_z, image[self._scan_counter, 0, 2], rs)
-                if n_ch <= 3:
-                    start_line = np.vstack([lsx, lsy, lsz][0:n_ch])
+            if self._pending_lines is None:
+                first_line, last_line = self._get_line_batch(self._scan_counter)
+                self._prepare_lines(first_line, last_line)
+                if self._pipelined_scanning:
+                    self._pending_lines = (first_line, last_line, self._acquisition_executor.submit(
+                        self._acquire_lines, first_line, last_line))
                 else:
-                    start_line = np.vstack(
-                        [lsx, lsy, lsz, np.ones(lsx.shape) * self._current_a])
-                # move to the start position of the scan, counts are thrown away
-                start_line_counts = self._scanning_device.scan_line(start_line)
-                if np.any(start_line_counts == -1):
-                    self.stopRequested = True
-                    self.signal_scan_lines_next.emit()
-                    return
-
-            # adjust z of line in image to current z before building the line
-            if not self._zscan:
-                z_shape = image[self._scan_counter, :, 2].shape
-                image[self._scan_counter, :, 2] = self._current_z * np.ones(z_shape)
-
-            # make a line in the scan, _scan_counter says which one it is
-            lsx = image[self._scan_counter, :, 0]
-            lsy = image[self._scan_counter, :, 1]
-            lsz = image[self._scan_counter, :, 2]
-            if n_ch <= 3:
-                line = np.vstack([lsx, lsy, lsz][0:n_ch])
-            else:
-                line = np.vstack(
-                    [lsx, lsy, lsz, np.ones(lsx.shape) * self._current_a])
-
-            # scan the line in the scan
-            line_counts = self._scanning_device.scan_line(line, pixel_clock=True)
-            if np.any(line_counts == -1):
-                self.stopRequested = True
-                self.signal_scan_lines_next.emit()
-                return
-
-            # make a line to go to the starting position of the next scan line
-            if self.depth_img_is_xz or not self._zscan:
-                if n_ch <= 3:
-                    return_line = np.vstack([
-                        self._return_XL,
-                        image[self._scan_counter, 0, 1] * np.ones(self._return_XL.shape),
-                        image[self._scan_counter, 0, 2] * np.ones(self._return_XL.shape)
-                    ][0:n_ch])
-                else:
-                    return_line = np.vstack([
-                            self._return_XL,
-                            image[self._scan_counter, 0, 1] * np.ones(self._return_XL.shape),
-                            image[self._scan_counter, 0, 2] * np.ones(self._return_XL.shape),
-                            np.ones(self._return_XL.shape) * self._current_a
-                        ])
-            else:
-                if n_ch <= 3:
-                    return_line = np.vstack([
-                            image[self._scan_counter, 0, 1] * np.ones(self._return_YL.shape),
-                            self._return_YL,
-                            image[self._scan_counter, 0, 2] * np.ones(self._return_YL.shape)
-                        ][0:n_ch])
-                else:
-                    return_line = np.vstack([
-                            image[self._scan_counter, 0, 1] * np.ones(self._return_YL.shape),
-                            self._return_YL,
-                            image[self._scan_counter, 0, 2] * np.ones(self._return_YL.shape),
-                            np.ones(self._return_YL.shape) * self._current_a
-                        ])
-
-            # return the scanner to the start of next line, counts are thrown away
-            return_line_counts = self._scanning_device.scan_line(return_line)
-            if np.any(return_line_counts == -1):
+                    line_counts = self._acquire_lines(first_line, last_line)
+
+            if self._pending_lines is not None:
+                first_line, last_line, acquisition = self._pending_lines
+                self._pending_lines = None
+                line_counts = acquisition.result()
+                # start the acquisition of the next lines while the counts of these lines are
+                # processed
+                if (line_counts is not None and not self.stopRequested
+                        and (last_line < len(image) or self.permanent_scan)):
+                    next_first_line, next_last_line = self._get_line_batch(last_line % len(image))
+                    self._prepare_lines(next_first_line, next_last_line)
+                    self._pending_lines = (
+                        next_first_line,
+                        next_last_line,
+                        self._acquisition_executor.submit(
+                            self._acquire_lines, next_first_line, next_last_line))
+
+            if line_counts is None:
                 self.stopRequested = True
                 self.signal_scan_lines_next.emit()
                 return
 
-            # update image with counts from the line we just scanned
+            # update image with counts from the lines we just scanned
             if self._zscan:
-                if self.depth_img_is_xz:
-                    self.depth_image[self._scan_counter, :, 3:3 + s_ch] = line_counts
-                else:
-                    self.depth_image[self._scan_counter, :, 3:3 + s_ch] = line_counts
+                self.depth_image.set_line_counts(slice(first_line, last_line), line_counts)
                 self.signal_depth_image_updated.emit()
             else:
-                self.xy_image[self._scan_counter, :, 3:3 + s_ch] = line_counts
+                self.xy_image.set_line_counts(slice(first_line, last_line), line_counts)
                 self.signal_xy_image_updated.emit()
 
             # next line in scan
-            self._scan_counter += 1
+            self._scan_counter = last_line
 
             # stop scanning when last line scan was performed and makes scan not continuable
-            if self._scan_counter >= np.size(self._image_vert_axis):
+            if self._scan_counter >= len(image):
                 if not self.permanent_scan:
                     self.stop_scanning()
                     if self._zscan:
@@ -847,6 +930,104 @@ class ConfocalLogic(GenericLogic):
             self.stop_scanning()
             self.signal_scan_lines_next.emit()
 
+    def _get_line_batch(self, first_line):
+        """ Get the lines of the current image to scan next.
+
+        @param int first_line: index of the first line
+
+        @return tuple: index of the first line and index after the last line
+        """
+        image = self.depth_image if self._zscan else self.xy_image
+        lines = len(image)
+        batch_lines = self._batch_scan_lines if self._batch_scan_lines > 0 else lines
+        if self._pipelined_scanning:
+            # A stop request can not abort the lines scanned in the background, so their duration
+            # is limited.
+            return_lines = self._depth_return_lines if self._zscan else self._xy_return_lines
+            line_time = (image.shape[1] + return_lines.shape[2]) / self._clock_frequency
+            max_lines = max(int(self._max_pipelined_batch_time / line_time), 1)
+            batch_lines = min(batch_lines, max_lines)
+        return first_line, min(first_line + batch_lines, lines)
+
+    def _prepare_lines(self, first_line, last_line):
+        """ Adjust the precomputed return lines of the current image to the current z (xy scan)
+        and a position before scanning the lines.
+
+        @param int first_line: index of the first line
+        @param int last_line: index after the last line
+        """
+        return_lines = self._depth_return_lines if self._zscan else self._xy_return_lines
+        if not self._zscan:
+            self.xy_image.set_fixed_position(slice(first_line, last_line), self._current_z)
+            return_lines[first_line:last_line, 2] = self._current_z
+        if return_lines.shape[1] > 3:
+            return_lines[first_line:last_line, 3:] = self._current_a
+
+    def _acquire_lines(self, first_line, last_line):
+        """ Scan lines of the current image with their return lines. The counts are not written to
+        the image, so this can run in the background while the previous lines are processed.
+
+        @param int first_line: index of the first line
+        @param int last_line: index after the last line
+
+        @return numpy.ndarray: counts with shape (lines, pixels, channels) or None if the scanner
+                               reported an error
+        """
+        return_lines = self._depth_return_lines if self._zscan else self._xy_return_lines
+        scan_lines = self._get_scan_lines(first_line, last_line)
+        n_ch = scan_lines.shape[1]
+        if first_line == 0:
+            # make a line from the current cursor position to
+            # the starting position of the first scan line of the scan
+            current_pos = [self._current_x, self._current_y, self._current_z, self._current_a]
+            start_line = np.linspace(current_pos[:n_ch], scan_lines[0, :, 0],
+                                     self.return_slowness, axis=1)
+            # move to the start position of the scan, counts are thrown away
+            start_line_counts = self._scanning_device.scan_line(start_line)
+            if np.any(start_line_counts == -1):
+                return None
+
+        # The pixel clock is only output when scanning line by line. Within a batch it would also
+        # be output for the pixels of the return lines.
+        pixel_clock = self._batch_scan_lines == 1
+
+        # The scanner gets copies of the precomputed return lines since it may modify them (e.g.
+        # the tilt correction).
+        if last_line - first_line == 1:
+            # scan the line in the scan
+            line_counts = self._scanning_device.scan_line(scan_lines[0], pixel_clock=pixel_clock)
+            if np.any(line_counts == -1):
+                return None
+
+            # return the scanner to the start of next line, counts are thrown away
+            return_line_counts = self._scanning_device.scan_line(return_lines[first_line].copy())
+            if np.any(return_line_counts == -1):
+                return None
+            return np.asarray(line_counts)[np.newaxis]
+
+        # scan several lines each followed by its return line in a single call. The counts of the
+        # return lines are thrown away.
+        batch_path = np.concatenate((scan_lines, return_lines[first_line:last_line]), axis=2)
+        batch_counts = self._scanning_device.scan_line(
+            batch_path.transpose(1, 0, 2).reshape(n_ch, -1), pixel_clock=pixel_clock)
+        if np.any(batch_counts == -1):
+            return None
+        batch_counts = np.reshape(batch_counts, (last_line - first_line, batch_path.shape[2], -1))
+        return batch_counts[:, :scan_lines.shape[2]]
+
+    def _discard_pending_lines(self):
+        """ Wait until the scanner has finished the lines acquired in the background and throw
+        away their counts. These lines will be scanned again when the scan is continued.
+        """
+        if self._pending_lines is None:
+            return
+        acquisition = self._pending_lines[2]
+        self._pending_lines = None
+        try:
+            acquisition.result()
+        except:
+            self.log.exception('Scanning lines in the background failed.')
+
     def save_xy_data(self, colorscale_range=None, percentile_range=None):
         """ Save the current confocal xy data to file.
 
@@ -22,13 +22,16 @@ top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi
 from qtpy import QtCore
 from collections import OrderedDict
 import numpy as np
+import os
 import time
 import matplotlib.pyplot as plt
 
-from core.module import Connector, StatusVar
+from core.module import Connector, ConfigOption, StatusVar
 from logic.generic_logic import GenericLogic
 from interface.slow_counter_interface import CountingMode
 from core.util.mutex import Mutex
+from core.util.ring_buffer import RingBuffer
+from core.util.data_stream import ChunkedDataStream
 
 
 class CounterLogic(GenericLogic):
@@ -62,6 +65,12 @@ class CounterLogic(GenericLogic):
     counter1 = Connector(interface='SlowCounterInterface')
     savelogic = Connector(interface='SaveLogic')
 
+    # config options
+    # Number of saved samples streamed to disk at once while saving. 0 keeps all samples in memory.
+    _save_chunk_rows = ConfigOption('save_chunk_rows', 10000)
+    # File type of the saved count trace (see SaveLogic.save_data)
+    _save_filetype = ConfigOption('save_filetype', 'text')
+
     # status vars
     _count_length = StatusVar('count_length', 300)
     _smooth_window_length = StatusVar('smooth_window_length', 10)
@@ -98,6 +107,15 @@ class CounterLogic(GenericLogic):
         self._counting_mode = CountingMode['CONTINUOUS']
 
         self._saving = False
+
+        # Channel names of the counting device. Queried from the hardware upon activation and
+        # when starting the counter.
+        self._channels = list()
+        # Circular buffers of the count trace and the smoothed count trace
+        self._count_buffer = None
+        self._smoothed_buffer = None
+        # Sorted counts of the latest smoothing window of each channel
+        self._sorted_window = None
         return
 
     def on_activate(self):
@@ -115,9 +133,11 @@ class CounterLogic(GenericLogic):
         number_of_detectors = constraints.max_detectors
 
         # initialize data arrays
-        self.countdata = np.zeros([len(self.get_channels()), self._count_length])
-        self.countdata_smoothed = np.zeros([len(self.get_channels()), self._count_length])
-        self.rawdata = np.zeros([len(self.get_channels()), self._counting_samples])
+        self._channels = self._counting_device.get_counter_channels()
+        self._count_buffer = RingBuffer(len(self._channels), self._count_length)
+        self._smoothed_buffer = RingBuffer(len(self._channels), self._count_length)
+        self._sorted_window = None
+        self.rawdata = np.zeros([len(self._channels), self._counting_samples])
         self._already_counted_samples = 0  # For gated counting
         self._data_to_save = []
 
@@ -140,9 +160,29 @@ class CounterLogic(GenericLogic):
         if self.module_state() == 'locked':
             self._stopCount_wait()
 
+        # Remove the stream file of the last saved data
+        if isinstance(self._data_to_save, ChunkedDataStream):
+            self._data_to_save.remove_file()
+
         self.sigCountDataNext.disconnect()
         return
 
+    @property
+    def countdata(self):
+        """
+        Count trace of all channels with shape (channels, count_length), latest count last.
+        This is a view of the circular count buffer, i.e. it is updated in place while counting.
+        """
+        return self._count_buffer.data
+
+    @property
+    def countdata_smoothed(self):
+        """
+        Median smoothed count trace of all channels with shape (channels, count_length).
+        This is a view of the circular buffer, i.e. it is updated in place while counting.
+        """
+        return self._smoothed_buffer.data
+
     def get_hardware_constraints(self):
         """
         Retrieve the hardware constrains from the counter device.
@@ -266,8 +306,21 @@ class CounterLogic(GenericLogic):
         @return bool: saving state
         """
         if not resume:
-            self._data_to_save = []
+            if isinstance(self._data_to_save, ChunkedDataStream):
+                self._data_to_save.remove_file()
             self._saving_start_time = time.time()
+            if self._save_chunk_rows > 0:
+                self._data_to_save = ChunkedDataStream(self._get_stream_path(),
+                                                       self._get_saved_columns(),
+                                                       chunk_rows=self._save_chunk_rows)
+            else:
+                self._data_to_save = []
+        elif isinstance(self._data_to_save, ChunkedDataStream):
+            # continue writing the closed stream of the previous saving
+            self._data_to_save = ChunkedDataStream(self._data_to_save.path,
+                                                   self._data_to_save.columns,
+                                                   chunk_rows=self._save_chunk_rows,
+                                                   append=True)
 
         self._saving = True
 
@@ -290,6 +343,9 @@ class CounterLogic(GenericLogic):
         # stop saving thus saving state has to be set to False
         self._saving = False
         self._saving_stop_time = time.time()
+        # write all streamed samples to disk
+        if isinstance(self._data_to_save, ChunkedDataStream):
+            self._data_to_save.close()
 
         # write the parameters:
         parameters = OrderedDict()
@@ -311,20 +367,37 @@ class CounterLogic(GenericLogic):
             for i, detector in enumerate(self.get_channels()):
                 header = header + ',Signal{0} (counts/s)'.format(i)
 
-            data = {header: self._data_to_save}
+            data = {header: np.array(self._data_to_save)}
             filepath = self._save_logic.get_path_for_module(module_name='Counter')
 
             if save_figure:
-                fig = self.draw_figure(data=np.array(self._data_to_save))
+                fig = self.draw_figure(data=data[header])
             else:
                 fig = None
             self._save_logic.save_data(data, filepath=filepath, parameters=parameters,
-                                       filelabel=filelabel, plotfig=fig, delimiter='\t')
+                                       filelabel=filelabel, plotfig=fig, delimiter='\t',
+                                       filetype=self._save_filetype)
             self.log.info('Counter Trace saved to:\n{0}'.format(filepath))
 
         self.sigSavingStatusChanged.emit(self._saving)
         return self._data_to_save, parameters
 
+    def _get_stream_path(self):
+        """
+        Returns the path of the binary file the saved samples are streamed to.
+        """
+        filename = time.strftime('%Y%m%d-%H%M-%S', time.localtime(self._saving_start_time))
+        return os.path.join(self._save_logic.get_path_for_module(module_name='Counter'),
+                            filename + '_count_trace_stream.bin')
+
+    def _get_saved_columns(self):
+        """
+        Returns the number of columns of the saved samples (time and counts of each channel).
+        """
+        if self._counting_mode == CountingMode['GATED']:
+            return 2
+        return len(self._channels) + 1
+
     def draw_figure(self, data):
         """ Draw figure to save with data file.
 
@@ -428,10 +501,12 @@ class CounterLogic(GenericLogic):
                 return -1
 
             # initialising the data arrays
-            self.rawdata = np.zeros([len(self.get_channels()), self._counting_samples])
-            self.countdata = np.zeros([len(self.get_channels()), self._count_length])
-            self.countdata_smoothed = np.zeros([len(self.get_channels()), self._count_length])
-            self._sampling_data = np.empty([len(self.get_channels()), self._counting_samples])
+            self._channels = self._counting_device.get_counter_channels()
+            self.rawdata = np.zeros([len(self._channels), self._counting_samples])
+            self._count_buffer = RingBuffer(len(self._channels), self._count_length)
+            self._smoothed_buffer = RingBuffer(len(self._channels), self._count_length)
+            self._sorted_window = None
+            self._sampling_data = np.empty([len(self._channels), self._counting_samples])
 
             # the sample index for gated counting
             self._already_counted_samples = 0
@@ -512,9 +587,7 @@ class CounterLogic(GenericLogic):
         else:
             filelabel = 'snapshot_count_trace_' + name_tag
 
-        stop_time = self._count_length / self._count_frequency
-        time_step_size = stop_time / len(self.countdata)
-        x_axis = np.arange(0, stop_time, time_step_size)
+        x_axis = np.arange(self._count_length) / self._count_frequency
 
         # prepare the data in a dict or in an OrderedDict:
         data = OrderedDict()
@@ -546,48 +619,73 @@ class CounterLogic(GenericLogic):
 
     def get_channels(self):
         """ Shortcut for hardware get_counter_channels.
+            The channels are queried from the hardware upon activation and when starting the
+            counter.
 
             @return list(str): return list of active counter channel names
         """
-        return self._counting_device.get_counter_channels()
+        return list(self._channels)
+
+    def _append_counts(self, counts):
+        """
+        Appends the latest counts of each channel to the count trace and updates the smoothed
+        count trace with the median of the latest window of counts.
+        The median is also assigned to the latest half window of the smoothed trace.
+
+        The smoother keeps the counts of the window sorted per channel. Instead of recomputing the
+        median over the window on every tick, the count dropping out of the window is removed and
+        the new count is inserted at its sorted position.
+
+        @param counts: scalar or array of shape (channels,), the latest counts
+        """
+        window = min(self._smooth_window_length, self._count_buffer.length)
+        shape = (self._count_buffer.channels, window)
+        if self._sorted_window is None or self._sorted_window.shape != shape:
+            self._sorted_window = np.sort(self._count_buffer.data[:, -window:], axis=1)
+        # Count of each channel dropping out of the window
+        dropped = self._count_buffer.data[:, -window].copy()
+        self._count_buffer.append(counts)
+        for row, old, new in zip(self._sorted_window, dropped, self._count_buffer.latest):
+            i = np.searchsorted(row, old)
+            row[i:-1] = row[i + 1:]
+            i = np.searchsorted(row[:-1], new)
+            row[i + 1:] = row[i:-1]
+            row[i] = new
+
+        half = window // 2
+        if window % 2:
+            medians = self._sorted_window[:, half]
+        else:
+            medians = (self._sorted_window[:, half - 1] + self._sorted_window[:, half]) / 2
+        self._smoothed_buffer.append(medians)
+        self._smoothed_buffer.set_latest(medians, int(self._smooth_window_length / 2) + 1)
+        return
 
     def _process_data_continous(self):
         """
         Processes the raw data from the counting device
         @return:
         """
-        for i, ch in enumerate(self.get_channels()):
-            # remember the new count data in circular array
-            self.countdata[i, 0] = np.average(self.rawdata[i])
-        # move the array to the left to make space for the new data
-        self.countdata = np.roll(self.countdata, -1, axis=1)
-        # also move the smoothing array
-        self.countdata_smoothed = np.roll(self.countdata_smoothed, -1, axis=1)
-        # calculate the median and save it
-        window = -int(self._smooth_window_length / 2) - 1
-        for i, ch in enumerate(self.get_channels()):
-            self.countdata_smoothed[i, window:] = np.median(self.countdata[i,
-                                                            -self._smooth_window_length:])
+        # remember the new count data in circular array
+        # and calculate the median
+        self._append_counts(np.mean(self.rawdata[:len(self._channels)], axis=1))
 
         # save the data if necessary
         if self._saving:
              # if oversampling is necessary
             if self._counting_samples > 1:
-                chans = self.get_channels()
-                self._sampling_data = np.empty([len(chans) + 1, self._counting_samples])
-                self._sampling_data[0, :] = time.time() - self._saving_start_time
-                for i, ch in enumerate(chans):
-                    self._sampling_data[i+1, 0] = self.rawdata[i]
+                chans = self._channels
+                self._sampling_data = np.empty([self._counting_samples, len(chans) + 1])
+                self._sampling_data[:, 0] = time.time() - self._saving_start_time
+                self._sampling_data[:, 1:] = self.rawdata[:len(chans)].transpose()
 
                 self._data_to_save.extend(list(self._sampling_data))
             # if we don't want to use oversampling
             else:
                 # append tuple to data stream (timestamp, average counts)
-                chans = self.get_channels()
-                newdata = np.empty((len(chans) + 1, ))
+                newdata = np.empty((len(self._channels) + 1, ))
                 newdata[0] = time.time() - self._saving_start_time
-                for i, ch in enumerate(chans):
-                    newdata[i+1] = self.countdata[i, -1]
+                newdata[1:] = self._count_buffer.latest
                 self._data_to_save.append(newdata)
         return
 
@@ -597,14 +695,8 @@ class CounterLogic(GenericLogic):
         @return:
         """
         # remember the new count data in circular array
-        self.countdata[0] = np.average(self.rawdata[0])
-        # move the array to the left to make space for the new data
-        self.countdata = np.roll(self.countdata, -1)
-        # also move the smoothing array
-        self.countdata_smoothed = np.roll(self.countdata_smoothed, -1)
-        # calculate the median and save it
-        self.countdata_smoothed[-int(self._smooth_window_length / 2) - 1:] = np.median(
-            self.countdata[-self._smooth_window_length:])
+        # and calculate the median
+        self._append_counts(np.average(self.rawdata[0]))
 
         # save the data if necessary
         if self._saving:
@@ -618,7 +710,7 @@ class CounterLogic(GenericLogic):
             else:
                 # append tuple to data stream (timestamp, average counts)
                 self._data_to_save.append(np.array((time.time() - self._saving_start_time,
-                                                    self.countdata[-1])))
+                                                    self._count_buffer.latest[0])))
         return
 
     def _process_data_finite_gated(self):
@@ -626,17 +718,14 @@ class CounterLogic(GenericLogic):
         Processes the raw data from the counting device
         @return:
         """
-        if self._already_counted_samples+len(self.rawdata[0]) >= len(self.countdata):
-            needed_counts = len(self.countdata) - self._already_counted_samples
-            self.countdata[0:needed_counts] = self.rawdata[0][0:needed_counts]
-            self.countdata = np.roll(self.countdata, -needed_counts)
+        if self._already_counted_samples+len(self.rawdata[0]) >= self._count_length:
+            needed_counts = self._count_length - self._already_counted_samples
+            self._count_buffer.extend(self.rawdata[:len(self._channels), 0:needed_counts])
             self._already_counted_samples = 0
             self.stopRequested = True
         else:
-            # replace the first part of the array with the new data:
-            self.countdata[0:len(self.rawdata[0])] = self.rawdata[0]
-            # roll the array by the amount of data it had been inserted:
-            self.countdata = np.roll(self.countdata, -len(self.rawdata[0]))
+            # append the new data to the circular array:
+            self._count_buffer.extend(self.rawdata[:len(self._channels)])
             # increment the index counter:
             self._already_counted_samples += len(self.rawdata[0])
         return
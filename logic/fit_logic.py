@@ -20,20 +20,76 @@ Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
 top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
 """
 
+import copy
+import functools
 import importlib
 import inspect
+import multiprocessing
+import os
+import threading
 import lmfit
 from qtpy import QtCore
 import numpy as np
 from os import listdir
 from os.path import isfile, join
 from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from distutils.version import LooseVersion
 
 from logic.generic_logic import GenericLogic
 from core.util.modules import get_main_dir
 from core.util.mutex import Mutex
 from core.config import load, save
+from core.module import ConfigOption
+
+
+def cached_model_maker(make_model):
+    """ Decorator caching the (model, parameters) tuples returned by a make_*_model method of
+    FitLogic per method and arguments (e.g. prefix).
+
+    The cached lmfit model is shared by all callers and must not be altered, whereas a copy of the
+    cached parameters is returned on each call. make_*_model methods called while building
+    another model are not cached, since they are usually altered by the calling method.
+    """
+    @functools.wraps(make_model)
+    def wrapper(self, *args, **kwargs):
+        if not self.cache_models or getattr(self._model_build_state, 'depth', 0) > 0:
+            return make_model(self, *args, **kwargs)
+        key = (make_model.__name__, args, tuple(sorted(kwargs.items())))
+        try:
+            model, params = self._model_cache[key]
+        except KeyError:
+            self._model_build_state.depth = 1
+            try:
+                model, params = make_model(self, *args, **kwargs)
+            finally:
+                self._model_build_state.depth = 0
+            self._model_cache[key] = (model, params)
+        except TypeError:
+            # unhashable arguments
+            return make_model(self, *args, **kwargs)
+        return model, copy.deepcopy(params)
+    return wrapper
+
+
+# FitLogic instance of a worker process fitting data sets for FitLogic.do_batch_fit
+_batch_fit_logic = None
+
+
+def init_batch_fit_worker(cache_models):
+    """ Initializer of worker processes for FitLogic.do_batch_fit.
+
+    @param bool cache_models: value of the ConfigOption cache_models of the worker's FitLogic
+    """
+    global _batch_fit_logic
+    _batch_fit_logic = FitLogic(manager=None, name='batch_fit_worker',
+                                config={'cache_models': cache_models})
+    return
+
+
+def batch_fit_worker(*args, **kwargs):
+    """ Fit data sets in a worker process. See FitLogic.fit_data_sets for the arguments. """
+    return _batch_fit_logic.fit_data_sets(*args, **kwargs)
 
 
 class FitLogic(GenericLogic):
@@ -54,10 +110,21 @@ class FitLogic(GenericLogic):
     _modclass = 'fitlogic'
     _modtype = 'logic'
 
+    # Reuse the models and parameters created by the make_*_model methods
+    cache_models = ConfigOption('cache_models', True)
+    # Number of worker processes of do_batch_fit. 0 means number of CPUs, 1 fits in the calling
+    # thread.
+    _batch_fit_processes = ConfigOption('batch_fit_processes', 0)
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         # locking for thread safety
         self.lock = Mutex()
+        # (make_*_model method name, args, kwargs) -> (model, params)
+        self._model_cache = dict()
+        self._model_build_state = threading.local()
+        # Worker processes of do_batch_fit. Started upon first use.
+        self._batch_fit_executor = None
 
         filenames = []
         # for path in directories:
@@ -89,7 +156,10 @@ class FitLogic(GenericLogic):
                     method_str = str(method)
                     try:
                         # import methods in Fitlogic
-                        setattr(FitLogic, method, ref)
+                        if method_str.startswith('make_') and method_str.endswith('_model'):
+                            setattr(FitLogic, method, cached_model_maker(ref))
+                        else:
+                            setattr(FitLogic, method, ref)
                         # append method to a list of methods to include in the fit_list dictionary
                         if method_str.startswith('make_') and method_str.endswith('_fit'):
                             fits_for_dict.append(method_str.split('_', 1)[1].rsplit('_', 1)[0])
@@ -157,7 +227,139 @@ class FitLogic(GenericLogic):
 
     def on_deactivate(self):
         """ """
-        pass
+        with self.lock:
+            if self._batch_fit_executor is not None:
+                self._batch_fit_executor.shutdown(wait=True)
+                self._batch_fit_executor = None
+        self.clear_model_cache()
+
+    def clear_model_cache(self):
+        """ Remove all cached models and parameters of the make_*_model methods. """
+        self._model_cache.clear()
+
+    def do_batch_fit(self, fit_function, x_data, y_data, estimator='generic', dimension='1d',
+                     add_params=None):
+        """ Fit many data sets with a common x axis, e.g. the ODMR spectra of all POIs or of all
+        points of a magnet alignment scan.
+
+        Initial values are calculated for all data sets at once if a vectorized estimator
+        batch_estimate_<fit function>[_<estimator>] exists (see e.g.
+        batch_estimate_lorentzian_dip). Otherwise the estimator is called for each data set. The
+        data sets are fitted in parallel by worker processes (ConfigOption batch_fit_processes).
+
+        @param str fit_function: name of the fit function in fit_list, e.g. 'lorentzian'
+        @param numpy.array x_data: 1D array with the common x values
+        @param numpy.array y_data: 2D array with one data set per row
+        @param str estimator: name of the estimator of the fit function, e.g. 'dip'
+        @param str dimension: dimension of the fit function, '1d', '2d' or '3d'
+        @param Parameters or dict add_params: optional, parameters which will be used instead of
+                                              the values from the estimator (see
+                                              _substitute_params)
+
+        @return tuple (param_names, values, errors, success):
+            list param_names: names of the fit parameters
+            numpy.array values: fitted parameter values with shape (data sets, parameters)
+            numpy.array errors: standard errors of the fitted parameter values with shape
+                                (data sets, parameters). NaN if not available.
+            numpy.array success: bool array, True for each data set that was fitted successfully
+        """
+        x_data = np.asarray(x_data, dtype=float)
+        y_data = np.atleast_2d(np.asarray(y_data, dtype=float))
+        if fit_function not in self.fit_list[dimension]:
+            raise KeyError('Fit function "{0}" not found in FitLogic {1} fit list.'
+                           ''.format(fit_function, dimension))
+        if estimator not in self.fit_list[dimension][fit_function]:
+            raise KeyError('Estimator "{0}" not found for fit function "{1}".'
+                           ''.format(estimator, fit_function))
+
+        # Calculate the initial values of all data sets at once if possible
+        batch_estimator_name = 'batch_estimate_' + fit_function
+        if estimator != 'generic':
+            batch_estimator_name += '_' + estimator
+        batch_estimator = getattr(self, batch_estimator_name, None)
+        estimates = None if batch_estimator is None else batch_estimator(x_data, y_data)
+
+        processes = int(self._batch_fit_processes)
+        if processes <= 0:
+            processes = os.cpu_count() or 1
+        number_of_chunks = min(4 * processes, y_data.shape[0]) if processes > 1 else 1
+        chunks = np.array_split(np.arange(y_data.shape[0]), number_of_chunks)
+        jobs = list()
+        for indices in chunks:
+            chunk_estimates = None
+            if estimates is not None:
+                chunk_estimates = [(name, {key: value[indices] if np.ndim(value) > 0 else value
+                                           for key, value in kwargs.items()})
+                                   for name, kwargs in estimates]
+            jobs.append((fit_function, dimension, estimator, x_data, y_data[indices],
+                         chunk_estimates, add_params, int(indices[0])))
+
+        if number_of_chunks == 1:
+            results = [self.fit_data_sets(*job) for job in jobs]
+        else:
+            with self.lock:
+                if self._batch_fit_executor is None:
+                    self._batch_fit_executor = ProcessPoolExecutor(
+                        max_workers=processes,
+                        mp_context=multiprocessing.get_context('spawn'),
+                        initializer=init_batch_fit_worker,
+                        initargs=(self.cache_models,))
+                executor = self._batch_fit_executor
+            results = list(executor.map(batch_fit_worker, *zip(*jobs)))
+
+        param_names = results[0][0]
+        values = np.concatenate([result[1] for result in results], axis=0)
+        errors = np.concatenate([result[2] for result in results], axis=0)
+        success = np.concatenate([result[3] for result in results], axis=0)
+        return param_names, values, errors, success
+
+    def fit_data_sets(self, fit_function, dimension, estimator, x_data, y_data, estimates=None,
+                      add_params=None, first_index=0):
+        """ Fit data sets one after the other. Used by do_batch_fit.
+
+        @param str fit_function: name of the fit function in fit_list
+        @param str dimension: dimension of the fit function
+        @param str estimator: name of the estimator of the fit function
+        @param numpy.array x_data: 1D array with the common x values
+        @param numpy.array y_data: 2D array with one data set per row
+        @param list estimates: optional, initial values of all data sets as returned by a
+                               batch_estimate_* method. Used instead of the estimator.
+        @param Parameters or dict add_params: optional, parameters which will be used instead of
+                                              the values from the estimator
+        @param int first_index: optional, row of the first data set in the y_data passed to
+                                do_batch_fit. Used to report failed fits.
+
+        @return tuple (param_names, values, errors, success): see do_batch_fit
+        """
+        fit_methods = self.fit_list[dimension][fit_function]
+        param_names = list(fit_methods['make_model']()[1])
+        values = np.full((y_data.shape[0], len(param_names)), np.nan)
+        errors = np.full((y_data.shape[0], len(param_names)), np.nan)
+        success = np.zeros(y_data.shape[0], dtype=bool)
+
+        for index, data in enumerate(y_data):
+            if estimates is None:
+                estimator_method = fit_methods[estimator]
+            else:
+                def estimator_method(x_axis, data, params, index=index):
+                    for name, kwargs in estimates:
+                        params[name].set(**{key: value[index] if np.ndim(value) > 0 else value
+                                            for key, value in kwargs.items()})
+                    return 0, params
+            try:
+                result = fit_methods['make_fit'](x_axis=x_data, data=data,
+                                                 estimator=estimator_method,
+                                                 add_params=add_params)
+            except Exception as e:
+                self.log.warning('Fit "{0}" of data set {1:d} failed: {2}'
+                                 ''.format(fit_function, first_index + index, e))
+                continue
+            for column, name in enumerate(param_names):
+                values[index, column] = result.params[name].value
+                if result.params[name].stderr is not None:
+                    errors[index, column] = result.params[name].stderr
+            success[index] = result.success
+        return param_names, values, errors, success
 
     def validate_load_fits(self, fits):
         """ Take fit names and estimators from a dict and check if they are valid.
@@ -482,6 +482,47 @@ def find_offset_parameter(self, x_values=None, data=None):
 
     return data_smooth, offset
 
+def batch_find_offset_parameter(self, x_values, data):
+    """ Vectorized version of find_offset_parameter for many data sets with a
+    common x axis.
+
+    @param array x_values: x values
+    @param array data: 2D array with one data set per row
+
+    @return float array data_smooth: smoothed data sets
+    @return float array offset: estimated offset of each data set
+    """
+    # lorentzian filter
+    mod, params = self.make_lorentzian_model()
+
+    if len(x_values) < 20.:
+        len_x = 5
+    elif len(x_values) >= 100.:
+        len_x = 10
+    else:
+        len_x = int(len(x_values)/10.)+1
+
+    lorentz = mod.eval(x=np.linspace(0, len_x, len_x), amplitude=1, offset=0.,
+                       sigma=len_x/4., center=len_x/2.)
+    # The normalized filter allows to pad each data set with its own maximum
+    data_max = data.max(axis=1)[:, np.newaxis]
+    data_smooth = filters.convolve1d(data - data_max, lorentz/lorentz.sum(), axis=1,
+                                     mode='constant', cval=0.) + data_max
+
+    # finding most frequent value which is supposed to be the offset. Same
+    # binning as numpy.histogram with 10 bins for each data set.
+    lower = data_smooth.min(axis=1)
+    width = data_smooth.max(axis=1) - lower
+    lower[width == 0] -= 0.5
+    width[width == 0] = 1.
+    bins = np.floor((data_smooth - lower[:, np.newaxis]) / width[:, np.newaxis] * 10)
+    bins = np.clip(bins, 0, 9).astype(int)
+    bins += 10 * np.arange(data.shape[0])[:, np.newaxis]
+    hist = np.bincount(bins.ravel(), minlength=10 * data.shape[0]).reshape(-1, 10)
+    offset = lower + (hist.argmax(axis=1) + 0.5) * width / 10
+
+    return data_smooth, offset
+
 ############################################################################
 #                                                                          #
 #             Additional routines with gaussian-like filter              #
@@ -429,6 +429,64 @@ def estimate_lorentzian_peak (self, x_axis, data, params):
 
     return error, params
 
+def batch_estimate_lorentzian_dip(self, x_axis, data):
+    """ Vectorized version of estimate_lorentzian_dip for many data sets with a
+    common x axis. Used by FitLogic.do_batch_fit.
+
+    @param numpy.array x_axis: 1D axis values
+    @param numpy.array data: 2D data, one data set per row with the dimension of x_axis.
+
+    @return list estimates: tuples (parameter name, dict keyword arguments) for
+                            lmfit.Parameter.set in the order they have to be
+                            applied. The keyword values are scalars or 1D arrays
+                            with one value per data set.
+    """
+    # check if input x-axis is ordered and increasing
+    sorted_indices = np.argsort(x_axis)
+    if not np.all(sorted_indices == np.arange(len(x_axis))):
+        x_axis = x_axis[sorted_indices]
+        data = data[:, sorted_indices]
+
+    data_smooth, offset = self.batch_find_offset_parameter(x_axis, data)
+
+    data_level = data_smooth - offset[:, np.newaxis]
+    amplitude = data_level.min(axis=1)
+
+    # the integral of the linear spline is the trapezoidal integral
+    numerical_integral = np.sum((data_level[:, 1:] + data_level[:, :-1]) * np.diff(x_axis),
+                                axis=1) / 2
+
+    x_zero = x_axis[np.argmin(data_smooth, axis=1)]
+    sigma = np.abs(numerical_integral / (np.pi * amplitude))
+
+    # auxiliary variables
+    stepsize = x_axis[1] - x_axis[0]
+    n_steps = len(x_axis)
+
+    return [('amplitude', {'value': amplitude, 'max': -1e-12}),
+            ('sigma', {'value': sigma, 'min': stepsize / 2,
+                       'max': (x_axis[-1] - x_axis[0]) * 10}),
+            ('center', {'value': x_zero, 'min': (x_axis[0]) - n_steps * stepsize,
+                        'max': (x_axis[-1]) + n_steps * stepsize}),
+            ('offset', {'value': offset})]
+
+def batch_estimate_lorentzian_peak(self, x_axis, data):
+    """ Vectorized version of estimate_lorentzian_peak for many data sets with a
+    common x axis. Used by FitLogic.do_batch_fit.
+
+    @param numpy.array x_axis: 1D axis values
+    @param numpy.array data: 2D data, one data set per row with the dimension of x_axis.
+
+    @return list estimates: see batch_estimate_lorentzian_dip
+    """
+    estimates = OrderedDict(self.batch_estimate_lorentzian_dip(x_axis, -data))
+    return [('amplitude', estimates['amplitude']),
+            ('sigma', estimates['sigma']),
+            ('center', estimates['center']),
+            ('offset', {'value': -estimates['offset']['value']}),
+            ('amplitude', {'value': -estimates['amplitude']['value'],
+                           'min': -1e-12, 'max': np.inf})]
+
 
 ################################################################################
 #                   Double Lorentzian with offset fitting                      #
@@ -25,6 +25,7 @@ from collections import OrderedDict
 from interface.microwave_interface import MicrowaveMode
 from interface.microwave_interface import TriggerEdge
 import numpy as np
+import os
 import time
 import datetime
 import matplotlib.pyplot as plt
@@ -32,6 +33,7 @@ import lmfit
 
 from logic.generic_logic import GenericLogic
 from core.util.mutex import Mutex
+from core.util.sweep_store import SweepStore
 from core.module import Connector, ConfigOption, StatusVar
 
 
@@ -54,6 +56,9 @@ class ODMRLogic(GenericLogic):
                     'LIST',
                     missing='warn',
                     converter=lambda x: MicrowaveMode[x.upper()])
+    # Maximum size of the raw data of all sweeps kept in memory in MB. Older sweeps are moved to
+    # a file in the ODMR data directory if exceeded. 0 means no limit.
+    _raw_data_memory_budget = ConfigOption('raw_data_memory_budget', 256)
 
     clock_frequency = StatusVar('clock_frequency', 200)
     cw_mw_frequency = StatusVar('cw_mw_frequency', 2870e6)
@@ -124,12 +129,11 @@ class ODMRLogic(GenericLogic):
 
         # Initalize the ODMR data arrays (mean signal and sweep matrix)
         self._initialize_odmr_plots()
-        # Raw data array
-        self.odmr_raw_data = np.zeros(
-            [self.number_of_lines,
-             len(self._odmr_counter.get_odmr_channels()),
-            self.odmr_plot_x.size]
-            )
+        # Raw data of all sweeps
+        self._sweep_store = SweepStore(len(self._odmr_counter.get_odmr_channels()),
+                                       self.odmr_plot_x.size,
+                                       matrix_lines=self.number_of_lines,
+                                       average_length=self.lines_to_average)
 
         # Switch off microwave and set CW frequency and power
         self.mw_off()
@@ -156,6 +160,8 @@ class ODMRLogic(GenericLogic):
                 break
         # Switch off microwave source for sure (also if CW mode is active or module is still locked)
         self._mw_device.off()
+        # Remove the raw data file of a spilled sweep history
+        self._sweep_store.close()
         # Disconnect signals
         self.sigNextLine.disconnect()
 
@@ -201,6 +207,12 @@ class ODMRLogic(GenericLogic):
         else:
             return None
 
+    @property
+    def odmr_raw_data(self):
+        """ Raw data of all elapsed sweeps with shape (sweeps, channels, frequencies), newest sweep
+        first. """
+        return self._sweep_store.history
+
     def _initialize_odmr_plots(self):
         """ Initializing the ODMR plots (line and matrix). """
         self.odmr_plot_x = np.arange(self.mw_start, self.mw_stop + self.mw_step, self.mw_step)
@@ -245,18 +257,8 @@ class ODMRLogic(GenericLogic):
         """
         self.lines_to_average = int(lines_to_average)
 
-        if self.lines_to_average <= 0:
-            self.odmr_plot_y = np.mean(
-                self.odmr_raw_data[:max(1, self.elapsed_sweeps), :, :],
-                axis=0,
-                dtype=np.float64
-            )
-        else:
-            self.odmr_plot_y = np.mean(
-                self.odmr_raw_data[:max(1, min(self.lines_to_average, self.elapsed_sweeps)), :, :],
-                axis=0,
-                dtype=np.float64
-            )
+        self._sweep_store.set_average_length(self.lines_to_average)
+        self.odmr_plot_y = self._sweep_store.average
 
         self.sigOdmrPlotsUpdated.emit(self.odmr_plot_x, self.odmr_plot_y, self.odmr_plot_xy)
         self.sigParameterUpdated.emit({'average_length': self.lines_to_average})
@@ -342,6 +344,7 @@ class ODMRLogic(GenericLogic):
         """
         if isinstance(number_of_lines, int):
             self.number_of_lines = number_of_lines
+            self._sweep_store.set_matrix_lines(self.number_of_lines)
         else:
             self.log.warning('set_matrix_line_number failed. '
                              'Input parameter number_of_lines is no integer.')
@@ -613,11 +616,17 @@ class ODMRLogic(GenericLogic):
                 estimated_number_of_lines = self.number_of_lines
             self.log.debug('Estimated number of raw data lines: {0:d}'
                            ''.format(estimated_number_of_lines))
-            self.odmr_raw_data = np.zeros(
-                [estimated_number_of_lines,
-                 len(self._odmr_counter.get_odmr_channels()),
-                 self.odmr_plot_x.size]
-            )
+            self._sweep_store.close()
+            spill_filename = time.strftime('%Y%m%d-%H%M-%S') + '_ODMR_raw_data_stream.bin'
+            spill_path = os.path.join(self._save_logic.get_path_for_module(module_name='ODMR'),
+                                      spill_filename)
+            self._sweep_store = SweepStore(len(self._odmr_counter.get_odmr_channels()),
+                                           self.odmr_plot_x.size,
+                                           matrix_lines=self.number_of_lines,
+                                           average_length=self.lines_to_average,
+                                           capacity=estimated_number_of_lines,
+                                           memory_budget=self._raw_data_memory_budget * 2**20,
+                                           spill_path=spill_path)
             self.sigNextLine.emit()
             return 0
 
@@ -710,45 +719,16 @@ class ODMRLogic(GenericLogic):
                 self.sigNextLine.emit()
                 return
 
-            # Add new count data to raw_data array and append if array is too small
+            # Add new count data to the sweep store. Averages are updated in constant time.
             if self._clearOdmrData:
-                self.odmr_raw_data[:, :, :] = 0
+                self._sweep_store.clear()
                 self._clearOdmrData = False
-            if self.elapsed_sweeps == (self.odmr_raw_data.shape[0] - 1):
-                expanded_array = np.zeros(self.odmr_raw_data.shape)
-                self.odmr_raw_data = np.concatenate((self.odmr_raw_data, expanded_array), axis=0)
-                self.log.warning('raw data array in ODMRLogic was not big enough for the entire '
-                                 'measurement. Array will be expanded.\nOld array shape was '
-                                 '({0:d}, {1:d}), new shape is ({2:d}, {3:d}).'
-                                 ''.format(self.odmr_raw_data.shape[0] - self.number_of_lines,
-                                           self.odmr_raw_data.shape[1],
-                                           self.odmr_raw_data.shape[0],
-                                           self.odmr_raw_data.shape[1]))
-
-            # shift data in the array "up" and add new data at the "bottom"
-            self.odmr_raw_data = np.roll(self.odmr_raw_data, 1, axis=0)
-
-            self.odmr_raw_data[0] = new_counts
-
-            # Add new count data to mean signal
-            if self._clearOdmrData:
-                self.odmr_plot_y[:, :] = 0
-
-            if self.lines_to_average <= 0:
-                self.odmr_plot_y = np.mean(
-                    self.odmr_raw_data[:max(1, self.elapsed_sweeps), :, :],
-                    axis=0,
-                    dtype=np.float64
-                )
-            else:
-                self.odmr_plot_y = np.mean(
-                    self.odmr_raw_data[:max(1, min(self.lines_to_average, self.elapsed_sweeps)), :, :],
-                    axis=0,
-                    dtype=np.float64
-                )
+            self._sweep_store.append(new_counts)
 
-            # Set plot slice of matrix
-            self.odmr_plot_xy = self.odmr_raw_data[:self.number_of_lines, :, :]
+            # Update mean signal and plot slice of matrix. The matrix is copied since the store
+            # overwrites its lines with the next sweeps.
+            self.odmr_plot_y = self._sweep_store.average
+            self.odmr_plot_xy = self._sweep_store.matrix.copy()
 
             # Update elapsed time/sweeps
             self.elapsed_sweeps += 1
@@ -810,6 +790,18 @@ class ODMRLogic(GenericLogic):
 
         if tag is None:
             tag = ''
+
+        # A raw data history spilled to disk is exported as a whole into a numpy file instead of
+        # saving it as text
+        raw_data_filename = None
+        if self._sweep_store.spilled:
+            raw_data_filename = timestamp.strftime('%Y%m%d-%H%M-%S') + '_'
+            if len(tag) > 0:
+                raw_data_filename += tag + '_'
+            raw_data_filename += 'ODMR_data_raw.npy'
+            self._sweep_store.export_history(os.path.join(
+                self._save_logic.get_path_for_module(module_name='ODMR'), raw_data_filename))
+
         for nch, channel in enumerate(self.get_odmr_channels()):
             # two paths to save the raw data and the odmr scan data.
             filepath = self._save_logic.get_path_for_module(module_name='ODMR')
@@ -827,7 +819,8 @@ class ODMRLogic(GenericLogic):
             data2 = OrderedDict()
             data['frequency (Hz)'] = self.odmr_plot_x
             data['count data (counts/s)'] = self.odmr_plot_y[nch]
-            data2['count data (counts/s)'] = self.odmr_raw_data[:self.elapsed_sweeps, nch, :]
+            if raw_data_filename is None:
+                data2['count data (counts/s)'] = self.odmr_raw_data[:self.elapsed_sweeps, nch, :]
 
             parameters = OrderedDict()
             parameters['Microwave CW Power (dBm)'] = self.cw_mw_power
@@ -839,6 +832,8 @@ class ODMRLogic(GenericLogic):
             parameters['Step size (Hz)'] = self.mw_step
             parameters['Clock Frequency (Hz)'] = self.clock_frequency
             parameters['Channel'] = '{0}: {1}'.format(nch, channel)
+            if raw_data_filename is not None:
+                parameters['Raw data file (sweeps, channels, frequencies)'] = raw_data_filename
             if self.fc.current_fit != 'No Fit':
                 parameters['Fit function'] = self.fc.current_fit
 
@@ -860,13 +855,14 @@ class ODMRLogic(GenericLogic):
                                        timestamp=timestamp,
                                        plotfig=fig)
 
-            self._save_logic.save_data(data2,
-                                       filepath=filepath2,
-                                       parameters=parameters,
-                                       filelabel=filelabel2,
-                                       fmt='%.6e',
-                                       delimiter='\t',
-                                       timestamp=timestamp)
+            if raw_data_filename is None:
+                self._save_logic.save_data(data2,
+                                           filepath=filepath2,
+                                           parameters=parameters,
+                                           filelabel=filelabel2,
+                                           fmt='%.6e',
+                                           delimiter='\t',
+                                           timestamp=timestamp)
 
             self.log.info('ODMR data saved to:\n{0}'.format(filepath))
         return
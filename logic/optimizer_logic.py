@@ -26,6 +26,7 @@ import time
 from logic.generic_logic import GenericLogic
 from core.module import Connector, ConfigOption, StatusVar
 from core.util.mutex import Mutex
+from core.util.scan_image import ScanImage
 
 
 class OptimizerLogic(GenericLogic):
@@ -263,14 +264,13 @@ class OptimizerLogic(GenericLogic):
         self._return_X_values = np.linspace(xmax, xmin, num=self.optimizer_XY_res)
         self._return_A_values = np.zeros(self._return_X_values.shape)
 
-        self.xy_refocus_image = np.zeros((
-            len(self._Y_values),
-            len(self._X_values),
-            3 + len(self.get_scanner_count_channels())))
-        self.xy_refocus_image[:, :, 0] = np.full((len(self._Y_values), len(self._X_values)), self._X_values)
-        y_value_matrix = np.full((len(self._X_values), len(self._Y_values)), self._Y_values)
-        self.xy_refocus_image[:, :, 1] = y_value_matrix.transpose()
-        self.xy_refocus_image[:, :, 2] = self.optim_pos_z * np.ones((len(self._Y_values), len(self._X_values)))
+        self.xy_refocus_image = ScanImage(
+            horizontal_axis=self._X_values,
+            vertical_axis=self._Y_values,
+            horizontal_index=0,
+            vertical_index=1,
+            position=(x0, y0, self.optim_pos_z),
+            channels=len(self.get_scanner_count_channels()))
 
     def _initialize_z_refocus_image(self):
         """Initialisation of the z refocus image."""
@@ -332,18 +332,14 @@ class OptimizerLogic(GenericLogic):
 
         # move to the start of the first line
         if self._xy_scan_line_count == 0:
-            status = self._move_to_start_pos([self.xy_refocus_image[0, 0, 0],
-                                              self.xy_refocus_image[0, 0, 1],
-                                              self.xy_refocus_image[0, 0, 2]])
+            status = self._move_to_start_pos(list(self.xy_refocus_image.get_position(0, 0)))
             if status < 0:
                 self.log.error('Error during move to starting point.')
                 self.stop_refocus()
                 self._sigScanNextXyLine.emit()
                 return
 
-        lsx = self.xy_refocus_image[self._xy_scan_line_count, :, 0]
-        lsy = self.xy_refocus_image[self._xy_scan_line_count, :, 1]
-        lsz = self.xy_refocus_image[self._xy_scan_line_count, :, 2]
+        lsx, lsy, lsz = self.xy_refocus_image.get_line(self._xy_scan_line_count)
 
         # scan a line of the xy optimization image
         if n_ch <= 3:
@@ -373,8 +369,7 @@ class OptimizerLogic(GenericLogic):
             self._sigScanNextXyLine.emit()
             return
 
-        s_ch = len(self.get_scanner_count_channels())
-        self.xy_refocus_image[self._xy_scan_line_count, :, 3:3 + s_ch] = line_counts
+        self.xy_refocus_image.set_line_counts(self._xy_scan_line_count, line_counts)
         self.sigImageUpdated.emit()
 
         self._xy_scan_line_count += 1
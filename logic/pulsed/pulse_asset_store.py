@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains the storage of pulse objects (PulseBlock, PulseBlockEnsemble, PulseSequence)
+used by the SequenceGeneratorLogic.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import pickle
+import sqlite3
+import logging
+
+from core.util.helpers import natural_sort
+from core.util.mutex import Mutex
+
+
+class PulseAssetStore:
+    """
+    Indexed storage of pulse objects in a single SQLite database file.
+
+    Each object is serialized with pickle and stored together with its asset type (e.g. 'block',
+    'ensemble' or 'sequence') and name. Objects can be listed, loaded, saved and deleted
+    individually without touching any other stored object.
+    """
+    log = logging.getLogger(__name__)
+
+    def __init__(self, path):
+        """
+        @param str path: The path of the SQLite database file. Will be created if not present.
+        """
+        self.path = path
+        self._lock = Mutex()
+        # The store is accessed from the logic thread as well as from the GUI thread
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            with self._connection:
+                self._connection.execute('CREATE TABLE IF NOT EXISTS assets ('
+                                         'asset_type TEXT NOT NULL, '
+                                         'name TEXT NOT NULL, '
+                                         'data BLOB NOT NULL, '
+                                         'PRIMARY KEY (asset_type, name))')
+        return
+
+    def close(self):
+        """ Closes the database connection. """
+        with self._lock:
+            self._connection.close()
+        return
+
+    def names(self, asset_type):
+        """
+        Returns the names of all stored objects of an asset type.
+
+        @param str asset_type: The asset type ('block', 'ensemble' or 'sequence')
+        @return list: naturally sorted names
+        """
+        with self._lock:
+            cursor = self._connection.execute('SELECT name FROM assets WHERE asset_type = ?',
+                                              (asset_type,))
+            names = [row[0] for row in cursor]
+        return natural_sort(names)
+
+    def load(self, asset_type, name):
+        """
+        De-serializes a single stored object.
+
+        @param str asset_type: The asset type ('block', 'ensemble' or 'sequence')
+        @param str name: The name of the object
+        @return object: The de-serialized object. None if not present or broken.
+        """
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT data FROM assets WHERE asset_type = ? AND name = ?',
+                (asset_type, name)).fetchone()
+        if row is None:
+            return None
+        try:
+            return pickle.loads(row[0])
+        except (pickle.UnpicklingError, AttributeError, EOFError, ImportError):
+            self.log.error('Failed to de-serialize {0} "{1}" from asset store.'
+                           ''.format(asset_type, name))
+            return None
+
+    def save(self, asset_type, name, obj):
+        """
+        Serializes a single object and stores it. Replaces an existing object with the same name.
+
+        @param str asset_type: The asset type ('block', 'ensemble' or 'sequence')
+        @param str name: The name of the object
+        @param object obj: The object to store
+        """
+        try:
+            data = pickle.dumps(obj)
+        except (pickle.PicklingError, TypeError, AttributeError):
+            self.log.error('Failed to serialize {0} "{1}".'.format(asset_type, name))
+            return
+        with self._lock:
+            with self._connection:
+                self._connection.execute(
+                    'INSERT OR REPLACE INTO assets (asset_type, name, data) VALUES (?, ?, ?)',
+                    (asset_type, name, sqlite3.Binary(data)))
+        return
+
+    def delete(self, asset_type, name):
+        """
+        Deletes a single stored object.
+
+        @param str asset_type: The asset type ('block', 'ensemble' or 'sequence')
+        @param str name: The name of the object
+        """
+        with self._lock:
+            with self._connection:
+                self._connection.execute('DELETE FROM assets WHERE asset_type = ? AND name = ?',
+                                         (asset_type, name))
+        return
+
+
+class PulseAssetDict(dict):
+    """
+    Dictionary of pulse objects of one asset type backed by a PulseAssetStore.
+
+    The names of all stored objects are available right away, but each object is only
+    de-serialized from the store on first access. Setting or deleting an item writes the object to
+    or removes it from the store.
+
+    Since this is a dict subclass it can still be emitted via Qt signals declared with type dict.
+    Only the keys should be used by receivers accessing it by other means than item access, get,
+    values or items. copy() and pickling return a plain dict of all loadable objects.
+
+    Objects that can not be loaded from the store stay listed, but accessing them raises a
+    KeyError (items and values skip them). They are removed from the store when they are deleted
+    or replaced.
+    """
+    # Placeholder for objects not yet loaded from the store
+    _NOT_LOADED = object()
+
+    def __init__(self, store, asset_type, restore_func=None):
+        """
+        @param PulseAssetStore store: The store holding the objects
+        @param str asset_type: The asset type ('block', 'ensemble' or 'sequence')
+        @param callable restore_func: optional, called with the name and the freshly loaded
+                                      object. Must return the (possibly altered) object or None
+                                      if the object is unusable.
+        """
+        super().__init__((name, self._NOT_LOADED) for name in store.names(asset_type))
+        self._store = store
+        self._asset_type = asset_type
+        self._restore_func = restore_func
+        # Names of objects that failed to load. They are not removed here since the dict may be
+        # iterated over while they are accessed.
+        self._broken = set()
+
+    def __getitem__(self, name):
+        obj = super().__getitem__(name)
+        if obj is self._NOT_LOADED:
+            if name in self._broken:
+                raise KeyError(name)
+            obj = self._store.load(self._asset_type, name)
+            if obj is not None and self._restore_func is not None:
+                obj = self._restore_func(name, obj)
+            if obj is None:
+                self._broken.add(name)
+                raise KeyError(name)
+            super().__setitem__(name, obj)
+        return obj
+
+    def __setitem__(self, name, obj):
+        super().__setitem__(name, obj)
+        self._broken.discard(name)
+        self._store.save(self._asset_type, name, obj)
+
+    def __delitem__(self, name):
+        super().__delitem__(name)
+        self._broken.discard(name)
+        self._store.delete(self._asset_type, name)
+
+    def __iter__(self):
+        # Overriding __iter__ prevents the C-level fast path of dict(), dict.update() etc. which
+        # would copy the placeholders instead of calling __getitem__.
+        return super().__iter__()
+
+    def __repr__(self):
+        return '{0}({1})'.format(type(self).__name__, list(self.keys()))
+
+    def __reduce__(self):
+        return dict, (self.copy(),)
+
+    def copy(self):
+        return dict(self.items())
+
+    def setdefault(self, name, default=None):
+        try:
+            return self[name]
+        except KeyError:
+            self[name] = default
+            return default
+
+    def update(self, *args, **kwargs):
+        for name, obj in dict(*args, **kwargs).items():
+            self[name] = obj
+
+    def get(self, name, default=None):
+        try:
+            return self[name]
+        except KeyError:
+            return default
+
+    def pop(self, name, *args):
+        try:
+            obj = self[name]
+        except KeyError:
+            if args:
+                return args[0]
+            raise
+        del self[name]
+        return obj
+
+    def values(self):
+        return [obj for name, obj in self.items()]
+
+    def items(self):
+        items = list()
+        for name in list(self):
+            try:
+                items.append((name, self[name]))
+            except KeyError:
+                pass
+        return items
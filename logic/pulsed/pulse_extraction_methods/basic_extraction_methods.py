@@ -252,6 +252,123 @@ class BasicPulseExtractor(PulseExtractorBase):
         return_dict['laser_indices_falling'] = falling_ind
         return return_dict
 
+    def ungated_conv_deriv_fast(self, count_data, conv_std_dev=20.0):
+        """ Detects the laser pulses in the ungated timetrace data and extracts them.
+            Vectorized version of "ungated_conv_deriv" that finds all flanks in a single pass.
+
+        @param numpy.ndarray count_data: The raw timetrace data (1D) from an ungated fast counter
+        @param float conv_std_dev: The standard deviation of the gaussian used for smoothing
+
+        @return 2D numpy.ndarray:   2D array, the extracted laser pulses of the timetrace.
+                                    dimensions: 0: laser number, 1: time bin
+
+        Procedure:
+            Same edge detection as in "ungated_conv_deriv" but instead of iteratively searching
+            for the global maximum/minimum and zeroing its surrounding, all local extrema of the
+            derived convolved trace that dominate a window of +-2*conv_std_dev are found at once
+            with a maximum filter. The number_of_lasers largest of these peaks (dips) are the
+            rising (falling) flanks.
+            Refinement of the flank positions with the reference derivative as well as slicing of
+            the laser pulses out of the timetrace is done with a fancy-index gather over all lasers.
+
+            For well separated laser pulses (pulse length and pause >> conv_std_dev) the result is
+            identical to "ungated_conv_deriv".
+        """
+        # Create return dictionary
+        return_dict = {'laser_counts_arr': np.empty(0, dtype='int64'),
+                       'laser_indices_rising': np.empty(0, dtype='int64'),
+                       'laser_indices_falling': np.empty(0, dtype='int64')}
+
+        number_of_lasers = self.measurement_settings.get('number_of_lasers')
+        if not isinstance(number_of_lasers, int):
+            return return_dict
+
+        # apply gaussian filter to remove noise and compute the gradient of the timetrace sum
+        try:
+            conv = ndimage.filters.gaussian_filter1d(count_data.astype(float), conv_std_dev)
+        except:
+            conv = np.zeros(count_data.size)
+        try:
+            conv_deriv = np.gradient(conv)
+        except:
+            conv_deriv = np.zeros(conv.size)
+
+        # if gaussian smoothing or derivative failed, the returned array only contains zeros.
+        # Check for that and return also only zeros to indicate a failed pulse extraction.
+        if len(conv_deriv.nonzero()[0]) == 0:
+            return_dict['laser_counts_arr'] = np.zeros((number_of_lasers, 10), dtype='int64')
+            return return_dict
+
+        # use a reference for array, because the exact position of the peaks or dips
+        # (i.e. maxima or minima, which are the inflection points in the pulse) are distorted by
+        # a large conv_std_dev value.
+        try:
+            conv = ndimage.filters.gaussian_filter1d(count_data.astype(float), 10)
+        except:
+            conv = np.zeros(count_data.size)
+        try:
+            conv_deriv_ref = np.gradient(conv)
+        except:
+            conv_deriv_ref = np.zeros(conv.size)
+
+        rising_ind = self._find_flanks(conv_deriv, conv_deriv_ref, number_of_lasers, conv_std_dev)
+        falling_ind = self._find_flanks(-conv_deriv, -conv_deriv_ref, number_of_lasers,
+                                        conv_std_dev)
+        # Not enough flanks found. Return only zeros to indicate a failed pulse extraction.
+        if rising_ind is None or falling_ind is None:
+            return_dict['laser_counts_arr'] = np.zeros((number_of_lasers, 10), dtype='int64')
+            return return_dict
+
+        # find the maximum laser length to use as size for the laser array
+        laser_length = np.max(falling_ind - rising_ind)
+
+        # gather all laser pulses at once. Bins exceeding the timetrace are set to 0.
+        gather_ind = rising_ind[:, np.newaxis] + np.arange(laser_length)
+        laser_arr = count_data.take(gather_ind, mode='clip').astype('int64')
+        laser_arr[gather_ind >= count_data.size] = 0
+
+        return_dict['laser_counts_arr'] = laser_arr
+        return_dict['laser_indices_rising'] = rising_ind
+        return_dict['laser_indices_falling'] = falling_ind
+        return return_dict
+
+    @staticmethod
+    def _find_flanks(conv_deriv, conv_deriv_ref, number_of_flanks, conv_std_dev):
+        """
+        Helper method for "ungated_conv_deriv_fast" to find the indices of the <number_of_flanks>
+        highest peaks in conv_deriv which are at least 2*conv_std_dev apart. The peak positions
+        are refined within +-conv_std_dev by the maximum of conv_deriv_ref.
+
+        @param numpy.ndarray conv_deriv: derivative of the smoothed timetrace
+        @param numpy.ndarray conv_deriv_ref: derivative of the timetrace with fixed small smoothing
+        @param int number_of_flanks: The number of peaks to find
+        @param float conv_std_dev: The standard deviation of the gaussian used for smoothing
+
+        @return numpy.ndarray: sorted flank indices (dtype='int64'). None if not enough peaks found.
+        """
+        # A peak is the (first) maximum within the surrounding +-2*conv_std_dev
+        window = 2 * int(2 * conv_std_dev) + 1
+        local_max = ndimage.filters.maximum_filter1d(conv_deriv, window, mode='nearest')
+        is_peak = conv_deriv == local_max
+        is_peak[1:] &= conv_deriv[1:] > conv_deriv[:-1]
+        peak_ind = np.flatnonzero(is_peak)
+        if peak_ind.size < number_of_flanks:
+            return None
+
+        # Keep only the number_of_flanks highest peaks
+        if peak_ind.size > number_of_flanks:
+            highest = np.argpartition(conv_deriv[peak_ind], -number_of_flanks)[-number_of_flanks:]
+            peak_ind = peak_ind[highest]
+
+        # refine the flank positions with the reference derivative within +-conv_std_dev
+        start_offset = int(np.floor(-conv_std_dev))
+        offsets = np.arange(start_offset, max(int(conv_std_dev), start_offset + 1))
+        refine_ind = np.clip(peak_ind[:, np.newaxis] + offsets, 0, conv_deriv_ref.size - 1)
+        refined = refine_ind[np.arange(peak_ind.size),
+                             np.argmax(conv_deriv_ref[refine_ind], axis=1)]
+        refined.sort()
+        return refined.astype('int64')
+
     def ungated_threshold(self, count_data, count_threshold=10, min_laser_length=200e-9,
                           threshold_tolerance=20e-9):
         """
@@ -23,8 +23,10 @@ import os
 import sys
 import inspect
 import importlib
+import numpy as np
 
 from core.util.modules import get_main_dir
+from core.util.mutex import Mutex
 from core.util.helpers import natural_sort
 
 
@@ -93,6 +95,20 @@ class PulseExtractor(PulseExtractorBase):
         # Currently selected extraction method
         self._current_extraction_method = None
 
+        # Incremental extraction: Reuse flank positions once they are stable
+        self.use_flank_cache = bool(pulsedmeasurementlogic.incremental_extraction)
+        self.flank_drift_tolerance = float(pulsedmeasurementlogic.flank_drift_tolerance)
+        # Flank positions found by the last full extraction
+        self._last_flanks = None
+        # Cached stable flank positions and reference fraction of counts inside the laser pulses
+        self._flank_cache = None
+        # Incremented each time the cache is cleared. Prevents extractions started before clearing
+        # (e.g. running in another thread) to populate the cache with outdated flanks.
+        self._flank_cache_generation = 0
+        # Guards the flank cache state above. Extractions may run in worker threads while the
+        # cache is cleared from the logic thread.
+        self._flank_cache_lock = Mutex()
+
         # import path for extraction modules from default directory (logic.pulse_extraction_methods)
         path_list = [os.path.join(get_main_dir(), 'logic', 'pulsed', 'pulse_extraction_methods')]
         # import path for extraction modules from non-default directory if a path has been given
@@ -161,6 +177,9 @@ class PulseExtractor(PulseExtractorBase):
         if not isinstance(settings_dict, dict):
             return
 
+        # Changed settings invalidate cached flank positions
+        self.clear_flank_cache()
+
         # go through all key-value pairs in settings_dict and update self._parameters and
         # self._current_extraction_method accordingly. Ignore unknown parameters.
         for parameter, value in settings_dict.items():
@@ -218,12 +237,151 @@ class PulseExtractor(PulseExtractorBase):
             self.log.error('"is_gated" flag is set to True but the count data to extract laser '
                            'pulses from is in the format of an ungated timetrace (1D numpy array).')
 
+        with self._flank_cache_lock:
+            cache_generation = self._flank_cache_generation
+            flank_cache = self._flank_cache if self.use_flank_cache else None
+        # Only slice count_data with cached flank positions if they are still valid
+        if flank_cache is not None:
+            return_dict = self._extract_with_flank_cache(count_data, flank_cache)
+            if return_dict is not None:
+                return return_dict
+            self.log.debug('Flank drift check failed. Performing full pulse extraction.')
+            with self._flank_cache_lock:
+                # Do not discard a cache populated after a concurrent clear
+                if cache_generation == self._flank_cache_generation:
+                    self._clear_flank_cache()
+                cache_generation = self._flank_cache_generation
+
         if self.is_gated:
             extraction_method = self._gated_extraction_methods[self._current_extraction_method]
         else:
             extraction_method = self._ungated_extraction_methods[self._current_extraction_method]
         kwargs = self._get_extraction_method_kwargs(extraction_method)
-        return extraction_method(count_data=count_data, **kwargs)
+        return_dict = extraction_method(count_data=count_data, **kwargs)
+
+        if self.use_flank_cache:
+            self._update_flank_cache(count_data, return_dict, cache_generation)
+        return return_dict
+
+    def clear_flank_cache(self):
+        """
+        Discard cached flank positions. The next call to extract_laser_pulses will perform a full
+        extraction with the currently selected extraction method.
+        """
+        with self._flank_cache_lock:
+            self._clear_flank_cache()
+        return
+
+    def _clear_flank_cache(self):
+        """
+        Discard cached flank positions. The caller must hold _flank_cache_lock.
+        """
+        self._flank_cache_generation += 1
+        self._last_flanks = None
+        self._flank_cache = None
+        return
+
+    def _update_flank_cache(self, count_data, return_dict, cache_generation):
+        """
+        Cache the flank positions of a full extraction if they are stable, i.e. if two consecutive
+        full extractions yielded the same flank positions. Flanks are only cached if slicing
+        count_data with them reproduces the laser pulses returned by the extraction method.
+
+        @param numpy.ndarray count_data: the timetrace the laser pulses have been extracted from
+        @param dict return_dict: result dictionary of the extraction method
+        @param int cache_generation: generation of the cache when the extraction was started.
+                                     Nothing is cached if the cache has been cleared since.
+        """
+        rising = np.array(return_dict.get('laser_indices_rising'), dtype='int64')
+        falling = np.array(return_dict.get('laser_indices_falling'), dtype='int64')
+        flanks = (count_data.shape, rising, falling)
+
+        with self._flank_cache_lock:
+            if cache_generation != self._flank_cache_generation:
+                return
+            last_flanks = self._last_flanks
+            self._last_flanks = flanks
+        if last_flanks is None or last_flanks[0] != flanks[0]:
+            return
+        if not (np.array_equal(last_flanks[1], rising) and np.array_equal(last_flanks[2], falling)):
+            return
+
+        laser_arr = self._slice_laser_pulses(count_data, rising, falling)
+        laser_counts_arr = return_dict.get('laser_counts_arr')
+        if laser_arr is None or not np.array_equal(laser_arr, laser_counts_arr):
+            return
+
+        total_counts = count_data.sum()
+        if total_counts <= 0:
+            return
+        with self._flank_cache_lock:
+            if cache_generation != self._flank_cache_generation:
+                return
+            self._flank_cache = {'shape': count_data.shape,
+                                 'laser_indices_rising': rising,
+                                 'laser_indices_falling': falling,
+                                 'counts_ratio': laser_arr.sum() / total_counts}
+        self.log.debug('Flank positions are stable. Using cached flanks for pulse extraction.')
+        return
+
+    def _extract_with_flank_cache(self, count_data, cache):
+        """
+        Slice the laser pulses out of count_data using the cached flank positions.
+        The fraction of counts inside the laser pulses is used as drift check. If it dropped by
+        more than flank_drift_tolerance (relative) compared to the moment the flanks were cached,
+        the cached flanks are considered invalid.
+
+        @param numpy.ndarray count_data: 1D (ungated) or 2D (gated) timetrace
+        @param dict cache: the flank cache (see _update_flank_cache)
+        @return dict: result dictionary like the one returned by extraction methods.
+                      None if the cached flanks are not valid for count_data.
+        """
+        if cache is None or count_data.shape != cache['shape']:
+            return None
+        laser_arr = self._slice_laser_pulses(count_data,
+                                             cache['laser_indices_rising'],
+                                             cache['laser_indices_falling'])
+        total_counts = count_data.sum()
+        if total_counts <= 0:
+            return None
+        counts_ratio = laser_arr.sum() / total_counts
+        if counts_ratio < cache['counts_ratio'] * (1 - self.flank_drift_tolerance):
+            return None
+
+        return_dict = {'laser_counts_arr': laser_arr,
+                       'laser_indices_rising': cache['laser_indices_rising'].copy(),
+                       'laser_indices_falling': cache['laser_indices_falling'].copy()}
+        if return_dict['laser_indices_rising'].ndim == 0:
+            return_dict['laser_indices_rising'] = int(return_dict['laser_indices_rising'])
+            return_dict['laser_indices_falling'] = int(return_dict['laser_indices_falling'])
+        return return_dict
+
+    @staticmethod
+    def _slice_laser_pulses(count_data, rising, falling):
+        """
+        Slice the laser pulses out of count_data given the flank positions.
+        For gated data (scalar flank indices) all gates are cut to [rising, falling).
+        For ungated data each laser pulse starts at its rising flank and all have the length of the
+        longest pulse. Bins exceeding the timetrace are set to zero.
+
+        @param numpy.ndarray count_data: 1D (ungated) or 2D (gated) timetrace
+        @param numpy.ndarray rising: rising flank indices
+        @param numpy.ndarray falling: falling flank indices
+        @return numpy.ndarray: 2D laser pulse array (dtype='int64'). None if slicing is impossible.
+        """
+        if count_data.ndim == 2 and rising.ndim == 0 and falling.ndim == 0:
+            return count_data[:, rising:falling].astype('int64')
+        if count_data.ndim != 1 or rising.ndim != 1 or rising.shape != falling.shape:
+            return None
+        if rising.size == 0 or np.any(rising < 0):
+            return None
+        laser_length = np.max(falling - rising)
+        if laser_length <= 0:
+            return None
+        gather_ind = rising[:, np.newaxis] + np.arange(laser_length)
+        laser_arr = count_data.take(gather_ind, mode='clip').astype('int64')
+        laser_arr[gather_ind >= count_data.size] = 0
+        return laser_arr
 
     def _get_extraction_method_kwargs(self, method):
         """
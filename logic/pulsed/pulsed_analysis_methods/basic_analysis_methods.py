@@ -57,33 +57,34 @@ class BasicPulseAnalyzer(PulseAnalyzerBase):
         norm_end_bin = round(norm_end / bin_width)
 
         # initialize data arrays for signal and measurement error
-        signal_data = np.empty(num_of_lasers, dtype=float)
-        error_data = np.empty(num_of_lasers, dtype=float)
-
-        # loop over all laser pulses and analyze them
-        for ii, laser_arr in enumerate(laser_data):
-            # calculate the sum and mean of the data in the normalization window
-            tmp_data = laser_arr[norm_start_bin:norm_end_bin]
-            reference_sum = np.sum(tmp_data)
-            reference_mean = (reference_sum / len(tmp_data)) if len(tmp_data) != 0 else 0.0
-
-            # calculate the sum and mean of the data in the signal window
-            tmp_data = laser_arr[signal_start_bin:signal_end_bin]
-            signal_sum = np.sum(tmp_data)
-            signal_mean = (signal_sum / len(tmp_data)) if len(tmp_data) != 0 else 0.0
-
-            # Calculate normalized signal while avoiding division by zero
-            if reference_mean > 0 and signal_mean >= 0:
-                signal_data[ii] = signal_mean / reference_mean
-            else:
-                signal_data[ii] = 0.0
-
-            # Calculate measurement error while avoiding division by zero
-            if reference_sum > 0 and signal_sum > 0:
-                # calculate with respect to gaussian error 'evolution'
-                error_data[ii] = signal_data[ii] * np.sqrt(1 / signal_sum + 1 / reference_sum)
-            else:
-                error_data[ii] = 0.0
+        signal_data = np.zeros(num_of_lasers, dtype=float)
+        error_data = np.zeros(num_of_lasers, dtype=float)
+
+        # calculate the sum and mean of the data in the normalization window for all laser pulses
+        tmp_data = laser_data[:, norm_start_bin:norm_end_bin]
+        reference_sum = tmp_data.sum(axis=1)
+        if tmp_data.shape[1] != 0:
+            reference_mean = reference_sum / tmp_data.shape[1]
+        else:
+            reference_mean = np.zeros(num_of_lasers, dtype=float)
+
+        # calculate the sum and mean of the data in the signal window for all laser pulses
+        tmp_data = laser_data[:, signal_start_bin:signal_end_bin]
+        signal_sum = tmp_data.sum(axis=1)
+        if tmp_data.shape[1] != 0:
+            signal_mean = signal_sum / tmp_data.shape[1]
+        else:
+            signal_mean = np.zeros(num_of_lasers, dtype=float)
+
+        # Calculate normalized signal while avoiding division by zero
+        valid = (reference_mean > 0) & (signal_mean >= 0)
+        signal_data[valid] = signal_mean[valid] / reference_mean[valid]
+
+        # Calculate measurement error while avoiding division by zero
+        valid = (reference_sum > 0) & (signal_sum > 0)
+        # calculate with respect to gaussian error 'evolution'
+        error_data[valid] = signal_data[valid] * np.sqrt(
+            1 / signal_sum[valid] + 1 / reference_sum[valid])
 
         return signal_data, error_data
 
@@ -107,22 +108,16 @@ class BasicPulseAnalyzer(PulseAnalyzerBase):
         signal_end_bin = round(signal_end / bin_width)
 
         # initialize data arrays for signal and measurement error
-        signal_data = np.empty(num_of_lasers, dtype=float)
-        error_data = np.empty(num_of_lasers, dtype=float)
-
-        # loop over all laser pulses and analyze them
-        for ii, laser_arr in enumerate(laser_data):
-            # calculate the sum of the data in the signal window
-            signal = laser_arr[signal_start_bin:signal_end_bin].sum()
-            signal_error = np.sqrt(signal)
-
-            # Avoid numpy C type variables overflow and NaN values
-            if signal < 0 or signal != signal:
-                signal_data[ii] = 0.0
-                error_data[ii] = 0.0
-            else:
-                signal_data[ii] = signal
-                error_data[ii] = signal_error
+        signal_data = np.zeros(num_of_lasers, dtype=float)
+        error_data = np.zeros(num_of_lasers, dtype=float)
+
+        # calculate the sum of the data in the signal window for all laser pulses
+        signal = laser_data[:, signal_start_bin:signal_end_bin].sum(axis=1)
+
+        # Avoid numpy C type variables overflow and NaN values
+        valid = signal >= 0
+        signal_data[valid] = signal[valid]
+        error_data[valid] = np.sqrt(signal[valid])
 
         return signal_data, error_data
 
@@ -147,22 +142,20 @@ class BasicPulseAnalyzer(PulseAnalyzerBase):
         signal_end_bin = round(signal_end / bin_width)
 
         # initialize data arrays for signal and measurement error
-        signal_data = np.empty(num_of_lasers, dtype=float)
-        error_data = np.empty(num_of_lasers, dtype=float)
-
-        # loop over all laser pulses and analyze them
-        for ii, laser_arr in enumerate(laser_data):
-            # calculate the mean of the data in the signal window
-            signal = laser_arr[signal_start_bin:signal_end_bin].mean()
-            signal_sum = laser_arr[signal_start_bin:signal_end_bin].sum()
-            signal_error = np.sqrt(signal_sum) / (signal_end_bin - signal_start_bin)
-
-            # Avoid numpy C type variables overflow and NaN values
-            if signal < 0 or signal != signal:
-                signal_data[ii] = 0.0
-                error_data[ii] = 0.0
-            else:
-                signal_data[ii] = signal
-                error_data[ii] = signal_error
+        signal_data = np.zeros(num_of_lasers, dtype=float)
+        error_data = np.zeros(num_of_lasers, dtype=float)
+
+        # calculate the sum and mean of the data in the signal window for all laser pulses.
+        # An empty signal window results in a zero signal.
+        tmp_data = laser_data[:, signal_start_bin:signal_end_bin]
+        if tmp_data.shape[1] == 0:
+            return signal_data, error_data
+        signal_sum = tmp_data.sum(axis=1)
+        signal = signal_sum / tmp_data.shape[1]
+
+        # Avoid numpy C type variables overflow and NaN values
+        valid = signal >= 0
+        signal_data[valid] = signal[valid]
+        error_data[valid] = np.sqrt(signal_sum[valid]) / (signal_end_bin - signal_start_bin)
 
         return signal_data, error_data
@@ -21,6 +21,7 @@ top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi
 
 from qtpy import QtCore
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import copy
 import time
@@ -35,6 +36,7 @@ from core.util.helpers import natural_sort
 from logic.generic_logic import GenericLogic
 from logic.pulsed.pulse_extractor import PulseExtractor
 from logic.pulsed.pulse_analyzer import PulseAnalyzer
+from logic.pulsed.raw_data_storage import MemmapRawDataStorage
 
 
 class PulsedMeasurementLogic(GenericLogic):
@@ -57,6 +59,17 @@ class PulsedMeasurementLogic(GenericLogic):
     analysis_import_path = ConfigOption(name='additional_analysis_path', default=None)
     # Optional file type descriptor for saving raw data to file
     _raw_data_save_type = ConfigOption(name='raw_data_save_type', default='text')
+    # Incremental analysis: Reuse stable flank positions instead of a full pulse extraction
+    incremental_extraction = ConfigOption(name='incremental_extraction', default=False)
+    # Relative drop of counts inside the cached laser pulses that triggers a full extraction
+    flank_drift_tolerance = ConfigOption(name='flank_drift_tolerance', default=0.05)
+    # Number of worker threads for pulse extraction and analysis. 0 runs analysis in logic thread.
+    _analysis_workers = ConfigOption(name='analysis_workers', default=0)
+    # Optional directory to keep stashed raw data and the running raw data trace in memory-mapped
+    # files. If not given, stashed raw data is kept in memory and lost upon deactivation.
+    _raw_data_storage_dir = ConfigOption(name='raw_data_storage_path', default=None)
+    # Minimum time in seconds between two checkpoints of the raw data trace written to disk
+    _raw_data_checkpoint_interval = ConfigOption(name='raw_data_checkpoint_interval', default=60)
 
     # status variables
     # ext. microwave settings
@@ -112,6 +125,7 @@ class PulsedMeasurementLogic(GenericLogic):
     # Internal signals
     sigStartTimer = QtCore.Signal()
     sigStopTimer = QtCore.Signal()
+    sigAnalysisJobFinished = QtCore.Signal(int, object)
 
     def __init__(self, config, **kwargs):
         super().__init__(config=config, **kwargs)
@@ -130,6 +144,12 @@ class PulsedMeasurementLogic(GenericLogic):
         # threading
         self._threadlock = Mutex()
 
+        # worker pool for pulse extraction and analysis
+        self._analysis_executor = None
+        self._analysis_job_id = 0  # id of the last submitted analysis job
+        self._applied_analysis_job_id = 0  # id of the analysis job whose result is shown
+        self._running_analysis_jobs = 0
+
         # measurement data
         self.signal_data = np.empty((2, 0), dtype=float)
         self.signal_alt_data = np.empty((2, 0), dtype=float)
@@ -203,10 +223,25 @@ class PulsedMeasurementLogic(GenericLogic):
 
         # recalled saved raw data dict key
         self._recalled_raw_data_tag = None
+        # Keep stashed raw data in memory-mapped files if configured
+        if self._raw_data_storage_dir:
+            self._saved_raw_data = MemmapRawDataStorage(self._raw_data_storage_dir,
+                                                        self._raw_data_checkpoint_interval)
+        else:
+            self._saved_raw_data = OrderedDict()
+
+        # Create worker pool for pulse extraction and analysis if configured
+        if self._analysis_workers > 0:
+            self._analysis_executor = ThreadPoolExecutor(max_workers=int(self._analysis_workers))
+        self._analysis_job_id = 0
+        self._applied_analysis_job_id = 0
+        self._running_analysis_jobs = 0
 
         # Connect internal signals
         self.sigStartTimer.connect(self.__analysis_timer.start, QtCore.Qt.QueuedConnection)
         self.sigStopTimer.connect(self.__analysis_timer.stop, QtCore.Qt.QueuedConnection)
+        self.sigAnalysisJobFinished.connect(self._apply_analysis_result,
+                                            QtCore.Qt.QueuedConnection)
         return
 
     def on_deactivate(self):
@@ -222,9 +257,17 @@ class PulsedMeasurementLogic(GenericLogic):
         self.extraction_parameters = self._pulseextractor.full_settings_dict
         self.analysis_parameters = self._pulseanalyzer.full_settings_dict
 
+        if self._analysis_executor is not None:
+            self._analysis_executor.shutdown(wait=True)
+            self._analysis_executor = None
+
+        if isinstance(self._saved_raw_data, MemmapRawDataStorage):
+            self._saved_raw_data.close()
+
         self.__analysis_timer.timeout.disconnect()
         self.sigStartTimer.disconnect()
         self.sigStopTimer.disconnect()
+        self.sigAnalysisJobFinished.disconnect()
         return
 
     ############################################################################
@@ -646,6 +689,7 @@ class PulsedMeasurementLogic(GenericLogic):
         # Use threadlock to update settings during a running measurement
         with self._threadlock:
             self._pulseanalyzer.analysis_settings = settings_dict
+            self._discard_running_analysis_jobs()
             self.sigAnalysisSettingsUpdated.emit(self.analysis_settings)
         return
 
@@ -671,6 +715,7 @@ class PulsedMeasurementLogic(GenericLogic):
         # Use threadlock to update settings during a running measurement
         with self._threadlock:
             self._pulseextractor.extraction_settings = settings_dict
+            self._discard_running_analysis_jobs()
             self.sigExtractionSettingsUpdated.emit(self.extraction_settings)
         return
 
@@ -775,6 +820,11 @@ class PulsedMeasurementLogic(GenericLogic):
                 # initialize data arrays
                 self._initialize_data_arrays()
 
+                # flank positions and running analysis jobs of a previous measurement are not
+                # valid anymore
+                self._pulseextractor.clear_flank_cache()
+                self._discard_running_analysis_jobs()
+
                 # recall stashed raw data
                 if stashed_raw_data_tag in self._saved_raw_data:
                     self._recalled_raw_data_tag = stashed_raw_data_tag
@@ -815,7 +865,7 @@ class PulsedMeasurementLogic(GenericLogic):
         """
         # Get raw data and analyze it a last time just before stopping the measurement.
         try:
-            self._pulsed_analysis_loop()
+            self._pulsed_analysis_loop(synchronous=True)
         except:
             pass
 
@@ -837,6 +887,9 @@ class PulsedMeasurementLogic(GenericLogic):
                                                                 {'elapsed_sweeps': self.__elapsed_sweeps,
                                                                  'elapsed_time': self.__elapsed_time})
                 self._recalled_raw_data_tag = None
+                # The raw data trace on disk is not needed anymore
+                if isinstance(self._saved_raw_data, MemmapRawDataStorage):
+                    self._saved_raw_data.finish_trace()
 
                 # Set measurement paused flag
                 self.__is_paused = False
@@ -953,6 +1006,7 @@ class PulsedMeasurementLogic(GenericLogic):
             else:
                 self._alternative_data_type = alt_data_type
 
+            self._discard_running_analysis_jobs()
             self._compute_alt_data()
             self.sigMeasurementDataUpdated.emit()
         return
@@ -1089,49 +1143,50 @@ class PulsedMeasurementLogic(GenericLogic):
                            'configured in measurement settings.')
         return
 
-    def _pulsed_analysis_loop(self):
+    def _pulsed_analysis_loop(self, synchronous=False):
         """ Acquires laser pulses from fast counter,
             calculates fluorescence signal and creates plots.
+
+        If a worker pool is configured (ConfigOption "analysis_workers") the pulse extraction and
+        analysis of the fetched raw data is performed in a worker thread and the result is applied
+        by _apply_analysis_result. Only the most recent result is applied.
+
+        @param bool synchronous: Perform extraction and analysis in the calling thread regardless
+                                 of the worker pool (used e.g. for the last analysis upon stopping).
         """
         with self._threadlock:
             if self.module_state() == 'locked':
-                # Update elapsed time
-
-                self._extract_laser_pulses()
-
-                tmp_signal, tmp_error = self._analyze_laser_pulses()
-
-                # exclude laser pulses to ignore
-                if len(self._laser_ignore_list) > 0:
-                    # Convert relative negative indices into absolute positive indices
-                    while self._laser_ignore_list[0] < 0:
-                        neg_index = self._laser_ignore_list[0]
-                        self._laser_ignore_list[0] = len(tmp_signal) + neg_index
-                        self._laser_ignore_list.sort()
-
-                    tmp_signal = np.delete(tmp_signal, self._laser_ignore_list)
-                    tmp_error = np.delete(tmp_error, self._laser_ignore_list)
-
-                # order data according to alternating flag
-                if self._alternating:
-                    if len(self.signal_data[0]) != len(tmp_signal[::2]):
-                        self.log.error('Length of controlled variable ({0}) does not match length of number of readout '
-                                       'pulses ({1}).'.format(len(self.signal_data[0]), len(tmp_signal[::2])))
+                # Get counter raw data (including recalled raw data from previous measurement)
+                fc_data, info_dict = self._get_raw_data()
+                self.raw_data = fc_data
+                self.__elapsed_sweeps = info_dict['elapsed_sweeps']
+                self.__elapsed_time = info_dict['elapsed_time']
+                # Write raw data trace to disk to be able to recover it after a crash
+                if isinstance(self._saved_raw_data, MemmapRawDataStorage):
+                    self._saved_raw_data.update_trace(self.raw_data, self.__elapsed_sweeps,
+                                                      self.__elapsed_time)
+
+                if synchronous or self._analysis_executor is None:
+                    # Results of running analysis jobs are outdated now
+                    self._discard_running_analysis_jobs()
+                    result = self._analyze_raw_data(**self._get_analysis_job_args())
+                    if result is None:
                         return
-                    self.signal_data[1] = tmp_signal[::2]
-                    self.signal_data[2] = tmp_signal[1::2]
-                    self.measurement_error[1] = tmp_error[::2]
-                    self.measurement_error[2] = tmp_error[1::2]
+                    self._set_analysis_result(result)
                 else:
-                    if len(self.signal_data[0]) != len(tmp_signal):
-                        self.log.error('Length of controlled variable ({0}) does not match length of number of readout '
-                                       'pulses ({1}).'.format(len(self.signal_data[0]), len(tmp_signal)))
-                        return
-                    self.signal_data[1] = tmp_signal
-                    self.measurement_error[1] = tmp_error
-
-                # Compute alternative data array from signal
-                self._compute_alt_data()
+                    # Submit new analysis job only if a worker is available. Otherwise the data
+                    # will be analyzed in one of the next loop iterations (latest data wins).
+                    if self._running_analysis_jobs < self._analysis_workers:
+                        self._analysis_job_id += 1
+                        self._running_analysis_jobs += 1
+                        future = self._analysis_executor.submit(self._analysis_job,
+                                                                self._analysis_job_id,
+                                                                self._get_analysis_job_args())
+                        future.add_done_callback(self._analysis_job_done)
+                    # Measurement data update is emitted once the analysis job has finished
+                    self.sigTimerUpdated.emit(self.__elapsed_time, self.__elapsed_sweeps,
+                                              self.__timer_interval)
+                    return
 
             # emit signals
             self.sigTimerUpdated.emit(self.__elapsed_time, self.__elapsed_sweeps,
@@ -1139,28 +1194,145 @@ class PulsedMeasurementLogic(GenericLogic):
             self.sigMeasurementDataUpdated.emit()
             return
 
-    def _extract_laser_pulses(self):
-        # Get counter raw data (including recalled raw data from previous measurement)
-        fc_data, info_dict = self._get_raw_data()
-        self.raw_data = fc_data
-        self.__elapsed_sweeps = info_dict['elapsed_sweeps']
-        self.__elapsed_time = info_dict['elapsed_time']
+    def _get_analysis_job_args(self):
+        """
+        Create a snapshot of the data and settings needed by _analyze_raw_data.
 
-        # extract laser pulses from raw data
-        return_dict = self._pulseextractor.extract_laser_pulses(self.raw_data)
-        self.laser_data = return_dict['laser_counts_arr']
+        @return dict: keyword arguments for _analyze_raw_data
+        """
+        return {'raw_data': self.raw_data,
+                'controlled_variable': self.signal_data[0].copy(),
+                'laser_ignore_list': list(self._laser_ignore_list),
+                'alternating': self._alternating,
+                'alternative_data_type': self._alternative_data_type}
+
+    def _analysis_job(self, job_id, job_args):
+        """
+        Analysis job executed in the worker pool.
+
+        @param int job_id: consecutive number of the job
+        @param dict job_args: keyword arguments for _analyze_raw_data
+        @return tuple(int, dict): job_id and the result dict of _analyze_raw_data
+        """
+        try:
+            result = self._analyze_raw_data(**job_args)
+        except:
+            self.log.exception('Error during pulse extraction/analysis:')
+            result = None
+        return job_id, result
+
+    def _analysis_job_done(self, future):
+        """
+        Callback of finished analysis jobs. Called in the worker thread.
+        Hands over the result to the logic thread.
+        """
+        job_id, result = future.result()
+        self.sigAnalysisJobFinished.emit(job_id, result)
         return
 
-    def _analyze_laser_pulses(self):
+    @QtCore.Slot(int, object)
+    def _apply_analysis_result(self, job_id, result):
+        """
+        Apply the result of an analysis job if it is more recent than the currently shown data.
+
+        @param int job_id: consecutive number of the finished job
+        @param dict result: result dict of _analyze_raw_data (None if the analysis failed)
+        """
+        with self._threadlock:
+            self._running_analysis_jobs = max(self._running_analysis_jobs - 1, 0)
+            if result is None or job_id <= self._applied_analysis_job_id:
+                return
+            self._applied_analysis_job_id = job_id
+            self._set_analysis_result(result)
+            self.sigMeasurementDataUpdated.emit()
+        return
+
+    def _discard_running_analysis_jobs(self):
+        """
+        Mark the results of all currently running analysis jobs as outdated. They will be
+        discarded once they are finished.
+        """
+        self._analysis_job_id += 1
+        self._applied_analysis_job_id = self._analysis_job_id
+        return
+
+    def _set_analysis_result(self, result):
+        """
+        Set the measurement data arrays from an analysis result.
+
+        @param dict result: result dict of _analyze_raw_data
+        """
+        self.laser_data = result['laser_data']
+        self.signal_data = result['signal_data']
+        self.measurement_error = result['measurement_error']
+        self.signal_alt_data = result['signal_alt_data']
+        return
+
+    def _analyze_raw_data(self, raw_data, controlled_variable, laser_ignore_list, alternating,
+                          alternative_data_type):
+        """
+        Extract and analyze the laser pulses of a raw timetrace. Does not alter any measurement data
+        of this module and is therefore safe to call from a worker thread.
+
+        @param numpy.ndarray raw_data: the raw timetrace (1D for ungated, 2D for gated counter)
+        @param numpy.ndarray controlled_variable: the controlled variable ticks
+        @param list laser_ignore_list: indices of laser pulses to exclude from the signal
+        @param bool alternating: flag indicating an alternating measurement
+        @param str alternative_data_type: type of the alternative data to compute
+
+        @return dict: the resulting 'laser_data', 'signal_data', 'measurement_error' and
+                      'signal_alt_data'. None if the number of analyzed laser pulses does not
+                      match the controlled variable.
+        """
+        # extract laser pulses from raw data
+        laser_data = self._pulseextractor.extract_laser_pulses(raw_data)['laser_counts_arr']
+
         # analyze pulses and get data points for signal array. Also check if extraction
         # worked (non-zero array returned).
-        if self.laser_data.any():
-            tmp_signal, tmp_error = self._pulseanalyzer.analyse_laser_pulses(
-                self.laser_data)
+        if laser_data.any():
+            tmp_signal, tmp_error = self._pulseanalyzer.analyse_laser_pulses(laser_data)
+        else:
+            tmp_signal = np.zeros(laser_data.shape[0])
+            tmp_error = np.zeros(laser_data.shape[0])
+
+        # exclude laser pulses to ignore
+        if len(laser_ignore_list) > 0:
+            # Convert relative negative indices into absolute positive indices
+            laser_ignore_list = sorted(len(tmp_signal) + ind if ind < 0 else ind
+                                       for ind in laser_ignore_list)
+            tmp_signal = np.delete(tmp_signal, laser_ignore_list)
+            tmp_error = np.delete(tmp_error, laser_ignore_list)
+
+        # order data according to alternating flag
+        signal_dim = 3 if alternating else 2
+        signal_data = np.zeros((signal_dim, len(controlled_variable)), dtype=float)
+        signal_data[0] = controlled_variable
+        measurement_error = np.zeros((signal_dim, len(controlled_variable)), dtype=float)
+        measurement_error[0] = controlled_variable
+        if alternating:
+            if len(controlled_variable) != len(tmp_signal[::2]):
+                self.log.error('Length of controlled variable ({0}) does not match length of number of readout '
+                               'pulses ({1}).'.format(len(controlled_variable), len(tmp_signal[::2])))
+                return None
+            signal_data[1] = tmp_signal[::2]
+            signal_data[2] = tmp_signal[1::2]
+            measurement_error[1] = tmp_error[::2]
+            measurement_error[2] = tmp_error[1::2]
         else:
-            tmp_signal = np.zeros(self.laser_data.shape[0])
-            tmp_error = np.zeros(self.laser_data.shape[0])
-        return tmp_signal, tmp_error
+            if len(controlled_variable) != len(tmp_signal):
+                self.log.error('Length of controlled variable ({0}) does not match length of number of readout '
+                               'pulses ({1}).'.format(len(controlled_variable), len(tmp_signal)))
+                return None
+            signal_data[1] = tmp_signal
+            measurement_error[1] = tmp_error
+
+        # Compute alternative data array from signal
+        signal_alt_data = self._get_alt_data(signal_data, alternative_data_type)
+
+        return {'laser_data': laser_data,
+                'signal_data': signal_data,
+                'measurement_error': measurement_error,
+                'signal_alt_data': signal_alt_data}
 
     def _get_raw_data(self):
         """
@@ -1584,31 +1756,42 @@ class PulsedMeasurementLogic(GenericLogic):
         """
         Performing transformations on the measurement data (e.g. fourier transform).
         """
-        if self._alternative_data_type == 'Delta' and len(self.signal_data) == 3:
-            self.signal_alt_data = np.empty((2, self.signal_data.shape[1]), dtype=float)
-            self.signal_alt_data[0] = self.signal_data[0]
-            self.signal_alt_data[1] = self.signal_data[1] - self.signal_data[2]
-        elif self._alternative_data_type == 'FFT' and self.signal_data.shape[1] >= 2:
-            fft_x, fft_y = units.compute_ft(x_val=self.signal_data[0],
-                                            y_val=self.signal_data[1],
+        self.signal_alt_data = self._get_alt_data(self.signal_data, self._alternative_data_type)
+        return
+
+    def _get_alt_data(self, signal_data, alternative_data_type):
+        """
+        Compute the alternative data array from signal_data without altering the module state.
+
+        @param numpy.ndarray signal_data: the signal data array to transform
+        @param str alternative_data_type: type of transformation ('Delta', 'FFT' or None)
+        @return numpy.ndarray: the alternative signal data array
+        """
+        if alternative_data_type == 'Delta' and len(signal_data) == 3:
+            signal_alt_data = np.empty((2, signal_data.shape[1]), dtype=float)
+            signal_alt_data[0] = signal_data[0]
+            signal_alt_data[1] = signal_data[1] - signal_data[2]
+        elif alternative_data_type == 'FFT' and signal_data.shape[1] >= 2:
+            fft_x, fft_y = units.compute_ft(x_val=signal_data[0],
+                                            y_val=signal_data[1],
                                             zeropad_num=self.zeropad,
                                             window=self.window,
                                             base_corr=self.base_corr,
                                             psd=self.psd)
-            self.signal_alt_data = np.empty((len(self.signal_data), len(fft_x)), dtype=float)
-            self.signal_alt_data[0] = fft_x
-            self.signal_alt_data[1] = fft_y
-            for dim in range(2, len(self.signal_data)):
-                dummy, self.signal_alt_data[dim] = units.compute_ft(x_val=self.signal_data[0],
-                                                                    y_val=self.signal_data[dim],
-                                                                    zeropad_num=self.zeropad,
-                                                                    window=self.window,
-                                                                    base_corr=self.base_corr,
-                                                                    psd=self.psd)
+            signal_alt_data = np.empty((len(signal_data), len(fft_x)), dtype=float)
+            signal_alt_data[0] = fft_x
+            signal_alt_data[1] = fft_y
+            for dim in range(2, len(signal_data)):
+                dummy, signal_alt_data[dim] = units.compute_ft(x_val=signal_data[0],
+                                                               y_val=signal_data[dim],
+                                                               zeropad_num=self.zeropad,
+                                                               window=self.window,
+                                                               base_corr=self.base_corr,
+                                                               psd=self.psd)
         else:
-            self.signal_alt_data = np.zeros(self.signal_data.shape, dtype=float)
-            self.signal_alt_data[0] = self.signal_data[0]
-        return
+            signal_alt_data = np.zeros(signal_data.shape, dtype=float)
+            signal_alt_data[0] = signal_data[0]
+        return signal_alt_data
 
 
 
@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains the on-disk storage of raw data used by the PulsedMeasurementLogic.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import os
+import json
+import time
+import logging
+import datetime
+import numpy as np
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+
+class MemmapRawDataStorage(MutableMapping):
+    """
+    Storage of stashed raw data and of the raw data trace of the running measurement in
+    memory-mapped numpy files (*.npy).
+
+    Used as mapping it behaves like the dict of stashed raw data in PulsedMeasurementLogic:
+    tag -> (raw data array, {'elapsed_sweeps': ..., 'elapsed_time': ...}). The stashed arrays are
+    opened read-only and memory-mapped, i.e. they are only paged in by the OS when accessed.
+
+    The trace of the running measurement is written to a memory-mapped file at regular checkpoints
+    and removed when the measurement is finished. If the measurement has not been stopped properly
+    (e.g. crash of qudi), the last checkpoint is stashed upon the next initialization of the
+    storage.
+    """
+    log = logging.getLogger(__name__)
+
+    _index_filename = 'raw_data_index.json'
+    _trace_filename = 'raw_data_trace.npy'
+
+    def __init__(self, path, checkpoint_interval=60):
+        """
+        @param str path: The directory to store the raw data files in. Will be created if needed.
+        @param float checkpoint_interval: Minimum time in seconds between two flushes of the
+                                          running raw data trace to disk.
+        """
+        self.path = path
+        self.checkpoint_interval = checkpoint_interval
+        if not os.path.exists(self.path):
+            os.makedirs(self.path)
+
+        # tag -> dict with keys 'file', 'elapsed_sweeps', 'elapsed_time'
+        self._index = OrderedDict()
+        # tag -> memory-mapped array of already accessed stashed raw data
+        self._arrays = dict()
+        # Memory-mapped raw data trace of the running measurement and its info dict
+        self._trace = None
+        self._trace_info = {'running': False, 'elapsed_sweeps': 0, 'elapsed_time': 0.0}
+        self._last_checkpoint = 0.0
+        # Latest raw data trace, elapsed sweeps and elapsed time not yet written to the trace file
+        self._pending_trace = None
+
+        # Do not touch any files if the index is unreadable
+        if self._load_index():
+            self._recover_trace()
+            self._remove_orphaned_files()
+        return
+
+    def __getitem__(self, tag):
+        entry = self._index[tag]
+        if tag not in self._arrays:
+            self._arrays[tag] = np.load(os.path.join(self.path, entry['file']), mmap_mode='r')
+        return self._arrays[tag], {'elapsed_sweeps': entry['elapsed_sweeps'],
+                                   'elapsed_time': entry['elapsed_time']}
+
+    def __setitem__(self, tag, value):
+        raw_data, info_dict = value
+        # Always write into a new file. The file of an existing stash with the same tag might be
+        # still in use (e.g. as recalled raw data).
+        filename = self._get_free_filename()
+        stash = np.lib.format.open_memmap(os.path.join(self.path, filename),
+                                          mode='w+',
+                                          dtype=raw_data.dtype,
+                                          shape=tuple(int(i) for i in raw_data.shape))
+        stash[...] = raw_data
+        stash.flush()
+        del stash
+        if tag in self._index:
+            self._remove_stash_file(tag)
+        self._index[tag] = {'file': filename,
+                            'elapsed_sweeps': int(info_dict['elapsed_sweeps']),
+                            'elapsed_time': float(info_dict['elapsed_time'])}
+        self._save_index()
+
+    def __delitem__(self, tag):
+        self._remove_stash_file(tag)
+        del self._index[tag]
+        self._save_index()
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+    def update_trace(self, raw_data, elapsed_sweeps, elapsed_time):
+        """
+        Passes the raw data trace of the running measurement to the storage. It is only written
+        into its memory-mapped file and flushed to disk if the last checkpoint is older than
+        checkpoint_interval. Otherwise only a reference to raw_data is kept.
+
+        @param numpy.ndarray raw_data: The current raw data trace
+        @param int elapsed_sweeps: The number of elapsed sweeps of the raw data trace
+        @param float elapsed_time: The elapsed measurement time of the raw data trace
+        """
+        self._pending_trace = (raw_data, int(elapsed_sweeps), float(elapsed_time))
+        if time.monotonic() - self._last_checkpoint >= self.checkpoint_interval:
+            self.checkpoint()
+        return
+
+    def checkpoint(self):
+        """
+        Writes the latest raw data trace of the running measurement into its memory-mapped file and
+        flushes it to disk.
+        """
+        if self._pending_trace is not None:
+            raw_data, elapsed_sweeps, elapsed_time = self._pending_trace
+            self._pending_trace = None
+            shape = tuple(int(i) for i in raw_data.shape)
+            if (self._trace is None or self._trace.shape != shape
+                    or self._trace.dtype != raw_data.dtype):
+                self._trace = None
+                self._trace = np.lib.format.open_memmap(
+                    os.path.join(self.path, self._trace_filename),
+                    mode='w+',
+                    dtype=raw_data.dtype,
+                    shape=shape)
+            self._trace[...] = raw_data
+            self._trace.flush()
+            self._trace_info = {'running': True,
+                                'elapsed_sweeps': elapsed_sweeps,
+                                'elapsed_time': elapsed_time}
+        self._save_index()
+        self._last_checkpoint = time.monotonic()
+        return
+
+    def finish_trace(self):
+        """
+        Marks the raw data trace of the running measurement as finished, i.e. it will not be
+        recovered upon the next initialization of the storage, and removes its file.
+        """
+        self._trace = None
+        self._pending_trace = None
+        self._last_checkpoint = 0.0
+        self._trace_info['running'] = False
+        self._save_index()
+        self._remove_trace_file()
+        return
+
+    def close(self):
+        """
+        Releases all memory-mapped files. The raw data trace of a still running measurement will be
+        recovered upon the next initialization of the storage.
+        """
+        if self._pending_trace is not None:
+            self.checkpoint()
+        self._trace = None
+        self._arrays.clear()
+        return
+
+    def _recover_trace(self):
+        """
+        Stashes the last checkpoint of the raw data trace if the measurement has not been stopped.
+        """
+        trace_path = os.path.join(self.path, self._trace_filename)
+        if not self._trace_info.get('running') or not os.path.exists(trace_path):
+            self._trace_info['running'] = False
+            # Trace file of a finished measurement that could not be removed
+            self._remove_trace_file()
+            return
+        tag = 'recovered_{0}'.format(datetime.datetime.now().strftime('%Y%m%d-%H%M%S'))
+        filename = self._get_free_filename()
+        os.replace(trace_path, os.path.join(self.path, filename))
+        self._index[tag] = {'file': filename,
+                            'elapsed_sweeps': self._trace_info['elapsed_sweeps'],
+                            'elapsed_time': self._trace_info['elapsed_time']}
+        self._trace_info['running'] = False
+        self._save_index()
+        self.log.warning('Pulsed measurement has not been stopped properly. Raw data of the last '
+                         'checkpoint has been stashed with tag "{0}".'.format(tag))
+        return
+
+    def _get_free_filename(self):
+        used = set(entry['file'] for entry in self._index.values())
+        number = len(used)
+        while True:
+            filename = 'raw_data_stash_{0:d}.npy'.format(number)
+            if filename not in used and not os.path.exists(os.path.join(self.path, filename)):
+                return filename
+            number += 1
+
+    def _remove_stash_file(self, tag):
+        self._arrays.pop(tag, None)
+        try:
+            os.remove(os.path.join(self.path, self._index[tag]['file']))
+        except OSError:
+            # File still memory-mapped somewhere. Will be removed upon next initialization.
+            pass
+        return
+
+    def _remove_trace_file(self):
+        try:
+            os.remove(os.path.join(self.path, self._trace_filename))
+        except OSError:
+            # Not present or still memory-mapped somewhere. Will be removed upon next
+            # initialization.
+            pass
+        return
+
+    def _remove_orphaned_files(self):
+        used = set(entry['file'] for entry in self._index.values())
+        used.add(self._trace_filename)
+        for filename in os.listdir(self.path):
+            if filename.endswith('.npy') and filename not in used:
+                try:
+                    os.remove(os.path.join(self.path, filename))
+                except OSError:
+                    pass
+        return
+
+    def _load_index(self):
+        """
+        Reads the index of stashed raw data and the info of the raw data trace.
+
+        @return bool: False if the index file is present but could not be read, True otherwise
+        """
+        index_path = os.path.join(self.path, self._index_filename)
+        if not os.path.exists(index_path):
+            return True
+        try:
+            with open(index_path, 'r') as file:
+                index = json.load(file)
+            self._index = OrderedDict((tag, entry) for tag, entry in index['stash'])
+            self._trace_info.update(index['trace'])
+        except (OSError, ValueError, KeyError, TypeError):
+            self.log.error('Unable to read raw data index file "{0}". Stashed raw data is not '
+                           'available.'.format(index_path))
+            self._index = OrderedDict()
+            return False
+        return True
+
+    def _save_index(self):
+        index_path = os.path.join(self.path, self._index_filename)
+        index = {'stash': list(self._index.items()), 'trace': self._trace_info}
+        # Write to a temporary file first to not corrupt the index file if writing fails
+        with open(index_path + '.tmp', 'w') as file:
+            json.dump(index, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(index_path + '.tmp', index_path)
+        return
@@ -37,6 +37,9 @@ class Idle(SamplingBase):
         samples_arr = np.zeros(len(time_array))
         return samples_arr
 
+    def get_frequencies(self):
+        return tuple()
+
 
 class DC(SamplingBase):
     """
@@ -61,6 +64,9 @@ class DC(SamplingBase):
         samples_arr = self._get_dc(time_array, self.voltage)
         return samples_arr
 
+    def get_frequencies(self):
+        return tuple()
+
 
 class Sin(SamplingBase):
     """
@@ -98,6 +104,9 @@ class Sin(SamplingBase):
         samples_arr = self._get_sine(time_array, amp_conv, self.frequency, phase_rad)
         return samples_arr
 
+    def get_frequencies(self):
+        return self.frequency,
+
 
 class DoubleSinSum(SamplingBase):
     """
@@ -160,6 +169,9 @@ class DoubleSinSum(SamplingBase):
         samples_arr += self._get_sine(time_array, amp_conv, self.frequency_2, phase_rad)
         return samples_arr
 
+    def get_frequencies(self):
+        return self.frequency_1, self.frequency_2
+
 
 class DoubleSinProduct(SamplingBase):
     """
@@ -222,6 +234,9 @@ class DoubleSinProduct(SamplingBase):
         samples_arr *= self._get_sine(time_array, amp_conv, self.frequency_2, phase_rad)
         return samples_arr
 
+    def get_frequencies(self):
+        return self.frequency_1, self.frequency_2
+
 
 class TripleSinSum(SamplingBase):
     """
@@ -308,6 +323,9 @@ class TripleSinSum(SamplingBase):
         samples_arr += self._get_sine(time_array, amp_conv, self.frequency_3, phase_rad)
         return samples_arr
 
+    def get_frequencies(self):
+        return self.frequency_1, self.frequency_2, self.frequency_3
+
 
 class TripleSinProduct(SamplingBase):
     """
@@ -394,6 +412,9 @@ class TripleSinProduct(SamplingBase):
         samples_arr *= self._get_sine(time_array, amp_conv, self.frequency_3, phase_rad)
         return samples_arr
 
+    def get_frequencies(self):
+        return self.frequency_1, self.frequency_2, self.frequency_3
+
 
 class Chirp(SamplingBase):
     """
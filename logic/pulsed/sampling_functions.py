@@ -26,6 +26,7 @@ import sys
 import inspect
 import copy
 import logging
+import numpy as np
 from collections import OrderedDict
 
 
@@ -67,6 +68,19 @@ class SamplingBase:
         hash_other = hash(tuple(hash_list))
         return hash_self == hash_other
 
+    def get_frequencies(self):
+        """
+        Frequencies of all periodic components of the sampling function.
+
+        If the samples are a purely periodic function of time composed of these frequencies, the
+        sampling routine can reuse samples calculated at another time offset with the same phase.
+        Overwrite this method in subclasses where this is the case.
+
+        @return tuple: frequencies in Hz. An empty tuple denotes a time invariant function.
+                       None (default) if the samples can not be reused at another time offset.
+        """
+        return None
+
     def get_dict_representation(self):
         dict_repr = dict()
         dict_repr['name'] = type(self).__name__
@@ -134,3 +148,35 @@ class SamplingFunctions:
         if inspect.isclass(obj):
             return SamplingBase in inspect.getmro(obj) and object not in obj.__bases__
         return False
+
+
+# Shared sample buffers of the current sampling worker process (see init_sampling_worker)
+_worker_buffers = dict()
+
+
+def init_sampling_worker(buffers):
+    """
+    Initializer for the worker processes used for parallel sampling in SequenceGeneratorLogic.
+    Creates numpy views of the shared memory sample buffers.
+
+    @param dict buffers: multiprocessing.RawArray float32 buffers with arbitrary hashable keys
+    """
+    global _worker_buffers
+    _worker_buffers = {key: np.frombuffer(buf, dtype='float32') for key, buf in buffers.items()}
+    return
+
+
+def sample_into_buffers(tasks):
+    """
+    Calculates analog samples in a worker process and writes them into the shared sample buffers.
+
+    @param list tasks: list of tuples (sampling_function, sample_rate, analog_level, offset_bin,
+                       number_of_samples, destinations). destinations is a list of tuples
+                       (buffer key, start index in the buffer) to write the samples to.
+    """
+    for sampling_function, sample_rate, level, offset_bin, number_of_samples, destinations in tasks:
+        time_arr = (offset_bin + np.arange(number_of_samples, dtype='float64')) / sample_rate
+        samples = sampling_function.get_samples(time_arr) / level
+        for key, start in destinations:
+            _worker_buffers[key][start:start + number_of_samples] = samples
+    return
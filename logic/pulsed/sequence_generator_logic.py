@@ -25,16 +25,25 @@ import os
 import pickle
 import time
 import copy
+import shutil
+import hashlib
+import json
+import math
+import multiprocessing
+import concurrent.futures
 
 from qtpy import QtCore
 from collections import OrderedDict
+from fractions import Fraction
 from core.module import StatusVar, Connector, ConfigOption
 from core.util.modules import get_main_dir, get_home_dir
 from core.util.helpers import natural_sort
 from logic.generic_logic import GenericLogic
 from logic.pulsed.pulse_objects import PulseBlock, PulseBlockEnsemble, PulseSequence
 from logic.pulsed.pulse_objects import PulseObjectGenerator, PulseBlockElement
+from logic.pulsed.pulse_asset_store import PulseAssetStore, PulseAssetDict
 from logic.pulsed.sampling_functions import SamplingFunctions
+from logic.pulsed.sampling_functions import init_sampling_worker, sample_into_buffers
 
 
 class SequenceGeneratorLogic(GenericLogic):
@@ -70,6 +79,13 @@ class SequenceGeneratorLogic(GenericLogic):
     _sampling_functions_import_path = ConfigOption(name='additional_sampling_functions_path',
                                                    default=None,
                                                    missing='nothing')
+    # Maximum disk space in bytes for the on-disk cache of sampled waveforms. 0 disables the cache.
+    _waveform_cache_bytes = ConfigOption(name='waveform_cache_bytes', default=0, missing='nothing')
+    # Maximum memory in bytes used to memoize analog samples of repeated elements during sampling
+    _sample_memo_bytes = ConfigOption(name='sample_memo_bytes', default=268435456, missing='nothing')
+    # Number of worker processes used to calculate analog samples in parallel. 0 disables it.
+    # Only used for ensembles that are written to the device in several chunks.
+    _sampling_processes = ConfigOption(name='sampling_processes', default=0, missing='nothing')
 
     # status vars
     # Global parameters describing the channel usage and common parameters used during pulsed object
@@ -86,6 +102,10 @@ class SequenceGeneratorLogic(GenericLogic):
                                                             ('wait_time', 1e-6),
                                                             ('analog_trigger_voltage', 0.0)]))
 
+    # Content hashes of the waveforms present on the pulse generator device. Keys are the waveform
+    # names (without channel suffix), items are dicts with keys 'hash' and 'waveforms'.
+    _sampled_waveform_hashes = StatusVar(default=dict())
+
     # The created pulse objects (PulseBlock, PulseBlockEnsemble, PulseSequence) are saved in
     # these dictionaries. The keys are the names.
     # _saved_pulse_blocks = StatusVar(default=OrderedDict())
@@ -136,6 +156,17 @@ class SequenceGeneratorLogic(GenericLogic):
         # A flag indicating if sampling of a sequence is in progress
         self.__sequence_generation_in_progress = False
 
+        # Number of reused (hits) and calculated (misses) analog sample arrays during the last
+        # PulseBlockEnsemble sampling
+        self._sample_memo_statistics = {'hits': 0, 'misses': 0}
+        # Memoized results of analyze_block_ensemble. Keys are the ensemble names, items are tuples
+        # (cache key, ensemble info dict).
+        self._ensemble_info_cache = dict()
+
+        # Time in seconds spent sampling, writing to the device and waiting for the device to
+        # finish writing during the last PulseBlockEnsemble sampling
+        self._sampling_timings = {'sample': 0.0, 'write': 0.0, 'wait': 0.0}
+
         # Get instance of PulseObjectGenerator which takes care of collecting all predefined methods
         self._pog = None
 
@@ -144,6 +175,13 @@ class SequenceGeneratorLogic(GenericLogic):
         self._saved_pulse_blocks = OrderedDict()
         self._saved_pulse_block_ensembles = OrderedDict()
         self._saved_pulse_sequences = OrderedDict()
+
+        # Storage of the pulse objects on disk
+        self._asset_store = None
+        # Waveforms and sequences present on the device at activation. Used to discard outdated
+        # sampling information of pulse objects loaded from the asset store.
+        self._device_waveforms_at_activation = set()
+        self._device_sequences_at_activation = set()
         return
 
     def on_activate(self):
@@ -151,6 +189,8 @@ class SequenceGeneratorLogic(GenericLogic):
         """
         if not os.path.exists(self._assets_storage_dir):
             os.makedirs(self._assets_storage_dir)
+        if self._waveform_cache_bytes > 0 and not os.path.exists(self._waveform_cache_dir):
+            os.makedirs(self._waveform_cache_dir)
 
         # Initialize SamplingFunctions class by handing over a list of paths to import
         # sampling functions from.
@@ -162,13 +202,21 @@ class SequenceGeneratorLogic(GenericLogic):
         # Read back settings from device and update instance variables accordingly
         self._read_settings_from_device()
 
-        # Update saved blocks/ensembles/sequences from serialized files
-        self._saved_pulse_blocks = OrderedDict()
-        self._saved_pulse_block_ensembles = OrderedDict()
-        self._saved_pulse_sequences = OrderedDict()
-        self._update_blocks_from_file()
-        self._update_ensembles_from_file()
-        self._update_sequences_from_file()
+        # Open the asset store and import pulse objects from the single files used by older
+        # versions. The stored objects are only de-serialized on first access.
+        self._asset_store = PulseAssetStore(os.path.join(self._assets_storage_dir,
+                                                         'pulse_assets.db'))
+        self._device_waveforms_at_activation = set(self.sampled_waveforms)
+        self._device_sequences_at_activation = set(self.sampled_sequences)
+        self._import_legacy_asset_files()
+        self._saved_pulse_blocks = PulseAssetDict(self._asset_store, 'block')
+        self._saved_pulse_block_ensembles = PulseAssetDict(self._asset_store, 'ensemble',
+                                                           self._restore_ensemble)
+        self._saved_pulse_sequences = PulseAssetDict(self._asset_store, 'sequence',
+                                                     self._restore_sequence)
+        self.sigBlockDictUpdated.emit(self._saved_pulse_blocks)
+        self.sigEnsembleDictUpdated.emit(self._saved_pulse_block_ensembles)
+        self.sigSequenceDictUpdated.emit(self._saved_pulse_sequences)
 
         # Get instance of PulseObjectGenerator which takes care of collecting all predefined methods
         self._pog = PulseObjectGenerator(sequencegeneratorlogic=self)
@@ -179,6 +227,9 @@ class SequenceGeneratorLogic(GenericLogic):
     def on_deactivate(self):
         """ Deinitialisation performed during deactivation of the module.
         """
+        if self._asset_store is not None:
+            self._asset_store.close()
+            self._asset_store = None
         return
 
     # @_saved_pulse_blocks.constructor
@@ -278,6 +329,18 @@ class SequenceGeneratorLogic(GenericLogic):
     def digital_channels(self):
         return {chnl for chnl in self.__activation_config[1] if chnl.startswith('d_ch')}
 
+    @property
+    def sample_memo_statistics(self):
+        return self._sample_memo_statistics.copy()
+
+    @property
+    def sampling_timings(self):
+        return self._sampling_timings.copy()
+
+    @property
+    def _waveform_cache_dir(self):
+        return os.path.join(self._assets_storage_dir, 'waveform_cache')
+
     @property
     def loaded_asset(self):
         asset_names, asset_type = self.pulsegenerator().get_loaded_assets()
@@ -417,13 +480,12 @@ class SequenceGeneratorLogic(GenericLogic):
             self.log.error('Can´t clear the pulser as it is running. Switch off the pulser and try again.')
             return -1
         self.pulsegenerator().clear_all()
+        self._sampled_waveform_hashes = dict()
         # Delete all sampling information from all PulseBlockEnsembles and PulseSequences
-        for seq_name in self.saved_pulse_sequences:
-            seq = self.saved_pulse_sequences[seq_name]
+        for seq_name, seq in list(self.saved_pulse_sequences.items()):
             seq.sampling_information = dict()
             self.save_sequence(seq)
-        for ens_name in self.saved_pulse_block_ensembles:
-            ens = self.saved_pulse_block_ensembles[ens_name]
+        for ens_name, ens in list(self.saved_pulse_block_ensembles.items()):
             ens.sampling_information = dict()
             self.save_ensemble(ens)
         self.sigAvailableWaveformsUpdated.emit(self.sampled_waveforms)
@@ -679,7 +741,6 @@ class SequenceGeneratorLogic(GenericLogic):
         @param PulseBlock block: PulseBlock instance to save
         """
         self._saved_pulse_blocks[block.name] = block
-        self._save_block_to_file(block)
         self.sigBlockDictUpdated.emit(self._saved_pulse_blocks)
         return
 
@@ -699,15 +760,10 @@ class SequenceGeneratorLogic(GenericLogic):
 
         @param name: string, name of the PulseBlock object to be removed.
         """
-        # Delete from dict
+        # Delete from dict and asset store
         if name in self.saved_pulse_blocks:
             del (self._saved_pulse_blocks[name])
 
-        # Delete from disk
-        filepath = os.path.join(self._assets_storage_dir, '{0}.block'.format(name))
-        if os.path.exists(filepath):
-            os.remove(filepath)
-
         self.sigBlockDictUpdated.emit(self.saved_pulse_blocks)
         return
 
@@ -730,53 +786,12 @@ class SequenceGeneratorLogic(GenericLogic):
                 os.remove(filepath)
         return block
 
-    def _update_blocks_from_file(self):
-        """
-        Update the saved_pulse_blocks dict by de-serializing stored file.
-        """
-        # Get all files in asset directory ending on ".block" and extract a sorted list of
-        # PulseBlock names
-        with os.scandir(self._assets_storage_dir) as scan:
-            names = natural_sort(f.name[:-6] for f in scan if f.is_file and f.name.endswith('.block'))
-
-        # Load all blocks from file
-        for block_name in names:
-            block = self._load_block_from_file(block_name)
-            if block is not None:
-                self._saved_pulse_blocks[block_name] = block
-
-        self.sigBlockDictUpdated.emit(self._saved_pulse_blocks)
-        return
-
-    def _save_block_to_file(self, block):
-        """
-        Saves a single PulseBlock instance to file by serialization using pickle.
-
-        @param PulseBlock block: The PulseBlock instance to be saved
-        """
-        filename = '{0}.block'.format(block.name)
-        try:
-            with open(os.path.join(self._assets_storage_dir, filename), 'wb') as file:
-                pickle.dump(block, file)
-        except:
-            self.log.error('Failed to serialize PulseBlock "{0}" to file.'.format(block.name))
-        return
-
-    def _save_blocks_to_file(self):
-        """
-        Saves the saved_pulse_blocks dict items to files.
-        """
-        for block in self._saved_pulse_blocks.values():
-            self._save_block_to_file(block)
-        return
-
     def save_ensemble(self, ensemble):
         """ Saves a PulseBlockEnsemble instance
 
         @param PulseBlockEnsemble ensemble: PulseBlockEnsemble instance to save
         """
         self._saved_pulse_block_ensembles[ensemble.name] = ensemble
-        self._save_ensemble_to_file(ensemble)
         self.sigEnsembleDictUpdated.emit(self.saved_pulse_block_ensembles)
         return
 
@@ -803,13 +818,9 @@ class SequenceGeneratorLogic(GenericLogic):
                 self._delete_waveform(
                     self.saved_pulse_block_ensembles[name].sampling_information['waveforms'])
                 self.sigAvailableWaveformsUpdated.emit(self.sampled_waveforms)
-            # delete PulseBlockEnsemble
+            # delete PulseBlockEnsemble from dict and asset store
             del self._saved_pulse_block_ensembles[name]
-
-        # Delete from disk
-        filepath = os.path.join(self._assets_storage_dir, '{0}.ensemble'.format(name))
-        if os.path.exists(filepath):
-            os.remove(filepath)
+            self._ensemble_info_cache.pop(name, None)
 
         self.sigEnsembleDictUpdated.emit(self.saved_pulse_block_ensembles)
         return
@@ -833,54 +844,21 @@ class SequenceGeneratorLogic(GenericLogic):
                 os.remove(filepath)
         return ensemble
 
-    def _update_ensembles_from_file(self):
-        """
-        Update the saved_pulse_block_ensembles dict from temporary file.
+    def _restore_ensemble(self, ensemble_name, ensemble):
         """
-        # Get all files in asset directory ending on ".ensemble" and extract a sorted list of
-        # PulseBlockEnsemble names
-        with os.scandir(self._assets_storage_dir) as scan:
-            names = natural_sort(f.name[:-9] for f in scan if f.is_file and f.name.endswith('.ensemble'))
-
-        # Get all waveforms currently stored on pulser hardware in order to delete outdated
-        # sampling_information dicts
-        sampled_waveforms = set(self.sampled_waveforms)
-
-        # Load all ensembles from file
-        for ensemble_name in names:
-            ensemble = self._load_ensemble_from_file(ensemble_name)
-            if ensemble is not None:
-                if ensemble.sampling_information.get('waveforms'):
-                    waveform_set = set(ensemble.sampling_information['waveforms'])
-                    if not sampled_waveforms.issuperset(waveform_set):
-                        ensemble.sampling_information = dict()
-                self._saved_pulse_block_ensembles[ensemble_name] = ensemble
+        Called for each PulseBlockEnsemble instance de-serialized from the asset store.
+        Deletes outdated sampling_information if the waveforms were not present on the device at
+        activation.
 
-        self.sigEnsembleDictUpdated.emit(self.saved_pulse_block_ensembles)
-        return
-
-    def _save_ensemble_to_file(self, ensemble):
+        @param str ensemble_name: The name of the PulseBlockEnsemble instance
+        @param PulseBlockEnsemble ensemble: The de-serialized PulseBlockEnsemble instance
+        @return PulseBlockEnsemble: The PulseBlockEnsemble instance to use
         """
-        Saves a single PulseBlockEnsemble instance to file by serialization using pickle.
-
-        @param PulseBlockEnsemble ensemble: The PulseBlockEnsemble instance to be saved
-        """
-        filename = '{0}.ensemble'.format(ensemble.name)
-        try:
-            with open(os.path.join(self._assets_storage_dir, filename), 'wb') as file:
-                pickle.dump(ensemble, file)
-        except:
-            self.log.error('Failed to serialize PulseBlockEnsemble "{0}" to file.'
-                           ''.format(ensemble.name))
-        return
-
-    def _save_ensembles_to_file(self):
-        """
-        Saves the saved_pulse_block_ensembles dict items to files.
-        """
-        for ensemble in self.saved_pulse_block_ensembles.values():
-            self._save_ensemble_to_file(ensemble)
-        return
+        if ensemble.sampling_information.get('waveforms'):
+            waveform_set = set(ensemble.sampling_information['waveforms'])
+            if not self._device_waveforms_at_activation.issuperset(waveform_set):
+                ensemble.sampling_information = dict()
+        return ensemble
 
     def save_sequence(self, sequence):
         """ Saves a PulseSequence instance
@@ -891,7 +869,6 @@ class SequenceGeneratorLogic(GenericLogic):
         @return: str: name of the serialized object, if needed.
         """
         self._saved_pulse_sequences[sequence.name] = sequence
-        self._save_sequence_to_file(sequence)
         self.sigSequenceDictUpdated.emit(self.saved_pulse_sequences)
         return
 
@@ -920,14 +897,9 @@ class SequenceGeneratorLogic(GenericLogic):
                     self._delete_waveform(
                         self.saved_pulse_sequences[name].sampling_information['waveforms'])
                     self.sigAvailableWaveformsUpdated.emit(self.sampled_waveforms)
-            # delete PulseSequence
+            # delete PulseSequence from dict and asset store
             del self._saved_pulse_sequences[name]
 
-        # Delete from disk
-        filepath = os.path.join(self._assets_storage_dir, '{0}.sequence'.format(name))
-        if os.path.exists(filepath):
-            os.remove(filepath)
-
         self.sigSequenceDictUpdated.emit(self.saved_pulse_sequences)
         return
 
@@ -992,58 +964,59 @@ class SequenceGeneratorLogic(GenericLogic):
                                    ''.format(sequence_name))
                     os.remove(filepath)
                     return None
-            self._save_sequence_to_file(sequence)
         return sequence
 
-    def _update_sequences_from_file(self):
-        """
-        Update the saved_pulse_sequences dict from files.
+    def _restore_sequence(self, sequence_name, sequence):
         """
-        # Get all files in asset directory ending on ".sequence" and extract a sorted list of
-        # PulseSequence names
-        with os.scandir(self._assets_storage_dir) as scan:
-            names = natural_sort(f.name[:-9] for f in scan if f.is_file and f.name.endswith('.sequence'))
-
-        # Get all waveforms and sequences currently stored on pulser hardware in order to delete
-        # outdated sampling_information dicts
-        sampled_waveforms = set(self.sampled_waveforms)
-        sampled_sequences = set(self.sampled_sequences)
-
-        # Load all sequences from file
-        for sequence_name in names:
-            sequence = self._load_sequence_from_file(sequence_name)
-            if sequence is not None:
-                if sequence.name not in sampled_sequences:
-                    sequence.sampling_information = dict()
-                elif sequence.sampling_information:
-                    waveform_set = set(sequence.sampling_information['waveforms'])
-                    if not sampled_waveforms.issuperset(waveform_set):
-                        sequence.sampling_information = dict()
-                self._saved_pulse_sequences[sequence_name] = sequence
-
-        self.sigSequenceDictUpdated.emit(self.saved_pulse_sequences)
-        return
+        Called for each PulseSequence instance de-serialized from the asset store.
+        Deletes outdated sampling_information if the sequence or its waveforms were not present on
+        the device at activation.
 
-    def _save_sequence_to_file(self, sequence):
+        @param str sequence_name: The name of the PulseSequence instance
+        @param PulseSequence sequence: The de-serialized PulseSequence instance
+        @return PulseSequence: The PulseSequence instance to use
         """
-        Saves a single PulseSequence instance to file by serialization using pickle.
-
-        @param PulseSequence sequence: The PulseSequence instance to be saved
-        """
-        filename = '{0}.sequence'.format(sequence.name)
-        try:
-            with open(os.path.join(self._assets_storage_dir, filename), 'wb') as file:
-                pickle.dump(sequence, file)
-        except:
-            self.log.error('Failed to serialize PulseSequence "{0}" to file.'.format(sequence.name))
-        return
+        # FIXME: Due to the pickling the dict namespace merging gets lost on the way.
+        # Restored it here but a better way needs to be found.
+        for step in range(len(sequence)):
+            sequence[step].__dict__ = sequence[step]
+        if sequence.name not in self._device_sequences_at_activation:
+            sequence.sampling_information = dict()
+        elif sequence.sampling_information:
+            waveform_set = set(sequence.sampling_information['waveforms'])
+            if not self._device_waveforms_at_activation.issuperset(waveform_set):
+                sequence.sampling_information = dict()
+        return sequence
 
-    def _save_sequences_to_file(self):
+    def _import_legacy_asset_files(self):
         """
-        Saves the saved_pulse_sequences dict items to files.
+        Imports the pulse objects serialized into single files by older versions (*.block,
+        *.ensemble, *.sequence) into the asset store. The imported files are moved into the
+        sub-directory "legacy_assets" of the asset storage directory.
         """
-        for sequence in self.saved_pulse_sequences.values():
-            self._save_sequence_to_file(sequence)
+        file_loaders = (('block', self._load_block_from_file),
+                        ('ensemble', self._load_ensemble_from_file),
+                        ('sequence', self._load_sequence_from_file))
+        with os.scandir(self._assets_storage_dir) as scan:
+            file_names = [f.name for f in scan if f.is_file()]
+
+        legacy_dir = os.path.join(self._assets_storage_dir, 'legacy_assets')
+        for asset_type, load_func in file_loaders:
+            suffix = '.' + asset_type
+            names = natural_sort(f[:-len(suffix)] for f in file_names if f.endswith(suffix))
+            if not names:
+                continue
+            self.log.info('Importing {0:d} {1} files into pulse asset store.'
+                          ''.format(len(names), asset_type))
+            os.makedirs(legacy_dir, exist_ok=True)
+            for name in names:
+                asset = load_func(name)
+                if asset is not None:
+                    self._asset_store.save(asset_type, name, asset)
+                filename = name + suffix
+                if os.path.exists(os.path.join(self._assets_storage_dir, filename)):
+                    os.replace(os.path.join(self._assets_storage_dir, filename),
+                               os.path.join(legacy_dir, filename))
         return
 
     def generate_predefined_sequence(self, predefined_sequence_name, kwargs_dict):
@@ -1183,94 +1156,94 @@ class SequenceGeneratorLogic(GenericLogic):
         laser_channel = self.generation_parameters['gate_channel'] if self.generation_parameters[
             'gate_channel'] else self.generation_parameters['laser_channel']
 
-        # memorize the digital channel state of the previous element
-        tmp_digital_high = dict()
-        # memorize the laser_on flag of the previous element (in case of non-digital laser channel)
-        tmp_laser_on = False
+        # Return memoized result if the ensemble content and relevant settings have not changed
+        cache_key = (self._get_ensemble_hash(ensemble), laser_channel)
+        cached = self._ensemble_info_cache.get(ensemble.name)
+        if cached is None or cached[0] != cache_key:
+            cached = (cache_key, self._analyze_block_ensemble(ensemble, laser_channel))
+            self._ensemble_info_cache[ensemble.name] = cached
+
+        return_dict = cached[1].copy()
+        return_dict['digital_rising_bins'] = return_dict['digital_rising_bins'].copy()
+        return_dict['digital_falling_bins'] = return_dict['digital_falling_bins'].copy()
+        return_dict['generation_parameters'] = self.generation_parameters.copy()
+        return return_dict
+
+    def _analyze_block_ensemble(self, ensemble, laser_channel):
+        """
+        Calculates the information returned by analyze_block_ensemble.
+
+        Instead of iterating over all elements including repetitions, the element lengths and
+        digital/laser states are expanded for each block with numpy broadcasting. The element end
+        times are then accumulated with a cumulative sum in the same order as before.
+
+        @param PulseBlockEnsemble ensemble: The PulseBlockEnsemble instance to analyze
+        @param str laser_channel: The channel descriptor of the laser (or gate) channel
+        @return dict: see analyze_block_ensemble (without item 'generation_parameters')
+        """
         # Set of used analog and digital channels
         digital_channels = set()
         analog_channels = set()
-        # check for active channels and initialize tmp_digital_high/tmp_laser_on with the state of
-        # the very last element in the ensemble
         if len(ensemble) > 0:
             block = self.get_block(ensemble[0][0])
             digital_channels = block.digital_channels
             analog_channels = block.analog_channels
-            block = self.get_block(ensemble[-1][0])
-            if len(block) > 0:
-                tmp_digital_high = block[-1].digital_high.copy()
-                tmp_laser_on = block[-1].laser_on
-            else:
-                tmp_digital_high = {chnl: False for chnl in digital_channels}
-                tmp_laser_on = False
-
-        # dicts containing the bins where the digital channels are rising/falling
-        digital_rising_bins = {chnl: list() for chnl in digital_channels}
-        digital_falling_bins = {chnl: list() for chnl in digital_channels}
-        laser_rising_bins = list()
-        laser_falling_bins = list()
 
-        # Array to store the length in bins for all elements including repetitions in the order
-        # they are occuring in the waveform later on.
-        elements_length_bins = list()
-
-        # variables to keep track of the current timeframe
-        current_end_time = 0.0
-        current_start_bin = 0
-
-        # Loop through all blocks in the ensemble
+        # Element lengths in seconds, digital states and laser_on flags of all elements including
+        # repetitions in the order they are occuring in the waveform later on.
+        element_lengths = list()
+        digital_states = {chnl: list() for chnl in digital_channels}
+        laser_states = list()
         for block_name, reps in ensemble:
-            # Get the stored PulseBlock instance
             block = self.get_block(block_name)
+            if len(block) == 0:
+                continue
+            init_lengths = np.array([element.init_length_s for element in block], dtype='float64')
+            increments = np.array([element.increment_s for element in block], dtype='float64')
+            repetitions = np.arange(reps + 1, dtype='int64').reshape((-1, 1))
+            element_lengths.append((init_lengths + repetitions * increments).ravel())
+            for chnl in digital_channels:
+                digital_states[chnl].append(np.tile(
+                    np.array([element.digital_high[chnl] for element in block], dtype=bool),
+                    reps + 1))
+            laser_states.append(np.tile(
+                np.array([element.laser_on for element in block], dtype=bool), reps + 1))
+
+        if element_lengths:
+            element_lengths = np.concatenate(element_lengths)
+            laser_states = np.concatenate(laser_states)
+            for chnl in digital_channels:
+                digital_states[chnl] = np.concatenate(digital_states[chnl])
+        else:
+            element_lengths = np.zeros(0, dtype='float64')
+            laser_states = np.zeros(0, dtype=bool)
+            digital_states = {chnl: np.zeros(0, dtype=bool) for chnl in digital_channels}
 
-            # Iterate over all repetitions of the current block
-            for rep_no in range(reps + 1):
-                # Iterate over the Block_Elements inside the current block
-                for element in block:
-                    # save bin position if a transition from low to high or vice versa has occurred
-                    # in a digital channel
-                    if tmp_digital_high != element.digital_high:
-                        for chnl, state in element.digital_high.items():
-                            if not tmp_digital_high[chnl] and state:
-                                digital_rising_bins[chnl].append(current_start_bin)
-                            elif tmp_digital_high[chnl] and not state:
-                                digital_falling_bins[chnl].append(current_start_bin)
-                        tmp_digital_high = element.digital_high.copy()
-
-                    if not laser_channel.startswith('d') and tmp_laser_on != element.laser_on:
-                        if not tmp_laser_on and element.laser_on:
-                            laser_rising_bins.append(current_start_bin)
-                        else:
-                            laser_falling_bins.append(current_start_bin)
-                        tmp_laser_on = element.laser_on
-
-                    # Calculate length of the current element with current repetition count in sec
-                    # and add this to the ideal end time for the sequence up until this point.
-                    current_end_time += element.init_length_s + rep_no * element.increment_s
-
-                    # Nearest possible match including the discretization in bins
-                    current_end_bin = int(np.rint(current_end_time * self.__sample_rate))
-
-                    # append current element length in discrete bins to temporary array
-                    elements_length_bins.append(current_end_bin - current_start_bin)
-
-                    # advance bin offset for next element
-                    current_start_bin = current_end_bin
+        # Ideal end times of all elements and nearest possible match including the discretization
+        # in bins. The start bin of each element is the end bin of the previous one.
+        end_times = np.cumsum(element_lengths)
+        end_bins = np.rint(end_times * self.__sample_rate).astype('int64')
+        start_bins = np.concatenate(([0], end_bins[:-1])).astype('int64')
+        elements_length_bins = end_bins - start_bins
 
-        elements_length_bins = np.array(elements_length_bins, dtype='int64')
+        # The state before the first element is the state of the very last element in the ensemble
+        last_block = self.get_block(ensemble[-1][0]) if len(ensemble) > 0 else None
+        last_element = last_block[-1] if last_block is not None and len(last_block) > 0 else None
 
-        # convert rising/falling indices to numpy.ndarrays. Remove duplicates.
+        # dicts containing the bins where the digital channels are rising/falling
+        digital_rising_bins = dict()
+        digital_falling_bins = dict()
         for chnl in digital_channels:
-            digital_rising_bins[chnl] = sorted(set(digital_rising_bins[chnl]))
-            digital_falling_bins[chnl] = sorted(set(digital_falling_bins[chnl]))
-            digital_rising_bins[chnl] = np.array(digital_rising_bins[chnl], dtype='int64')
-            digital_falling_bins[chnl] = np.array(digital_falling_bins[chnl], dtype='int64')
+            initial_state = last_element.digital_high[chnl] if last_element is not None else False
+            digital_rising_bins[chnl], digital_falling_bins[chnl] = self._get_transition_bins(
+                digital_states[chnl], initial_state, start_bins)
         if laser_channel.startswith('d'):
             laser_rising_bins = digital_rising_bins[laser_channel]
             laser_falling_bins = digital_falling_bins[laser_channel]
         else:
-            laser_rising_bins = np.array(sorted(set(laser_rising_bins)), dtype='int64')
-            laser_falling_bins = np.array(sorted(set(laser_falling_bins)), dtype='int64')
+            initial_state = last_element.laser_on if last_element is not None else False
+            laser_rising_bins, laser_falling_bins = self._get_transition_bins(
+                laser_states, initial_state, start_bins)
 
         return_dict = dict()
         return_dict['number_of_samples'] = np.sum(elements_length_bins)
@@ -1281,12 +1254,26 @@ class SequenceGeneratorLogic(GenericLogic):
         return_dict['analog_channels'] = analog_channels
         return_dict['digital_channels'] = digital_channels
         return_dict['channel_set'] = analog_channels.union(digital_channels)
-        return_dict['generation_parameters'] = self.generation_parameters.copy()
-        return_dict['ideal_length'] = current_end_time
+        return_dict['ideal_length'] = float(end_times[-1]) if end_times.size > 0 else 0.0
         return_dict['laser_rising_bins'] = laser_rising_bins
         return_dict['laser_falling_bins'] = laser_falling_bins
         return return_dict
 
+    @staticmethod
+    def _get_transition_bins(states, initial_state, start_bins):
+        """
+        Determines the bins of low-to-high and high-to-low transitions of a channel.
+
+        @param numpy.ndarray states: bool array of the channel state of each element
+        @param bool initial_state: The channel state before the first element
+        @param numpy.ndarray start_bins: The start bin of each element
+        @return tuple: Two numpy.ndarray (rising bins, falling bins) of unique sorted bins
+        """
+        previous_states = np.concatenate(([initial_state], states[:-1])).astype(bool)
+        rising_bins = np.unique(start_bins[states & ~previous_states]).astype('int64')
+        falling_bins = np.unique(start_bins[~states & previous_states]).astype('int64')
+        return rising_bins, falling_bins
+
     def analyze_sequence(self, sequence):
         """
         This helper method runs through each step of a PulseSequence object and extracts
@@ -1615,12 +1602,22 @@ class SequenceGeneratorLogic(GenericLogic):
         # Set the waveform name (excluding the device specific channel naming suffix, i.e. '_ch1')
         waveform_name = name_tag if name_tag else ensemble.name
 
-        # check for old waveforms associated with the ensemble and delete them from pulse generator.
-        self._delete_waveform_by_nametag(waveform_name)
-
         # Take current time
         start_time = time.time()
 
+        # Skip sampling and upload if the device already holds waveforms sampled from the very same
+        # ensemble content with the same pulse generator settings.
+        ensemble_hash = self._get_ensemble_hash(ensemble, offset_bin)
+        cached_waveforms = self._get_cached_waveforms(waveform_name, ensemble_hash)
+        if cached_waveforms:
+            self.log.info('Waveforms of PulseBlockEnsemble "{0}" with identical content are already '
+                          'present on the device. Skipping sampling.'.format(ensemble.name))
+            return self._finish_ensemble_sampling(ensemble, waveform_name, cached_waveforms,
+                                                  offset_bin, start_time)
+
+        # check for old waveforms associated with the ensemble and delete them from pulse generator.
+        self._delete_waveform_by_nametag(waveform_name)
+
         # get important parameters from the ensemble
         ensemble_info = self.analyze_block_ensemble(ensemble)
 
@@ -1662,6 +1659,8 @@ class SequenceGeneratorLogic(GenericLogic):
             else:
                 self.log.warn('Extending waveform {0} by {2} bins. New length {1}.'.format(
                     ensemble.name, ensemble_info['number_of_samples'], extension_samples))
+            # The ensemble content has changed
+            ensemble_hash = self._get_ensemble_hash(ensemble, offset_bin)
 
         # Calculate the byte size per sample.
         # One analog sample per channel is 4 bytes (np.float32) and one digital sample per channel
@@ -1673,19 +1672,51 @@ class SequenceGeneratorLogic(GenericLogic):
         bytes_per_ensemble = bytes_per_sample * ensemble_info['number_of_samples']
 
         # Determine the size of the sample arrays to be written as a whole.
+        # If the ensemble is written in several chunks, two sets of sample arrays are used in
+        # order to sample the next chunk while the previous one is written to the device. Both
+        # sets together must not exceed overhead_bytes.
         if bytes_per_ensemble <= self._overhead_bytes or self._overhead_bytes == 0:
             array_length = ensemble_info['number_of_samples']
+            number_of_buffers = 1
         else:
-            array_length = self._overhead_bytes // bytes_per_sample
-
-        # Allocate the sample arrays that are used for a single write command
-        analog_samples = dict()
-        digital_samples = dict()
+            array_length = max(1, self._overhead_bytes // (2 * bytes_per_sample))
+            number_of_buffers = 2
+
+        # Upload samples from the on-disk waveform cache if present instead of sampling again
+        cache_path = os.path.join(self._waveform_cache_dir, ensemble_hash)
+        if self._waveform_cache_bytes > 0 and os.path.isdir(cache_path):
+            written_waveforms = self._write_waveform_from_cache(waveform_name, cache_path,
+                                                                ensemble_info, array_length)
+            if written_waveforms:
+                self.log.info('Uploaded waveforms of PulseBlockEnsemble "{0}" from waveform cache.'
+                              ''.format(ensemble.name))
+                self._sampled_waveform_hashes[waveform_name] = {'hash': ensemble_hash,
+                                                                'waveforms': written_waveforms}
+                if ensemble.rotating_frame:
+                    offset_bin += ensemble_info['number_of_samples']
+                return self._finish_ensemble_sampling(ensemble, waveform_name, written_waveforms,
+                                                      offset_bin, start_time, ensemble_info)
+
+        # Allocate the sample array sets that are used for a single write command.
+        # The analog sample arrays are shared memory buffers in case of parallel sampling. Their
+        # keys are tuples (buffer index, channel descriptor).
+        sample_buffers = [(dict(), dict()) for i in range(number_of_buffers)]
+        shared_buffers = dict()
+        # Starting the worker processes takes longer than sampling a single chunk sequentially
+        parallel_sampling = self._sampling_processes > 0 and number_of_buffers > 1
+        # Always spawn worker processes since forking the multithreaded qudi process is unsafe
+        mp_context = multiprocessing.get_context('spawn')
         try:
-            for chnl in ensemble_info['analog_channels']:
-                analog_samples[chnl] = np.empty(array_length, dtype='float32')
-            for chnl in ensemble_info['digital_channels']:
-                digital_samples[chnl] = np.empty(array_length, dtype=bool)
+            for buffer_index, (analog_buffer, digital_buffer) in enumerate(sample_buffers):
+                for chnl in ensemble_info['analog_channels']:
+                    if parallel_sampling:
+                        shared = mp_context.RawArray('f', int(array_length))
+                        shared_buffers[(buffer_index, chnl)] = shared
+                        analog_buffer[chnl] = np.frombuffer(shared, dtype='float32')
+                    else:
+                        analog_buffer[chnl] = np.empty(array_length, dtype='float32')
+                for chnl in ensemble_info['digital_channels']:
+                    digital_buffer[chnl] = np.empty(array_length, dtype=bool)
         except MemoryError:
             self.log.error('Sampling of PulseBlockEnsemble "{0}" failed due to a MemoryError.\n'
                            'The sample array needed is too large to allocate in memory.\n'
@@ -1696,105 +1727,218 @@ class SequenceGeneratorLogic(GenericLogic):
             self.sigSampleEnsembleComplete.emit(None)
             return -1, list(), dict()
 
-        # integer to keep track of the sampls already processed
-        processed_samples = 0
-        # Index to keep track of the samples written into the preallocated samples array
-        array_write_index = 0
-        # Keep track of the number of elements already written
-        element_count = 0
-        # set of written waveform names on the device
-        written_waveforms = set()
-        # Iterate over all blocks within the PulseBlockEnsemble object
-        for block_name, reps in ensemble.block_list:
-            block = self.get_block(block_name)
-            # Iterate over all repetitions of the current block
-            for rep_no in range(reps + 1):
-                # Iterate over the PulseBlockElement instances inside the current block
-                for element in block.element_list:
-                    digital_high = element.digital_high
-                    pulse_function = element.pulse_function
-                    element_length_bins = ensemble_info['elements_length_bins'][element_count]
-
-                    # Indicator on how many samples of this element have been written already
-                    element_samples_written = 0
-
-                    while element_samples_written != element_length_bins:
-                        samples_to_add = min(array_length - array_write_index,
-                                             element_length_bins - element_samples_written)
-                        # create floating point time array for the current element inside rotating
-                        # frame if analog samples are to be calculated.
-                        if pulse_function:
-                            time_arr = (offset_bin + np.arange(
-                                samples_to_add, dtype='float64')) / self.__sample_rate
-
-                        # Calculate respective part of the sample arrays
-                        for chnl in digital_high:
-                            digital_samples[chnl][array_write_index:array_write_index + samples_to_add] = digital_high[
-                                chnl]
-                        for chnl in pulse_function:
-                            analog_samples[chnl][array_write_index:array_write_index + samples_to_add] = pulse_function[
-                                                                                                             chnl].get_samples(
-                                time_arr) / self.__analog_levels[0][chnl]
-
-                        # Free memory
-                        if pulse_function:
-                            del time_arr
-
-                        element_samples_written += samples_to_add
-                        array_write_index += samples_to_add
-                        processed_samples += samples_to_add
-                        # if the rotating frame should be preserved (default) increment the offset
-                        # counter for the time array.
-                        if ensemble.rotating_frame:
-                            offset_bin += samples_to_add
-
-                        # Check if the temporary sample array is full and write to the device if so.
-                        if array_write_index == array_length:
-                            # Set first/last chunk flags
-                            is_first_chunk = array_write_index == processed_samples
-                            is_last_chunk = processed_samples == ensemble_info['number_of_samples']
-                            written_samples, wfm_list = self.pulsegenerator().write_waveform(
-                                name=waveform_name,
-                                analog_samples=analog_samples,
-                                digital_samples=digital_samples,
-                                is_first_chunk=is_first_chunk,
-                                is_last_chunk=is_last_chunk,
-                                total_number_of_samples=ensemble_info['number_of_samples'])
-
-                            # Update written waveforms set
-                            written_waveforms.update(wfm_list)
-
-                            # check if write process was successful
-                            if written_samples != array_length:
-                                self.log.error('Sampling of block "{0}" in ensemble "{1}" failed. '
-                                               'Write to device was unsuccessful.\nThe number of '
-                                               'actually written samples ({2:d}) does not match '
-                                               'the number of samples staged to write ({3:d}).'
-                                               ''.format(block_name, ensemble.name, written_samples,
-                                                         array_length))
-                                if not self.__sequence_generation_in_progress:
-                                    self.module_state.unlock()
-                                self.sigAvailableWaveformsUpdated.emit(self.sampled_waveforms)
-                                self.sigSampleEnsembleComplete.emit(None)
-                                return -1, list(), dict()
-
-                            # Reset array write start pointer
-                            array_write_index = 0
-
-                            # check if the temporary write array needs to be truncated for the next
-                            # part. (because it is the last part of the ensemble to write which can
-                            # be shorter than the previous chunks)
-                            if array_length > ensemble_info['number_of_samples'] - processed_samples:
-                                array_length = ensemble_info['number_of_samples'] - processed_samples
-                                analog_samples = dict()
-                                digital_samples = dict()
-                                for chnl in ensemble_info['analog_channels']:
-                                    analog_samples[chnl] = np.empty(array_length, dtype='float32')
-                                for chnl in ensemble_info['digital_channels']:
-                                    digital_samples[chnl] = np.empty(array_length, dtype=bool)
-
-                    # Increment element index
-                    element_count += 1
+        # The sample arrays currently filled
+        buffer_index = 0
+        analog_samples, digital_samples = sample_buffers[buffer_index]
+
+        # Create memory mapped sample files to store the samples in the on-disk waveform cache
+        cache_samples = None
+        if 0 < bytes_per_ensemble <= self._waveform_cache_bytes:
+            cache_samples = self._create_waveform_cache_entry(ensemble_hash, ensemble_info)
+
+        # Memoized analog samples of the elements sampled so far
+        sample_memo = {'samples': dict(), 'periods': dict(), 'bytes': 0, 'hits': 0, 'misses': 0}
+
+        # Start worker processes for parallel sampling. The analog samples of the current chunk are
+        # collected as tasks and calculated by the workers before the chunk is written to device.
+        sampling_pool = None
+        analog_tasks = OrderedDict()
+        if shared_buffers:
+            try:
+                sampling_pool = mp_context.Pool(processes=self._sampling_processes,
+                                                initializer=init_sampling_worker,
+                                                initargs=(shared_buffers,))
+            except OSError:
+                self.log.warning('Unable to start worker processes for parallel sampling. '
+                                 'Falling back to sequential sampling.')
+
+        # The chunks are written to the device in order by a single background thread while the
+        # next chunk is sampled.
+        write_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        write_futures = list()
+        sampling_timings = {'sample': 0.0, 'write': 0.0, 'wait': 0.0}
+        loop_start_time = time.perf_counter()
+
+        # The worker processes and the write thread are stopped in any case. If sampling or writing
+        # fails with an exception, the module is unlocked before the exception is raised.
+        try:
+            # integer to keep track of the sampls already processed
+            processed_samples = 0
+            # Index to keep track of the samples written into the preallocated samples array
+            array_write_index = 0
+            # Keep track of the number of elements already written
+            element_count = 0
+            # set of written waveform names on the device
+            written_waveforms = set()
+            # Iterate over all blocks within the PulseBlockEnsemble object
+            for block_name, reps in ensemble.block_list:
+                block = self.get_block(block_name)
+                # Iterate over all repetitions of the current block
+                for rep_no in range(reps + 1):
+                    # Iterate over the PulseBlockElement instances inside the current block
+                    for element in block.element_list:
+                        digital_high = element.digital_high
+                        pulse_function = element.pulse_function
+                        element_length_bins = ensemble_info['elements_length_bins'][element_count]
+
+                        # Indicator on how many samples of this element have been written already
+                        element_samples_written = 0
+
+                        while element_samples_written != element_length_bins:
+                            samples_to_add = min(array_length - array_write_index,
+                                                 element_length_bins - element_samples_written)
+
+                            # Calculate respective part of the sample arrays
+                            for chnl in digital_high:
+                                digital_samples[chnl][array_write_index:array_write_index + samples_to_add] = digital_high[
+                                    chnl]
+                            for chnl in pulse_function:
+                                if sampling_pool is None:
+                                    analog_samples[chnl][array_write_index:array_write_index + samples_to_add] = self._get_analog_samples(
+                                        pulse_function[chnl], chnl, offset_bin, samples_to_add, sample_memo)
+                                else:
+                                    self._add_analog_task(analog_tasks, pulse_function[chnl], chnl,
+                                                          offset_bin, samples_to_add, array_write_index,
+                                                          sample_memo)
+
+                            element_samples_written += samples_to_add
+                            array_write_index += samples_to_add
+                            processed_samples += samples_to_add
+                            # if the rotating frame should be preserved (default) increment the offset
+                            # counter for the time array.
+                            if ensemble.rotating_frame:
+                                offset_bin += samples_to_add
+
+                            # Check if the temporary sample array is full and write to the device if so.
+                            if array_write_index == array_length:
+                                # Calculate the analog samples of this chunk in the worker processes
+                                if sampling_pool is not None:
+                                    self._sample_analog_tasks(sampling_pool, analog_tasks,
+                                                              buffer_index)
+                                    analog_tasks.clear()
+                                # Set first/last chunk flags
+                                is_first_chunk = array_write_index == processed_samples
+                                is_last_chunk = processed_samples == ensemble_info['number_of_samples']
+                                # Copy chunk into the waveform cache
+                                if cache_samples is not None:
+                                    cache_start = processed_samples - array_length
+                                    for chnl, samples in analog_samples.items():
+                                        cache_samples[chnl][cache_start:processed_samples] = samples
+                                    for chnl, samples in digital_samples.items():
+                                        cache_samples[chnl][cache_start:processed_samples] = samples
+                                write_futures.append(write_executor.submit(
+                                    self._write_sample_chunk, waveform_name, analog_samples,
+                                    digital_samples, is_first_chunk, is_last_chunk,
+                                    ensemble_info['number_of_samples'], sampling_timings))
+
+                                # Wait until the previous chunk (and the last chunk) has been written
+                                # to free its sample arrays for the next chunk.
+                                wait_start_time = time.perf_counter()
+                                write_failed = False
+                                while len(write_futures) > (0 if is_last_chunk else 1):
+                                    written_samples, wfm_list, staged_samples = write_futures.pop(
+                                        0).result()
+                                    # Update written waveforms set
+                                    written_waveforms.update(wfm_list)
+                                    # check if write process was successful
+                                    if written_samples != staged_samples and not write_failed:
+                                        write_failed = True
+                                        self.log.error('Sampling of ensemble "{0}" failed. Write to '
+                                                       'device was unsuccessful.\nThe number of '
+                                                       'actually written samples ({1:d}) does not '
+                                                       'match the number of samples staged to write '
+                                                       '({2:d}).'.format(ensemble.name, written_samples,
+                                                                         staged_samples))
+                                sampling_timings['wait'] += time.perf_counter() - wait_start_time
+
+                                if write_failed:
+                                    if cache_samples is not None:
+                                        self._discard_waveform_cache_entry(ensemble_hash)
+                                    if not self.__sequence_generation_in_progress:
+                                        self.module_state.unlock()
+                                    self.sigAvailableWaveformsUpdated.emit(self.sampled_waveforms)
+                                    self.sigSampleEnsembleComplete.emit(None)
+                                    return -1, list(), dict()
+
+                                # Reset array write start pointer
+                                array_write_index = 0
+
+                                # check if the temporary write array needs to be truncated for the next
+                                # part. (because it is the last part of the ensemble to write which can
+                                # be shorter than the previous chunks)
+                                if array_length > ensemble_info['number_of_samples'] - processed_samples:
+                                    array_length = ensemble_info['number_of_samples'] - processed_samples
+
+                                # Switch to the other sample array set for the next chunk
+                                buffer_index = (buffer_index + 1) % number_of_buffers
+                                analog_samples = {chnl: samples[:array_length] for chnl, samples in
+                                                  sample_buffers[buffer_index][0].items()}
+                                digital_samples = {chnl: samples[:array_length] for chnl, samples in
+                                                   sample_buffers[buffer_index][1].items()}
+
+                        # Increment element index
+                        element_count += 1
+
+            if sampling_pool is not None:
+                sampling_pool.close()
+                sampling_pool.join()
+        except:
+            if cache_samples is not None:
+                self._discard_waveform_cache_entry(ensemble_hash)
+            if not self.__sequence_generation_in_progress:
+                self.module_state.unlock()
+            self.sigSampleEnsembleComplete.emit(None)
+            raise
+        finally:
+            if sampling_pool is not None:
+                sampling_pool.terminate()
+            write_executor.shutdown()
+
+        sampling_timings['sample'] = (time.perf_counter() - loop_start_time -
+                                      sampling_timings['wait'])
+        self._sampling_timings = sampling_timings
+        self.log.info('Sampling of PulseBlockEnsemble "{0}" took {1:.3f} s, writing to device took '
+                      '{2:.3f} s ({3:.3f} s spent waiting for the device).'
+                      ''.format(ensemble.name, sampling_timings['sample'],
+                                sampling_timings['write'], sampling_timings['wait']))
+
+        self._sample_memo_statistics = {'hits': sample_memo['hits'],
+                                        'misses': sample_memo['misses']}
+        self.log.debug('Reused {0:d} and calculated {1:d} analog sample arrays while sampling '
+                       'PulseBlockEnsemble "{2}".'.format(sample_memo['hits'],
+                                                          sample_memo['misses'], ensemble.name))
+
+        # Finalize the waveform cache entry and remember the content hash of the written waveforms
+        if cache_samples is not None:
+            self._commit_waveform_cache_entry(ensemble_hash, cache_samples)
+        self._sampled_waveform_hashes[waveform_name] = {'hash': ensemble_hash,
+                                                        'waveforms': natural_sort(written_waveforms)}
+
+        return self._finish_ensemble_sampling(ensemble, waveform_name, written_waveforms,
+                                              offset_bin, start_time, ensemble_info)
+
+    def _finish_ensemble_sampling(self, ensemble, waveform_name, written_waveforms, offset_bin,
+                                  start_time, ensemble_info=None):
+        """
+        Helper method to store the sampling information in the ensemble, unlock the module and emit
+        the update signals after a PulseBlockEnsemble has been successfully sampled and written to
+        the device (or the waveforms are already present on the device).
+
+        @param PulseBlockEnsemble ensemble: The sampled PulseBlockEnsemble instance
+        @param str waveform_name: The waveform name (without channel suffix)
+        @param iterable written_waveforms: The names of the waveforms present on the device
+        @param int offset_bin: The offset bin at the end of the ensemble
+        @param float start_time: time.time() at the start of the sampling
+        @param dict ensemble_info: The result of analyze_block_ensemble for the ensemble
+
+        @return tuple: (offset_bin, created_waveforms, ensemble_info) as in
+                       sample_pulse_block_ensemble
+        """
+        if ensemble_info is None:
+            ensemble_info = self.analyze_block_ensemble(ensemble)
+            # offset_bin is the offset at the start of the ensemble in this case
+            if ensemble.rotating_frame:
+                offset_bin += ensemble_info['number_of_samples']
 
         # Save sampling related parameters to the sampling_information container within the
         # PulseBlockEnsemble.
@@ -1818,6 +1962,359 @@ class SequenceGeneratorLogic(GenericLogic):
         self.sigSampleEnsembleComplete.emit(ensemble)
         return offset_bin, natural_sort(written_waveforms), ensemble_info
 
+    def _write_sample_chunk(self, waveform_name, analog_samples, digital_samples, is_first_chunk,
+                            is_last_chunk, total_number_of_samples, sampling_timings):
+        """
+        Writes a chunk of samples to the pulse generator device. Called in the background write
+        thread of sample_pulse_block_ensemble.
+
+        @param str waveform_name: The waveform name (without channel suffix)
+        @param dict analog_samples: float32 sample arrays with analog channel descriptors as keys
+        @param dict digital_samples: bool sample arrays with digital channel descriptors as keys
+        @param bool is_first_chunk: Flag indicating the first chunk of the waveform
+        @param bool is_last_chunk: Flag indicating the last chunk of the waveform
+        @param int total_number_of_samples: The total number of samples of the waveform
+        @param dict sampling_timings: The time spent writing is added to the item 'write'
+
+        @return tuple: (number of written samples, list of created waveform names,
+                        number of samples staged to write)
+        """
+        start_time = time.perf_counter()
+        written_samples, wfm_list = self.pulsegenerator().write_waveform(
+            name=waveform_name,
+            analog_samples=analog_samples,
+            digital_samples=digital_samples,
+            is_first_chunk=is_first_chunk,
+            is_last_chunk=is_last_chunk,
+            total_number_of_samples=total_number_of_samples)
+        sampling_timings['write'] += time.perf_counter() - start_time
+        staged_samples = len(next(iter(analog_samples.values()))) if analog_samples else len(
+            next(iter(digital_samples.values())))
+        return written_samples, wfm_list, staged_samples
+
+    def _get_analog_samples(self, sampling_function, chnl, offset_bin, number_of_samples,
+                            sample_memo):
+        """
+        Calculates the analog samples of a sampling function for a number of time bins starting at
+        the time bin offset_bin. The samples are normalized to the analog level of the channel.
+
+        The samples are memoized in sample_memo and reused for identical sampling functions with
+        the same number of samples and the same phase, i.e. the same time offset modulo the
+        sample period of the function (see _get_sample_period_bins).
+
+        @param SamplingBase sampling_function: The sampling function instance to sample
+        @param str chnl: The analog channel descriptor
+        @param int offset_bin: The time bin of the first sample
+        @param int number_of_samples: The number of samples to calculate
+        @param dict sample_memo: The memo container of the current ensemble sampling
+        @return numpy.ndarray: The float32 sample array. Must not be altered by the caller.
+        """
+        memo_key = self._get_sample_memo_key(sampling_function, chnl, offset_bin,
+                                             number_of_samples, sample_memo)
+        samples = sample_memo['samples'].get(memo_key)
+        if samples is not None:
+            sample_memo['hits'] += 1
+            return samples
+
+        sample_memo['misses'] += 1
+        time_arr = (offset_bin + np.arange(number_of_samples, dtype='float64')) / self.__sample_rate
+        samples = np.asarray(sampling_function.get_samples(time_arr) / self.__analog_levels[0][chnl],
+                             dtype='float32')
+        if sample_memo['bytes'] + samples.nbytes <= self._sample_memo_bytes:
+            sample_memo['samples'][memo_key] = samples
+            sample_memo['bytes'] += samples.nbytes
+        return samples
+
+    def _get_sample_memo_key(self, sampling_function, chnl, offset_bin, number_of_samples,
+                             sample_memo):
+        """
+        Returns the key identifying the analog samples of a sampling function in sample_memo.
+        Identical keys denote identical samples.
+
+        @param SamplingBase sampling_function: The sampling function instance to sample
+        @param str chnl: The analog channel descriptor
+        @param int offset_bin: The time bin of the first sample
+        @param int number_of_samples: The number of samples to calculate
+        @param dict sample_memo: The memo container of the current ensemble sampling
+        @return tuple: the memo key
+        """
+        function_key = (chnl, type(sampling_function).__name__,
+                        tuple(getattr(sampling_function, p) for p in sampling_function.params))
+        if function_key not in sample_memo['periods']:
+            sample_memo['periods'][function_key] = self._get_sample_period_bins(sampling_function)
+        period_bins = sample_memo['periods'][function_key]
+        phase_bin = offset_bin if period_bins is None else offset_bin % period_bins
+        return function_key, number_of_samples, phase_bin
+
+    def _add_analog_task(self, analog_tasks, sampling_function, chnl, offset_bin,
+                         number_of_samples, write_index, sample_memo):
+        """
+        Adds the calculation of analog samples to the tasks of the current chunk for parallel
+        sampling. Identical samples (see _get_sample_memo_key) are calculated only once and copied
+        to all destinations.
+
+        @param OrderedDict analog_tasks: The tasks of the current chunk
+        @param SamplingBase sampling_function: The sampling function instance to sample
+        @param str chnl: The analog channel descriptor
+        @param int offset_bin: The time bin of the first sample
+        @param int number_of_samples: The number of samples to calculate
+        @param int write_index: The index of the first sample in the chunk
+        @param dict sample_memo: The memo container of the current ensemble sampling
+        """
+        memo_key = self._get_sample_memo_key(sampling_function, chnl, offset_bin,
+                                             number_of_samples, sample_memo)
+        if memo_key in analog_tasks:
+            sample_memo['hits'] += 1
+            analog_tasks[memo_key][-1].append((chnl, write_index))
+        else:
+            sample_memo['misses'] += 1
+            analog_tasks[memo_key] = (sampling_function, self.__sample_rate,
+                                      self.__analog_levels[0][chnl], offset_bin, number_of_samples,
+                                      [(chnl, write_index)])
+        return
+
+    def _sample_analog_tasks(self, sampling_pool, analog_tasks, buffer_index):
+        """
+        Distributes the analog sampling tasks of the current chunk evenly among the worker
+        processes and waits until all samples have been written into the shared sample buffers.
+        Long samples of purely periodic or time invariant functions are split into several tasks.
+
+        @param multiprocessing.Pool sampling_pool: The pool of sampling worker processes
+        @param OrderedDict analog_tasks: The tasks of the current chunk
+        @param int buffer_index: The index of the sample array set of the current chunk
+        """
+        if not analog_tasks:
+            return
+        workers = self._sampling_processes
+        total_samples = sum(task[4] for task in analog_tasks.values())
+        max_task_samples = max(1, -(-total_samples // workers))
+
+        # Split long tasks only for periodic functions with known frequencies (get_frequencies()
+        # is not None). Their samples do not depend on how the interval is split. Functions like
+        # Chirp depend on the start and length of the sampled interval and are kept whole.
+        task_list = list()
+        for function, sample_rate, level, offset_bin, number_of_samples, dests in list(
+                analog_tasks.values()):
+            dests = [((buffer_index, chnl), index) for chnl, index in dests]
+            if number_of_samples <= max_task_samples or function.get_frequencies() is None:
+                task_list.append((function, sample_rate, level, offset_bin, number_of_samples,
+                                  dests))
+                continue
+            for start in range(0, number_of_samples, max_task_samples):
+                length = min(max_task_samples, number_of_samples - start)
+                task_list.append((function, sample_rate, level, offset_bin + start, length,
+                                  [(key, index + start) for key, index in dests]))
+
+        # Assign the largest tasks first, each to the worker with the least work so far
+        work_packages = [list() for i in range(workers)]
+        work_load = [0] * workers
+        for task in sorted(task_list, key=lambda t: t[4] * (1 + len(t[5])), reverse=True):
+            worker = work_load.index(min(work_load))
+            work_packages[worker].append(task)
+            work_load[worker] += task[4] * (1 + len(task[5]))
+        sampling_pool.map(sample_into_buffers, [package for package in work_packages if package])
+        return
+
+    def _get_sample_period_bins(self, sampling_function):
+        """
+        Calculates the number of time bins after which the samples of a sampling function repeat
+        exactly, i.e. the smallest integer number of bins spanning an integer number of periods of
+        all frequency components at the current sample rate.
+
+        @param SamplingBase sampling_function: The sampling function instance
+        @return int: The sample period in bins. None if the samples do not repeat.
+        """
+        frequencies = sampling_function.get_frequencies()
+        if frequencies is None:
+            return None
+        period_bins = 1
+        try:
+            for freq in frequencies:
+                cycles_per_bin = Fraction(freq) / Fraction(self.__sample_rate)
+                period_bins *= cycles_per_bin.denominator // math.gcd(period_bins,
+                                                                      cycles_per_bin.denominator)
+        except (ValueError, OverflowError, TypeError):
+            return None
+        return period_bins
+
+    def _get_ensemble_hash(self, ensemble, offset_bin=0):
+        """
+        Calculates a hash of everything that determines the samples of a PulseBlockEnsemble, i.e.
+        the ensemble itself, all contained PulseBlocks (incl. sampling function parameters), the
+        sampling offset and the relevant pulse generator settings.
+
+        @param PulseBlockEnsemble ensemble: The PulseBlockEnsemble instance to hash
+        @param int offset_bin: The offset bin used for sampling the ensemble
+        @return str: hexadecimal hash string
+        """
+        hash_dict = {'block_list': ensemble.block_list,
+                     'rotating_frame': ensemble.rotating_frame,
+                     'offset_bin': int(offset_bin),
+                     'activation_config': natural_sort(self.__activation_config[1]),
+                     'sample_rate': self.__sample_rate,
+                     'analog_levels': self.__analog_levels,
+                     'digital_levels': self.__digital_levels,
+                     'interleave': self.__interleave,
+                     'blocks': dict()}
+        for block_name in {name for name, reps in ensemble.block_list}:
+            block = self._saved_pulse_blocks.get(block_name)
+            hash_dict['blocks'][block_name] = block.get_dict_representation() if block else None
+        # Sort all dictionary keys to get a representation independent of the insertion order
+        hash_str = json.dumps(hash_dict, sort_keys=True, default=repr)
+        return hashlib.sha1(hash_str.encode()).hexdigest()
+
+    def _get_cached_waveforms(self, waveform_name, ensemble_hash):
+        """
+        Checks if the waveforms by the name waveform_name present on the device have been sampled
+        from ensemble content with the hash ensemble_hash.
+
+        @param str waveform_name: The waveform name (without channel suffix)
+        @param str ensemble_hash: The content hash (see _get_ensemble_hash)
+        @return list: The waveform names present on the device. Empty list if not present.
+        """
+        cached = self._sampled_waveform_hashes.get(waveform_name)
+        if not cached or cached['hash'] != ensemble_hash or not cached['waveforms']:
+            return list()
+        device_waveforms = self.sampled_waveforms
+        if any(wfm not in device_waveforms for wfm in cached['waveforms']):
+            del self._sampled_waveform_hashes[waveform_name]
+            return list()
+        return list(cached['waveforms'])
+
+    def _create_waveform_cache_entry(self, ensemble_hash, ensemble_info):
+        """
+        Creates memory mapped sample files for all channels in a temporary directory of the
+        on-disk waveform cache.
+
+        @param str ensemble_hash: The content hash (see _get_ensemble_hash)
+        @param dict ensemble_info: The result of analyze_block_ensemble for the ensemble
+        @return dict: memory mapped sample arrays with channel descriptors as keys.
+                      None if the cache entry could not be created.
+        """
+        tmp_path = os.path.join(self._waveform_cache_dir, ensemble_hash + '.tmp')
+        number_of_samples = int(ensemble_info['number_of_samples'])
+        try:
+            self._prune_waveform_cache(self._waveform_cache_bytes - (
+                    len(ensemble_info['analog_channels']) * 4 +
+                    len(ensemble_info['digital_channels'])) * number_of_samples)
+            os.makedirs(tmp_path, exist_ok=True)
+            cache_samples = dict()
+            for chnl in ensemble_info['analog_channels']:
+                cache_samples[chnl] = np.lib.format.open_memmap(
+                    os.path.join(tmp_path, chnl + '.npy'), mode='w+', dtype='float32',
+                    shape=(number_of_samples,))
+            for chnl in ensemble_info['digital_channels']:
+                cache_samples[chnl] = np.lib.format.open_memmap(
+                    os.path.join(tmp_path, chnl + '.npy'), mode='w+', dtype=bool,
+                    shape=(number_of_samples,))
+        except OSError:
+            self.log.warning('Unable to create waveform cache entry in "{0}".'.format(tmp_path))
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            return None
+        return cache_samples
+
+    def _commit_waveform_cache_entry(self, ensemble_hash, cache_samples):
+        """
+        Flushes the memory mapped sample files of a cache entry to disk and makes it available.
+
+        @param str ensemble_hash: The content hash (see _get_ensemble_hash)
+        @param dict cache_samples: memory mapped sample arrays (see _create_waveform_cache_entry)
+        """
+        # Release all references to the memory maps before moving the files
+        for chnl in list(cache_samples):
+            cache_samples.pop(chnl).flush()
+        tmp_path = os.path.join(self._waveform_cache_dir, ensemble_hash + '.tmp')
+        cache_path = os.path.join(self._waveform_cache_dir, ensemble_hash)
+        try:
+            shutil.rmtree(cache_path, ignore_errors=True)
+            os.rename(tmp_path, cache_path)
+        except OSError:
+            self.log.warning('Unable to store waveform cache entry "{0}".'.format(cache_path))
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        return
+
+    def _discard_waveform_cache_entry(self, ensemble_hash):
+        """
+        Removes a (temporary) cache entry from the on-disk waveform cache.
+
+        @param str ensemble_hash: The content hash (see _get_ensemble_hash)
+        """
+        shutil.rmtree(os.path.join(self._waveform_cache_dir, ensemble_hash + '.tmp'),
+                      ignore_errors=True)
+        shutil.rmtree(os.path.join(self._waveform_cache_dir, ensemble_hash), ignore_errors=True)
+        return
+
+    def _prune_waveform_cache(self, max_bytes):
+        """
+        Deletes the least recently used entries of the on-disk waveform cache until the total size
+        of the cache is below max_bytes.
+
+        @param int max_bytes: The maximum total size of the cache in bytes
+        """
+        entries = list()
+        total_bytes = 0
+        with os.scandir(self._waveform_cache_dir) as scan:
+            for entry in scan:
+                if not entry.is_dir():
+                    continue
+                entry_bytes = sum(f.stat().st_size for f in os.scandir(entry.path) if f.is_file())
+                entries.append((entry.stat().st_mtime, entry.path, entry_bytes))
+                total_bytes += entry_bytes
+        for mtime, path, entry_bytes in sorted(entries):
+            if total_bytes <= max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total_bytes -= entry_bytes
+        return
+
+    def _write_waveform_from_cache(self, waveform_name, cache_path, ensemble_info, array_length):
+        """
+        Writes the samples stored in the on-disk waveform cache to the device in chunks of
+        array_length samples.
+
+        @param str waveform_name: The waveform name (without channel suffix)
+        @param str cache_path: The directory of the cache entry
+        @param dict ensemble_info: The result of analyze_block_ensemble for the ensemble
+        @param int array_length: The number of samples to write per chunk
+        @return list: The written waveform names. Empty list if writing failed.
+        """
+        number_of_samples = ensemble_info['number_of_samples']
+        try:
+            cache_samples = {chnl: np.load(os.path.join(cache_path, chnl + '.npy'), mmap_mode='r')
+                             for chnl in ensemble_info['channel_set']}
+        except (OSError, ValueError):
+            self.log.warning('Corrupted waveform cache entry "{0}" removed.'.format(cache_path))
+            shutil.rmtree(cache_path, ignore_errors=True)
+            return list()
+        if any(samples.size != number_of_samples for samples in cache_samples.values()):
+            return list()
+        # Mark the cache entry as recently used
+        os.utime(cache_path)
+
+        written_waveforms = set()
+        processed_samples = 0
+        while processed_samples < number_of_samples:
+            chunk_length = min(array_length, number_of_samples - processed_samples)
+            chunk = slice(processed_samples, processed_samples + chunk_length)
+            analog_samples = {chnl: np.array(cache_samples[chnl][chunk])
+                              for chnl in ensemble_info['analog_channels']}
+            digital_samples = {chnl: np.array(cache_samples[chnl][chunk])
+                               for chnl in ensemble_info['digital_channels']}
+            written_samples, wfm_list = self.pulsegenerator().write_waveform(
+                name=waveform_name,
+                analog_samples=analog_samples,
+                digital_samples=digital_samples,
+                is_first_chunk=processed_samples == 0,
+                is_last_chunk=processed_samples + chunk_length == number_of_samples,
+                total_number_of_samples=number_of_samples)
+            if written_samples != chunk_length:
+                self.log.error('Writing cached samples of waveform "{0}" to device failed.'
+                               ''.format(waveform_name))
+                return list()
+            written_waveforms.update(wfm_list)
+            processed_samples += chunk_length
+        return natural_sort(written_waveforms)
+
     @QtCore.Slot(str)
     def sample_pulse_sequence(self, sequence):
         """ Samples the PulseSequence object, which serves as the construction plan.
@@ -1970,6 +2467,10 @@ class SequenceGeneratorLogic(GenericLogic):
         for wfm in names:
             if wfm in current_waveforms:
                 self.pulsegenerator().delete_waveform(wfm)
+        # Forget content hashes of deleted waveforms
+        for wfm_name in [name for name, cached in self._sampled_waveform_hashes.items() if
+                         set(cached['waveforms']).intersection(names)]:
+            del self._sampled_waveform_hashes[wfm_name]
         self.sigAvailableWaveformsUpdated.emit(self.sampled_waveforms)
         return
 
@@ -21,23 +21,34 @@ top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi
 
 from cycler import cycler
 import datetime
-import inspect
+import functools
 import logging
 import matplotlib.pyplot as plt
+import multiprocessing
 import numpy as np
 import os
+import pickle
 import sys
 import time
 
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from core.module import ConfigOption
 from core.util import units
+from core.util.figure_export import save_figure, save_pickled_figure, init_render_worker
 from core.util.mutex import Mutex
 from core.util.network import netobtain
 from logic.generic_logic import GenericLogic
-from matplotlib.backends.backend_pdf import PdfPages
-from PIL import Image
-from PIL import PngImagePlugin
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from qtpy import QtCore
+try:
+    import h5py
+except ImportError:
+    h5py = None
+
+# Top level packages of qudi modules. Data saved from code outside of them (e.g. the console, a
+# jupyter notebook or a script) is saved to the directory UNSPECIFIED if no module name is given.
+QUDI_PACKAGES = ('core', 'gui', 'hardware', 'interface', 'logic')
 
 
 class DailyLogHandler(logging.FileHandler):
@@ -106,6 +117,42 @@ class DailyLogHandler(logging.FileHandler):
             super().emit(record)
 
 
+def load_hdf5_data(filepath, keys=None, index=None):
+    """
+    Load data saved by SaveLogic.save_data with filetype 'hdf5'.
+
+    Only the requested data arrays (or parts of them) are read from the file.
+
+    @param str filepath: path of the hdf5 file
+    @param list keys: optional, the data keys (identifiers passed to save_data) to load. Loads all
+                      data arrays by default.
+    @param index: optional, index (e.g. slice or tuple of slices) to read only a part of each
+                  loaded data array, e.g. numpy.s_[100:200] or numpy.s_[:, 0]
+    @return tuple(OrderedDict, OrderedDict): data dict (key -> numpy.ndarray) and parameters dict
+    """
+    if h5py is None:
+        raise ImportError('Loading hdf5 data files requires the python package "h5py".')
+    if index is None:
+        index = ()
+    data = OrderedDict()
+    parameters = OrderedDict()
+    with h5py.File(filepath, 'r') as file:
+        data_group = file['data']
+        dataset_names = dict(zip(data_group.attrs['keys'], data_group.attrs['dataset_names']))
+        if keys is None:
+            keys = list(dataset_names)
+        for key in keys:
+            values = data_group[dataset_names[key]][index]
+            # h5py returns variable-length strings as bytes
+            if isinstance(values, np.ndarray) and values.dtype == object and values.size > 0 \
+                    and isinstance(values.flat[0], bytes):
+                values = np.char.decode(values.astype(bytes), 'utf-8')
+            data[key] = values
+        for name, param in file['parameters'].attrs.items():
+            parameters[name] = param.decode('utf-8') if isinstance(param, bytes) else param
+    return data, parameters
+
+
 class FunctionImplementationError(Exception):
 
     def __init__(self, value):
@@ -127,6 +174,16 @@ class SaveLogic(GenericLogic):
     _win_data_dir = ConfigOption('win_data_directory', 'C:/Data/')
     _unix_data_dir = ConfigOption('unix_data_directory', 'Data')
     log_into_daily_directory = ConfigOption('log_into_daily_directory', False, missing='warn')
+    # Compression filter for numeric datasets in hdf5 files ('lzf', 'gzip' or None)
+    _hdf5_compression = ConfigOption('hdf5_compression', 'lzf')
+    # Write data files and figures in a background thread. save_data returns immediately.
+    _save_in_background = ConfigOption('save_in_background', False)
+    # Number of worker processes rendering figures when saving in background. 0 renders figures in
+    # the background thread.
+    _figure_render_processes = ConfigOption('figure_render_processes', 0)
+
+    # Emitted with the path of the data file after saving has finished
+    sigSaveFinished = QtCore.Signal(str)
 
     # Matplotlib style definition for saving plots
     mpl_qd_style = {
@@ -193,6 +250,10 @@ class SaveLogic(GenericLogic):
 
         self._daily_loghandler = None
 
+        # Executors for saving in background
+        self._save_executor = None
+        self._render_executor = None
+
     def on_activate(self):
         """ Definition, configuration and initialisation of the SaveLogic.
         """
@@ -208,7 +269,24 @@ class SaveLogic(GenericLogic):
         else:
             self._daily_loghandler = None
 
+        # A single thread keeps the order of the save jobs
+        if self._save_in_background:
+            self._save_executor = ThreadPoolExecutor(max_workers=1)
+            if self._figure_render_processes > 0:
+                self._render_executor = ProcessPoolExecutor(
+                    max_workers=int(self._figure_render_processes),
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=init_render_worker)
+
     def on_deactivate(self):
+        # finish all pending save jobs
+        if self._save_executor is not None:
+            self._save_executor.shutdown(wait=True)
+            self._save_executor = None
+        if self._render_executor is not None:
+            self._render_executor.shutdown(wait=True)
+            self._render_executor = None
+
         if self._daily_loghandler is not None:
             # removes the log handler logging into the daily directory
             logging.getLogger().removeHandler(self._daily_loghandler)
@@ -229,7 +307,8 @@ class SaveLogic(GenericLogic):
         self._daily_loghandler.setLevel(level)
 
     def save_data(self, data, filepath=None, parameters=None, filename=None, filelabel=None,
-                  timestamp=None, filetype='text', fmt='%.15e', delimiter='\t', plotfig=None):
+                  timestamp=None, filetype='text', fmt='%.15e', delimiter='\t', plotfig=None,
+                  module_name=None):
         """
         General save routine for data.
 
@@ -275,7 +354,10 @@ class SaveLogic(GenericLogic):
                                    filename and a timestamp, because then the timestamp will be
                                    ignored.
         @param string filetype: optional, the file format the data should be saved in. Valid inputs
-                                are 'text', 'xml' and 'npz'. Default is 'text'.
+                                are 'text', 'npz' and 'hdf5'. Default is 'text'.
+                                'hdf5' saves each data array as compressed dataset and the
+                                parameters as attributes in a single file with suffix '.h5'. Use
+                                load_hdf5_data to read it back. Requires the package h5py.
         @param string or list of strings fmt: optional, format specifier for saved data. See python
                                               documentation for
                                               "Format Specification Mini-Language". If you want for
@@ -290,6 +372,18 @@ class SaveLogic(GenericLogic):
                                               behaviour or failure to save right away.
         @param string delimiter: optional, insert here the delimiter, like '\n' for new line, '\t'
                                  for tab, ',' for a comma ect.
+        @param matplotlib.figure.Figure plotfig: optional, figure to save as PDF and PNG file next
+                                                 to the data file. Will be closed afterwards.
+        @param string module_name: optional, name of the module saving the data. Used for the
+                                   default file path, the file label and the header. If not
+                                   passed, the name of the qudi python module calling this method
+                                   is used or UNSPECIFIED if called from outside of qudi modules
+                                   (e.g. the console). See also get_save_handle.
+
+        @return concurrent.futures.Future: Only if ConfigOption "save_in_background" is set. The
+                                           data and figure are saved in a background thread and
+                                           the future yields the path of the saved data file.
+                                           sigSaveFinished is emitted in either case.
 
         1D data
         =======
@@ -326,14 +420,9 @@ class SaveLogic(GenericLogic):
             timestamp = datetime.datetime.now()
 
         # Try to cast data array into numpy.ndarray if it is not already one
-        # Also collect information on arrays in the process and do sanity checks
+        # Also do sanity checks on the array dimensions
         found_1d = False
         found_2d = False
-        multiple_dtypes = False
-        arr_length = []
-        arr_dtype = []
-        max_row_num = 0
-        max_line_num = 0
         for keyname in data:
             # Cast into numpy array
             if not isinstance(data[keyname], np.ndarray):
@@ -345,29 +434,14 @@ class SaveLogic(GenericLogic):
                     return -1
 
             # determine dimensions
-            if data[keyname].ndim < 3:
-                length = data[keyname].shape[0]
-                arr_length.append(length)
-                if length > max_line_num:
-                    max_line_num = length
-                if data[keyname].ndim == 2:
-                    found_2d = True
-                    width = data[keyname].shape[1]
-                    if max_row_num < width:
-                        max_row_num = width
-                else:
-                    found_1d = True
-                    max_row_num += 1
+            if data[keyname].ndim == 2:
+                found_2d = True
+            elif data[keyname].ndim < 2:
+                found_1d = True
             else:
                 self.log.error('Found data array with dimension >2. Unable to save data.')
                 return -1
 
-            # determine array data types
-            if len(arr_dtype) > 0:
-                if arr_dtype[-1] != data[keyname].dtype:
-                    multiple_dtypes = True
-            arr_dtype.append(data[keyname].dtype)
-
         # Raise error if data contains a mixture of 1D and 2D arrays
         if found_2d and found_1d:
             self.log.error('Passed data dictionary contains 1D AND 2D arrays. This is not allowed. '
@@ -375,17 +449,10 @@ class SaveLogic(GenericLogic):
                            'arrays only. Saving data failed!')
             return -1
 
-        # try to trace back the functioncall to the class which was calling it.
-        try:
-            frm = inspect.stack()[1]
-            # this will get the object, which called the save_data function.
-            mod = inspect.getmodule(frm[0])
-            # that will extract the name of the class.
-            module_name = mod.__name__.split('.')[-1]
-        except:
-            # Sometimes it is not possible to get the object which called the save_data function
-            # (such as when calling this from the console).
-            module_name = 'UNSPECIFIED'
+        # If no module name has been passed, use the name of the python module calling this
+        # method.
+        if module_name is None:
+            module_name = self._get_calling_module_name()
 
         # determine proper file path
         if filepath is None:
@@ -437,123 +504,168 @@ class SaveLogic(GenericLogic):
                 header += 'not specified parameters: {0}\n'.format(parameters)
         header += '\nData:\n=====\n'
 
-        # write data to file
-        # FIXME: Implement other file formats
-        # write to textfile
-        if filetype == 'text':
-            # Reshape data if multiple 1D arrays have been passed to this method.
-            # If a 2D array has been passed, reformat the specifier
-            if len(data) != 1:
-                identifier_str = ''
-                if multiple_dtypes:
-                    field_dtypes = list(zip(['f{0:d}'.format(i) for i in range(len(arr_dtype))],
-                                            arr_dtype))
-                    new_array = np.empty(max_line_num, dtype=field_dtypes)
-                    for i, keyname in enumerate(data):
-                        identifier_str += keyname + delimiter
-                        field = 'f{0:d}'.format(i)
-                        length = data[keyname].size
-                        new_array[field][:length] = data[keyname]
-                        if length < max_line_num:
-                            if isinstance(data[keyname][0], str):
-                                new_array[field][length:] = 'nan'
-                            else:
-                                new_array[field][length:] = np.nan
-                else:
-                    new_array = np.empty([max_line_num, max_row_num], arr_dtype[0])
-                    for i, keyname in enumerate(data):
-                        identifier_str += keyname + delimiter
-                        length = data[keyname].size
-                        new_array[:length, i] = data[keyname]
-                        if length < max_line_num:
-                            if isinstance(data[keyname][0], str):
-                                new_array[length:, i] = 'nan'
-                            else:
-                                new_array[length:, i] = np.nan
-                # discard old data array and use new one
-                data = {identifier_str: new_array}
-            elif found_2d:
-                keyname = list(data.keys())[0]
-                identifier_str = keyname.replace(', ', delimiter).replace(',', delimiter)
-                data[identifier_str] = data.pop(keyname)
-            else:
-                identifier_str = list(data)[0]
-            header += list(data)[0]
-            self.save_array_as_text(data=data[identifier_str], filename=filename, filepath=filepath,
-                                    fmt=fmt, header=header, delimiter=delimiter, comments='#',
-                                    append=False)
-        # write npz file and save parameters in textfile
-        elif filetype == 'npz':
-            header += str(list(data.keys()))[1:-1]
-            np.savez_compressed(filepath + '/' + filename[:-4], **data)
-            self.save_array_as_text(data=[], filename=filename[:-4]+'_params.dat', filepath=filepath,
-                                    fmt=fmt, header=header, delimiter=delimiter, comments='#',
-                                    append=False)
-        else:
-            self.log.error('Only saving of data as textfile and npz-file is implemented. Filetype "{0}" is not '
-                           'supported yet. Saving as textfile.'.format(filetype))
-            self.save_array_as_text(data=data[identifier_str], filename=filename, filepath=filepath,
-                                    fmt=fmt, header=header, delimiter=delimiter, comments='#',
-                                    append=False)
-
-        #--------------------------------------------------------------------------------------------
-        # Save thumbnail figure of plot
+        if filetype == 'hdf5' and h5py is None:
+            self.log.error('Saving data as hdf5 file requires the python package "h5py". '
+                           'Saving as npz-file instead.')
+            filetype = 'npz'
+        if filetype == 'hdf5' and self.active_poi_name != '':
+            if not isinstance(parameters, dict):
+                parameters = dict()
+            parameters = {'Measured at POI': self.active_poi_name, **parameters}
+
+        # Metadata for the saved figure
         if plotfig is not None:
-            # create Metadata
             metadata = dict()
             metadata['Title'] = 'Image produced by qudi: ' + module_name
             metadata['Author'] = 'qudi - Software Suite'
             metadata['Subject'] = 'Find more information on: https://github.com/Ulm-IQO/qudi'
             metadata['Keywords'] = 'Python 3, Qt, experiment control, automation, measurement, software, framework, modular'
             metadata['Producer'] = 'qudi - Software Suite'
-            if timestamp is not None:
-                metadata['CreationDate'] = timestamp
-                metadata['ModDate'] = timestamp
-            else:
-                metadata['CreationDate'] = time
-                metadata['ModDate'] = time
-
-            # determine the PDF-Filename
-            fig_fname_vector = os.path.join(filepath, filename)[:-4] + '_fig.pdf'
-
-            # Create the PdfPages object to which we will save the pages:
-            # The with statement makes sure that the PdfPages object is closed properly at
-            # the end of the block, even if an Exception occurs.
-            with PdfPages(fig_fname_vector) as pdf:
-                pdf.savefig(plotfig, bbox_inches='tight', pad_inches=0.05)
-
-                # We can also set the file's metadata via the PdfPages object:
-                pdf_metadata = pdf.infodict()
-                for x in metadata:
-                    pdf_metadata[x] = metadata[x]
-
-            # determine the PNG-Filename and save the plain PNG
-            fig_fname_image = os.path.join(filepath, filename)[:-4] + '_fig.png'
-            plotfig.savefig(fig_fname_image, bbox_inches='tight', pad_inches=0.05)
-
-            # Use Pillow (an fork for PIL) to attach metadata to the PNG
-            png_image = Image.open(fig_fname_image)
-            png_metadata = PngImagePlugin.PngInfo()
-
-            # PIL can only handle Strings, so let's convert our times
-            metadata['CreationDate'] = metadata['CreationDate'].strftime('%Y%m%d-%H%M-%S')
-            metadata['ModDate'] = metadata['ModDate'].strftime('%Y%m%d-%H%M-%S')
-
-            for x in metadata:
-                # make sure every value of the metadata is a string
-                if not isinstance(metadata[x], str):
-                    metadata[x] = str(metadata[x])
+            metadata['CreationDate'] = timestamp
+            metadata['ModDate'] = timestamp
+            figure_job = {'figure': plotfig,
+                          'filepath_base': os.path.join(filepath, filename)[:-4],
+                          'metadata': metadata,
+                          'dpi': plt.rcParams['savefig.dpi']}
+        else:
+            figure_job = None
+
+        job_args = {'data': data,
+                    'filepath': filepath,
+                    'filename': filename,
+                    'filetype': filetype,
+                    'fmt': fmt,
+                    'delimiter': delimiter,
+                    'header': header,
+                    'parameters': parameters,
+                    'module_name': module_name,
+                    'timestamp': timestamp,
+                    'figure_job': figure_job,
+                    'start_time': start_time}
+
+        if self._save_executor is None:
+            self._save_job(**job_args)
+            return
+
+        # The caller might alter the data arrays after this method returned. The figure is
+        # detached from pyplot and its GUI backend to render it in another thread or process.
+        job_args['data'] = {key: np.array(value) for key, value in data.items()}
+        if figure_job is not None:
+            plt.close(plotfig)
+            FigureCanvasAgg(plotfig)
+            if self._render_executor is not None:
+                figure_job['figure'] = pickle.dumps(plotfig)
+        return self._save_executor.submit(self._save_job, **job_args)
 
-                # add the metadata to the picture
-                png_metadata.add_text(x, metadata[x])
+    def _save_job(self, data, filepath, filename, filetype, fmt, delimiter, header, parameters,
+                  module_name, timestamp, figure_job, start_time):
+        """
+        Write the data file and the figure prepared by save_data.
+        Emits sigSaveFinished with the path of the data file afterwards.
 
-            # save the picture again, this time including the metadata
-            png_image.save(fig_fname_image, "png", pnginfo=png_metadata)
+        @return str: the path of the saved data file
+        """
+        try:
+            # write data to file
+            # write to textfile
+            if filetype == 'text':
+                # Reshape data if multiple 1D arrays have been passed to this method.
+                # If a 2D array has been passed, reformat the specifier
+                if len(data) != 1:
+                    identifier_str = ''
+                    arr_dtype = [arr.dtype for arr in data.values()]
+                    multiple_dtypes = len(set(arr_dtype)) > 1
+                    max_line_num = max(arr.shape[0] for arr in data.values())
+                    max_row_num = len(data)
+                    if multiple_dtypes:
+                        field_dtypes = list(zip(['f{0:d}'.format(i) for i in range(len(arr_dtype))],
+                                                arr_dtype))
+                        new_array = np.empty(max_line_num, dtype=field_dtypes)
+                        for i, keyname in enumerate(data):
+                            identifier_str += keyname + delimiter
+                            field = 'f{0:d}'.format(i)
+                            length = data[keyname].size
+                            new_array[field][:length] = data[keyname]
+                            if length < max_line_num:
+                                if isinstance(data[keyname][0], str):
+                                    new_array[field][length:] = 'nan'
+                                else:
+                                    new_array[field][length:] = np.nan
+                    else:
+                        new_array = np.empty([max_line_num, max_row_num], arr_dtype[0])
+                        for i, keyname in enumerate(data):
+                            identifier_str += keyname + delimiter
+                            length = data[keyname].size
+                            new_array[:length, i] = data[keyname]
+                            if length < max_line_num:
+                                if isinstance(data[keyname][0], str):
+                                    new_array[length:, i] = 'nan'
+                                else:
+                                    new_array[length:, i] = np.nan
+                    # discard old data array and use new one
+                    data = {identifier_str: new_array}
+                elif data[list(data)[0]].ndim == 2:
+                    keyname = list(data.keys())[0]
+                    identifier_str = keyname.replace(', ', delimiter).replace(',', delimiter)
+                    data[identifier_str] = data.pop(keyname)
+                else:
+                    identifier_str = list(data)[0]
+                header += list(data)[0]
+                self.save_array_as_text(data=data[identifier_str], filename=filename,
+                                        filepath=filepath, fmt=fmt, header=header,
+                                        delimiter=delimiter, comments='#', append=False)
+            # write npz file and save parameters in textfile
+            elif filetype == 'npz':
+                header += str(list(data.keys()))[1:-1]
+                np.savez_compressed(filepath + '/' + filename[:-4], **data)
+                self.save_array_as_text(data=[], filename=filename[:-4]+'_params.dat',
+                                        filepath=filepath, fmt=fmt, header=header,
+                                        delimiter=delimiter, comments='#', append=False)
+                filename = filename[:-4] + '.npz'
+            # write hdf5 file containing data and parameters
+            elif filetype == 'hdf5':
+                filename = os.path.splitext(filename)[0] + '.h5'
+                self.save_data_as_hdf5(data=data, filename=filename, filepath=filepath,
+                                       parameters=parameters, module_name=module_name,
+                                       timestamp=timestamp)
+            else:
+                self.log.error('Only saving of data as textfile, npz-file and hdf5-file is '
+                               'implemented. Filetype "{0}" is not supported yet. Saving as '
+                               'textfile.'.format(filetype))
+                identifier_str = list(data)[0]
+                self.save_array_as_text(data=data[identifier_str], filename=filename,
+                                        filepath=filepath, fmt=fmt, header=header,
+                                        delimiter=delimiter, comments='#', append=False)
 
-            # close matplotlib figure
-            plt.close(plotfig)
+            #----------------------------------------------------------------------------------
+            # Save thumbnail figure of plot as PDF and PNG (including metadata)
+            if figure_job is not None:
+                figure = figure_job.pop('figure')
+                if isinstance(figure, bytes):
+                    self._render_executor.submit(save_pickled_figure, figure,
+                                                 **figure_job).result()
+                else:
+                    save_figure(figure, **figure_job)
+                    # close matplotlib figure
+                    plt.close(figure)
             self.log.debug('Time needed to save data: {0:.2f}s'.format(time.time()-start_time))
             #----------------------------------------------------------------------------------
+        except:
+            self.log.exception('Saving data to "{0}" failed.'
+                               ''.format(os.path.join(filepath, filename)))
+            raise
+        saved_path = os.path.join(filepath, filename)
+        self.sigSaveFinished.emit(saved_path)
+        return saved_path
+
+    def wait_for_pending_saves(self):
+        """
+        Block until all save jobs queued so far (see ConfigOption "save_in_background") are
+        finished.
+        """
+        if self._save_executor is not None:
+            self._save_executor.submit(lambda: None).result()
+        return
 
     def save_array_as_text(self, data, filename, filepath='', fmt='%.15e', header='',
                            delimiter='\t', comments='#', append=False):
@@ -572,6 +684,59 @@ class SaveLogic(GenericLogic):
                            comments=comments)
         return
 
+    def save_data_as_hdf5(self, data, filename, filepath='', parameters=None, module_name='',
+                          timestamp=None):
+        """
+        An independent method, which saves a dict of numpy.ndarrays as hdf5 file.
+
+        Each data array is saved as dataset in the group "data". Numeric arrays are compressed with
+        the filter given by ConfigOption "hdf5_compression".
+        The original dict keys are saved in the attribute "keys" of this group since dataset names
+        must not contain "/". The parameters are saved as attributes of the group "parameters".
+        Parameters that can not be represented as hdf5 attribute are saved as string.
+
+        @param dict data: dictionary of numpy.ndarrays to save
+        @param str filename: name of the file
+        @param str filepath: optional, directory to save the file in
+        @param dict parameters: optional, parameters to save
+        @param str module_name: optional, name of the module the data is saved from
+        @param datetime.datetime timestamp: optional, time the data was taken
+        """
+        with h5py.File(os.path.join(filepath, filename), 'w') as file:
+            file.attrs['module'] = module_name
+            if timestamp is not None:
+                file.attrs['timestamp'] = timestamp.isoformat()
+
+            data_group = file.create_group('data')
+            dataset_names = list()
+            for key, values in data.items():
+                name = key.replace('/', '_') or 'data'
+                if name in data_group:
+                    name = '{0}_{1:d}'.format(name, len(dataset_names))
+                dataset_names.append(name)
+                values = np.asarray(values)
+                if values.dtype.kind not in 'biufc':
+                    data_group.create_dataset(name, data=values.astype(str).astype(object),
+                                              dtype=h5py.special_dtype(vlen=str))
+                elif values.size > 0 and self._hdf5_compression:
+                    data_group.create_dataset(name, data=values,
+                                              compression=self._hdf5_compression, shuffle=True)
+                else:
+                    data_group.create_dataset(name, data=values)
+            data_group.attrs['keys'] = list(data)
+            data_group.attrs['dataset_names'] = dataset_names
+
+            param_group = file.create_group('parameters')
+            if isinstance(parameters, dict):
+                for entry, param in parameters.items():
+                    try:
+                        param_group.attrs[str(entry)] = param
+                    except (TypeError, ValueError):
+                        param_group.attrs[str(entry)] = str(param)
+            elif parameters is not None:
+                param_group.attrs['not specified parameters'] = str(parameters)
+        return
+
     def get_daily_directory(self):
         """
         Creates the daily directory.
@@ -640,6 +805,42 @@ class SaveLogic(GenericLogic):
             os.makedirs(dir_path)
         return dir_path
 
+    @staticmethod
+    def _get_calling_module_name():
+        """
+        Returns the name of the qudi python module calling the SaveLogic. Only the calling frames
+        are looked up instead of inspecting the whole stack. Frames of this file are skipped, so
+        the name is the same no matter through which method of the SaveLogic it is called.
+
+        @return string: name of the calling module (e.g. 'confocal_logic') or 'UNSPECIFIED' if it
+                        is not a qudi module (e.g. the console, a jupyter notebook or a script)
+        """
+        try:
+            frame = sys._getframe(1)
+            while frame.f_globals.get('__name__') == __name__:
+                frame = frame.f_back
+            module_name = frame.f_globals['__name__']
+        except (AttributeError, KeyError, ValueError):
+            return 'UNSPECIFIED'
+        if module_name.split('.')[0] not in QUDI_PACKAGES:
+            return 'UNSPECIFIED'
+        return module_name.split('.')[-1]
+
+    def get_save_handle(self, module_name):
+        """
+        Returns the save_data method bound to a module name, e.g.
+
+            save_data = savelogic.get_save_handle('Confocal')
+            save_data(data, parameters=parameters, filelabel='xy_image')
+
+        saves the data to the directory returned by get_path_for_module('Confocal') unless another
+        filepath is passed.
+
+        @param string module_name: name of the module saving data
+        @return callable: save_data with the keyword argument module_name set
+        """
+        return functools.partial(self.save_data, module_name=module_name)
+
     def get_additional_parameters(self):
         """ Method that return the additional parameters dictionary securely """
         return self._additional_parameters.copy()
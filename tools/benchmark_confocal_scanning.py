@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the line acquisition in ConfocalLogic.
+
+Scans xy images with the hardware module confocal_scanner_dummy and measures the scanned lines per
+second line by line, pipelined (the next lines are scanned in the background while the counts of
+the previous lines are processed) and in batches of several lines per scan_line call. After each
+image update the count plane is processed like the colorbar update of the confocal GUI to emulate
+the load of a connected GUI.
+
+Run from the qudi main directory:
+    python tools/benchmark_confocal_scanning.py
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import os
+import sys
+import time
+import logging
+import numpy as np
+
+sys.path.append(os.getcwd())
+
+from qtpy import QtCore
+from logic.fit_logic import FitLogic
+from logic.confocal_logic import ConfocalLogic
+from hardware.confocal_scanner_dummy import ConfocalScannerDummy
+
+
+class BenchmarkSaveLogic:
+    """ Stands in for SaveLogic, which ConfocalLogic only needs for saving. """
+    pass
+
+
+def make_module(module_class, name, config, connections=None):
+    """ Create and activate a module without the qudi manager. """
+    module = module_class(manager=None, name=name, config=config)
+    for connector, target in (connections or dict()).items():
+        module.connectors[connector].connect(target)
+    module.module_state.activate()
+    return module
+
+
+def emulate_display(confocal, lut):
+    """ Process the count plane like ConfocalGui.refresh_xy_image does for the colorbar and map it
+    to colours like the image item of the GUI.
+    """
+    data = confocal.xy_image[:, :, 3]
+    nonzero = data[np.nonzero(data)]
+    if len(nonzero) > 0:
+        cb_min, cb_max = np.percentile(nonzero, [1, 99])
+        scaled = (data - cb_min) * ((len(lut) - 1) / max(cb_max - cb_min, 1))
+        lut[np.clip(scaled, 0, len(lut) - 1).astype(int)]
+
+
+def lines_per_second(app, scanner, clock_frequency, resolution, frames, batch_scan_lines,
+                     pipelined):
+    """ Scan xy images and return the scanned lines per second. The time needed to set up the
+    scanner is not included.
+    """
+    confocal = make_module(ConfocalLogic, 'confocal',
+                           {'batch_scan_lines': batch_scan_lines,
+                            'pipelined_scanning': pipelined},
+                           {'confocalscanner1': scanner, 'savelogic': BenchmarkSaveLogic()})
+    lut = np.random.randint(0, 256, (256, 4), dtype=np.uint8)
+    confocal.signal_xy_image_updated.connect(lambda: emulate_display(confocal, lut))
+    confocal.set_clock_frequency(clock_frequency)
+    confocal.xy_resolution = resolution
+    confocal.image_x_range = [0, 30e-6]
+    confocal.image_y_range = [0, 30e-6]
+
+    lines = 0
+    scan_time = 0
+    for frame in range(frames):
+        confocal.start_scanning()
+        while confocal.module_state() != 'locked':
+            app.processEvents()
+        start = time.perf_counter()
+        while confocal.module_state() == 'locked':
+            app.processEvents()
+        scan_time += time.perf_counter() - start
+        lines += len(confocal.xy_image)
+    rate = lines / scan_time
+    confocal.module_state.deactivate()
+    return rate
+
+
+def main():
+    logging.disable(logging.INFO)
+    app = QtCore.QCoreApplication.instance() or QtCore.QCoreApplication(sys.argv)
+    fit_logic = FitLogic(manager=None, name='fitlogic', config=dict())
+    scanner = make_module(ConfocalScannerDummy, 'scanner', {'clock_frequency': 100000},
+                          {'fitlogic': fit_logic})
+    clock_frequency = 20000
+    frames = 2
+
+    print('{0:>10s} {1:>6s} {2:>10s} {3:>14s}'.format('resolution', 'batch', 'pipelined',
+                                                     'lines [1/s]'))
+    for resolution in (50, 100):
+        for batch_scan_lines, pipelined in ((1, False), (1, True), (10, False), (10, True)):
+            rate = lines_per_second(app, scanner, clock_frequency, resolution, frames,
+                                    batch_scan_lines, pipelined)
+            print('{0:>10d} {1:>6d} {2:>10s} {3:>14.1f}'.format(
+                resolution, batch_scan_lines, str(pipelined), rate))
+    return
+
+
+if __name__ == '__main__':
+    main()
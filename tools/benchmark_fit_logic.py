@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the model caching in FitLogic.
+
+Measures the fits per second for the main model families with the ConfigOption "cache_models"
+switched off (models and parameters are created for each fit) and switched on (models and
+parameters are reused) and checks that both yield the same fit results. Each fit is done like in
+FitContainer.do_fit, i.e. including the evaluation of the fitted model.
+
+Run from the qudi main directory:
+    python tools/benchmark_fit_logic.py
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import os
+import sys
+import time
+import logging
+import numpy as np
+
+sys.path.append(os.getcwd())
+
+from logic.fit_logic import FitLogic
+
+
+def make_test_data():
+    """ Return a list of (fit name, estimator name, x_axis, data) with noisy test data. """
+    rng = np.random.default_rng(0)
+    freq = np.linspace(2.8e9, 2.95e9, 151)
+    tau = np.linspace(0, 1e-6, 200)
+
+    lorentzian = 1e5 * (1 - 0.2 / (1 + ((freq - 2.87e9) / 5e6) ** 2))
+    lorentziandouble = 1e5 * (1 - 0.2 / (1 + ((freq - 2.86e9) / 5e6) ** 2)
+                              - 0.15 / (1 + ((freq - 2.89e9) / 5e6) ** 2))
+    gaussian = 1e4 + 5e4 * np.exp(-(freq - 2.87e9) ** 2 / (2 * 8e6 ** 2))
+    sine = 1 + 0.3 * np.sin(2 * np.pi * 5e6 * tau + 0.3)
+    sinedecay = 1 + 0.3 * np.sin(2 * np.pi * 5e6 * tau + 0.3) * np.exp(-tau / 5e-7)
+    decay = 1 + 0.5 * np.exp(-tau / 3e-7)
+
+    return [('lorentzian', 'dip', freq, lorentzian + rng.normal(0, 500, freq.size)),
+            ('lorentziandouble', 'dip', freq, lorentziandouble + rng.normal(0, 500, freq.size)),
+            ('gaussian', 'peak', freq, gaussian + rng.normal(0, 500, freq.size)),
+            ('sine', 'generic', tau, sine + rng.normal(0, 0.02, tau.size)),
+            ('sineexponentialdecay', 'generic', tau, sinedecay + rng.normal(0, 0.02, tau.size)),
+            ('decayexponential', 'generic', tau, decay + rng.normal(0, 0.01, tau.size))]
+
+
+def fit(fit_logic, fit_name, estimator, x_axis, data):
+    """ Fit the data and evaluate the fitted model like FitContainer.do_fit. """
+    fit_functions = fit_logic.fit_list['1d'][fit_name]
+    result = fit_functions['make_fit'](x_axis=x_axis, data=data,
+                                       estimator=fit_functions[estimator])
+    model, params = fit_functions['make_model']()
+    fit_x = np.linspace(x_axis[0], x_axis[-1], 10 * len(x_axis))
+    model.eval(x=fit_x, params=result.params)
+    return result
+
+
+def fits_per_second(fit_logic, repetitions, *args):
+    """ Return the number of fits per second and the last fit result. """
+    start = time.perf_counter()
+    for i in range(repetitions):
+        result = fit(fit_logic, *args)
+    return repetitions / (time.perf_counter() - start), result
+
+
+def main():
+    logging.disable(logging.INFO)
+    uncached = FitLogic(manager=None, name='fitlogic_uncached', config={'cache_models': False})
+    cached = FitLogic(manager=None, name='fitlogic_cached', config={'cache_models': True})
+    repetitions = 50
+
+    print('{0:>22s} {1:>16s} {2:>16s} {3:>9s} {4:>6s}'.format(
+        'fit', 'uncached [1/s]', 'cached [1/s]', 'speedup', 'equal'))
+    for fit_name, estimator, x_axis, data in make_test_data():
+        args = (fit_name, estimator, x_axis, data)
+        # First fit fills the cache
+        fit(cached, *args)
+        uncached_rate, uncached_result = fits_per_second(uncached, repetitions, *args)
+        cached_rate, cached_result = fits_per_second(cached, repetitions, *args)
+        equal = all(np.isclose(cached_result.params[name].value, param.value, rtol=1e-9)
+                    for name, param in uncached_result.params.items())
+        print('{0:>22s} {1:>16.1f} {2:>16.1f} {3:>9.2f} {4:>6s}'.format(
+            fit_name, uncached_rate, cached_rate, cached_rate / uncached_rate, str(equal)))
+    return
+
+
+if __name__ == '__main__':
+    main()
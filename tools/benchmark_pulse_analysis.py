@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the pulsed analysis methods in BasicPulseAnalyzer.
+
+Compares the vectorized analysis methods with the former implementation looping over each laser
+pulse for different numbers of laser pulses and checks that both yield the same results.
+
+Run from the qudi main directory:
+    python tools/benchmark_pulse_analysis.py
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import os
+import sys
+import time
+import logging
+import numpy as np
+
+sys.path.append(os.getcwd())
+
+from logic.pulsed.pulsed_analysis_methods.basic_analysis_methods import BasicPulseAnalyzer
+
+
+class BenchmarkSettings:
+    """ Provides the settings BasicPulseAnalyzer reads from PulsedMeasurementLogic. """
+    def __init__(self, bin_width):
+        self.fast_counter_settings = {'bin_width': bin_width, 'is_gated': False}
+        self.measurement_settings = dict()
+        self.sampling_information = dict()
+        self.log = logging.getLogger(__name__)
+
+
+def loop_mean_norm(laser_data, bin_width, signal_start=0.0, signal_end=200e-9, norm_start=300e-9,
+                   norm_end=500e-9):
+    """ Former implementation of BasicPulseAnalyzer.analyse_mean_norm """
+    signal_start_bin = round(signal_start / bin_width)
+    signal_end_bin = round(signal_end / bin_width)
+    norm_start_bin = round(norm_start / bin_width)
+    norm_end_bin = round(norm_end / bin_width)
+    signal_data = np.empty(laser_data.shape[0], dtype=float)
+    error_data = np.empty(laser_data.shape[0], dtype=float)
+    for ii, laser_arr in enumerate(laser_data):
+        tmp_data = laser_arr[norm_start_bin:norm_end_bin]
+        reference_sum = np.sum(tmp_data)
+        reference_mean = (reference_sum / len(tmp_data)) if len(tmp_data) != 0 else 0.0
+        tmp_data = laser_arr[signal_start_bin:signal_end_bin]
+        signal_sum = np.sum(tmp_data)
+        signal_mean = (signal_sum / len(tmp_data)) if len(tmp_data) != 0 else 0.0
+        if reference_mean > 0 and signal_mean >= 0:
+            signal_data[ii] = signal_mean / reference_mean
+        else:
+            signal_data[ii] = 0.0
+        if reference_sum > 0 and signal_sum > 0:
+            error_data[ii] = signal_data[ii] * np.sqrt(1 / signal_sum + 1 / reference_sum)
+        else:
+            error_data[ii] = 0.0
+    return signal_data, error_data
+
+
+def loop_sum(laser_data, bin_width, signal_start=0.0, signal_end=200e-9):
+    """ Former implementation of BasicPulseAnalyzer.analyse_sum """
+    signal_start_bin = round(signal_start / bin_width)
+    signal_end_bin = round(signal_end / bin_width)
+    signal_data = np.empty(laser_data.shape[0], dtype=float)
+    error_data = np.empty(laser_data.shape[0], dtype=float)
+    for ii, laser_arr in enumerate(laser_data):
+        signal = laser_arr[signal_start_bin:signal_end_bin].sum()
+        signal_error = np.sqrt(signal)
+        if signal < 0 or signal != signal:
+            signal_data[ii] = 0.0
+            error_data[ii] = 0.0
+        else:
+            signal_data[ii] = signal
+            error_data[ii] = signal_error
+    return signal_data, error_data
+
+
+def loop_mean(laser_data, bin_width, signal_start=0.0, signal_end=200e-9):
+    """ Former implementation of BasicPulseAnalyzer.analyse_mean """
+    signal_start_bin = round(signal_start / bin_width)
+    signal_end_bin = round(signal_end / bin_width)
+    signal_data = np.empty(laser_data.shape[0], dtype=float)
+    error_data = np.empty(laser_data.shape[0], dtype=float)
+    for ii, laser_arr in enumerate(laser_data):
+        signal = laser_arr[signal_start_bin:signal_end_bin].mean()
+        signal_sum = laser_arr[signal_start_bin:signal_end_bin].sum()
+        signal_error = np.sqrt(signal_sum) / (signal_end_bin - signal_start_bin)
+        if signal < 0 or signal != signal:
+            signal_data[ii] = 0.0
+            error_data[ii] = 0.0
+        else:
+            signal_data[ii] = signal
+            error_data[ii] = signal_error
+    return signal_data, error_data
+
+
+def time_method(method, repetitions, *args):
+    """ Return the mean execution time of method(*args) in seconds and the last result. """
+    start = time.perf_counter()
+    for i in range(repetitions):
+        result = method(*args)
+    return (time.perf_counter() - start) / repetitions, result
+
+
+def main():
+    bin_width = 1e-9
+    laser_length = 3000
+    analyzer = BasicPulseAnalyzer(BenchmarkSettings(bin_width))
+    methods = (('mean_norm', loop_mean_norm, analyzer.analyse_mean_norm),
+               ('sum', loop_sum, analyzer.analyse_sum),
+               ('mean', loop_mean, analyzer.analyse_mean))
+
+    print('{0:>10s} {1:>8s} {2:>12s} {3:>12s} {4:>9s} {5:>6s}'.format(
+        'method', 'lasers', 'loop [ms]', 'vector [ms]', 'speedup', 'equal'))
+    for number_of_lasers in (10, 100, 1000, 10000):
+        laser_data = np.random.poisson(5, (number_of_lasers, laser_length)).astype('int64')
+        repetitions = max(1, 1000 // number_of_lasers)
+        for name, loop_method, vector_method in methods:
+            loop_time, loop_result = time_method(loop_method, repetitions, laser_data, bin_width)
+            vector_time, vector_result = time_method(vector_method, repetitions, laser_data)
+            equal = all(np.array_equal(a, b) for a, b in zip(loop_result, vector_result))
+            print('{0:>10s} {1:>8d} {2:>12.3f} {3:>12.3f} {4:>9.1f} {5:>6s}'.format(
+                name, number_of_lasers, loop_time * 1e3, vector_time * 1e3,
+                loop_time / vector_time, str(equal)))
+    return
+
+
+if __name__ == '__main__':
+    main()